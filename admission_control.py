@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Control de admisión y descarte de carga dentro de la app
+
+nginx limita `/api/` por IP, pero no protege a la app cuando muchas consultas
+llegan a la vez. Cada petición se clasifica por el endpoint que la atiende:
+
+- `interactiva`: cálculos individuales, series, paquete del cliente, etc.
+- `volcado`: `datos_completos` (todas las tablas de golpe).
+- `lote`: lotes de percentiles y de predicción, visitas en bloque y trabajos.
+
+Cada clase tiene un límite de peticiones en curso, una cola acotada y una
+espera máxima. Además hay un límite total para el proceso. Cuando se libera un
+hueco pasa primero la cola interactiva, luego la de volcado y por último la
+de lote, de modo que los lotes nunca dejan sin hilos a las consultas de la
+consulta clínica.
+
+La decisión tiene en cuenta el plazo. Si la cola está llena, o la espera
+estimada (posición en la cola por el tiempo medio de servicio de la clase)
+supera la espera máxima, la petición se rechaza en el acto con 503 y
+`Retry-After`, en lugar de esperar para fallar tarde. Cuando nginx envía
+`X-Request-Start: t=<segundos>`, la espera previa en el proxy y en la cola de
+gunicorn también cuenta. Una petición que ya ha esperado más que su plazo se
+descarta sin ejecutarla. Así la latencia de lo que se atiende queda acotada
+aunque haya sobrecarga.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import deque
+
+from flask import g, request
+
+from codec import responder
+
+INTERACTIVA = 'interactiva'
+VOLCADO = 'volcado'
+LOTE = 'lote'
+
+# Endpoints de las clases no interactivas (mismos nombres en app.py y app.rpi.py)
+ENDPOINTS_LOTE = {
+    'api_calcular_percentil_lote', 'api_calcular_percentil_estandares', 'api_prediccion_talla_adulta_lote',
+    'api_anadir_visitas', 'api_crear_trabajo', 'api_resultado_trabajo',
+}
+ENDPOINTS_VOLCADO = {'api_datos_completos'}
+# Sin control: página, estáticos, sondas, estado y el flujo de eventos (dura minutos)
+ENDPOINTS_EXENTOS = {
+    'index', 'static', 'service_worker', 'live', 'ready', 'health_check',
+    'api_memoria', 'api_admision', 'api_estado_trabajo', 'api_eventos_trabajo',
+}
+
+LIMITE_TOTAL = int(os.environ.get('ANTROPOMETRIA_ADMISION_TOTAL', 4))
+LIMITE_LOTE = int(os.environ.get('ANTROPOMETRIA_ADMISION_LOTE', 1))
+# Tiempo de servicio supuesto hasta medir el primero y peso de cada medición
+SERVICIO_INICIAL_S = {INTERACTIVA: 0.02, VOLCADO: 0.5, LOTE: 2.0}
+PESO_MEDIA = 0.2
+
+
+def clasificar(endpoint):
+    """Clase de un endpoint, o None si no pasa por el control de admisión"""
+    if endpoint is None or endpoint in ENDPOINTS_EXENTOS:
+        return None
+    if endpoint in ENDPOINTS_LOTE:
+        return LOTE
+    if endpoint in ENDPOINTS_VOLCADO:
+        return VOLCADO
+    return INTERACTIVA
+
+
+def espera_previa(cabecera, ahora=None):
+    """Segundos desde `X-Request-Start` (`t=<segundos>` de nginx, $msec); 0 si no viene o no se entiende"""
+    if not cabecera:
+        return 0.0
+    try:
+        inicio = float(cabecera.strip().removeprefix('t='))
+    except ValueError:
+        return 0.0
+    return max(0.0, (ahora or time.time()) - inicio)
+
+
+def payload_saturado(reintento):
+    """Cuerpo de la respuesta 503 de una petición rechazada (acompaña a `Retry-After`)"""
+    return {'success': False, 'error': 'Servidor saturado, reintente más tarde', 'reintentar_s': reintento}
+
+
+class _Clase:
+    def __init__(self, nombre, limite, cola_max, espera_max_s):
+        self.nombre = nombre
+        self.limite = limite
+        self.cola_max = cola_max
+        self.espera_max_s = espera_max_s
+        self.en_curso = 0
+        self.cola = deque()
+        self.servicio_s = SERVICIO_INICIAL_S[nombre]
+        self.admitidas = 0
+        self.rechazadas = 0
+        self.caducadas = 0
+
+    def espera_estimada(self, posicion):
+        """Segundos hasta que se atienda la petición en `posicion` (1 = la primera en cola)"""
+        return math.ceil(posicion / max(1, self.limite)) * self.servicio_s
+
+
+class AdmissionController:
+    """Límites de concurrencia por clase, colas acotadas con plazo y prioridad interactiva"""
+
+    def __init__(self, limite_total=LIMITE_TOTAL, limite_lote=LIMITE_LOTE):
+        self.limite_total = limite_total
+        self.en_curso = 0
+        # Las peticiones en cola esperan ocupando un hilo del worker: las colas son
+        # cortas y gunicorn necesita más hilos que `limite_total` (ver Dockerfile.rpi).
+        # Orden = prioridad al repartir huecos
+        self.clases = {
+            INTERACTIVA: _Clase(INTERACTIVA, limite_total, cola_max=2 * limite_total, espera_max_s=2.0),
+            VOLCADO: _Clase(VOLCADO, 1, cola_max=1, espera_max_s=10.0),
+            LOTE: _Clase(LOTE, limite_lote, cola_max=limite_lote, espera_max_s=30.0),
+        }
+        self._lock = threading.Lock()
+
+    def registrar(self, app):
+        app.before_request(self._antes)
+        app.teardown_request(self._despues)
+
+    def _hay_sitio(self, clase):
+        return clase.en_curso < clase.limite and self.en_curso < self.limite_total
+
+    def _hay_prioritarias(self, clase):
+        """True si esperan peticiones de esta clase o de una más prioritaria"""
+        for otra in self.clases.values():
+            if otra.cola:
+                return True
+            if otra is clase:
+                return False
+        return False
+
+    def _ocupar(self, clase):
+        clase.en_curso += 1
+        self.en_curso += 1
+        clase.admitidas += 1
+
+    def entrar(self, nombre, previa_s=0.0):
+        """Admite una petición (bloquea hasta su turno); devuelve None o los segundos para reintentar"""
+        clase = self.clases[nombre]
+        with self._lock:
+            if previa_s > clase.espera_max_s:
+                clase.caducadas += 1
+                return self._reintento(clase)
+            if self._hay_sitio(clase) and not self._hay_prioritarias(clase):
+                self._ocupar(clase)
+                return None
+            posicion = len(clase.cola) + 1
+            if posicion > clase.cola_max or previa_s + clase.espera_estimada(posicion) > clase.espera_max_s:
+                clase.rechazadas += 1
+                return self._reintento(clase)
+            turno = threading.Event()
+            clase.cola.append(turno)
+
+        if turno.wait(clase.espera_max_s - previa_s):
+            return None
+        with self._lock:
+            # El hueco pudo llegar justo al vencer el plazo
+            if turno.is_set():
+                return None
+            clase.cola.remove(turno)
+            clase.caducadas += 1
+            return self._reintento(clase)
+
+    def salir(self, nombre, duracion_s):
+        """Libera el hueco de una petición terminada y se lo da a la siguiente por prioridad"""
+        clase = self.clases[nombre]
+        with self._lock:
+            clase.en_curso -= 1
+            self.en_curso -= 1
+            clase.servicio_s += PESO_MEDIA * (duracion_s - clase.servicio_s)
+            for siguiente in self.clases.values():
+                while siguiente.cola and self._hay_sitio(siguiente):
+                    self._ocupar(siguiente)
+                    siguiente.cola.popleft().set()
+
+    def _reintento(self, clase):
+        return max(1, math.ceil(clase.espera_estimada(len(clase.cola) + 1)))
+
+    def _antes(self):
+        nombre = clasificar(request.endpoint)
+        if nombre is None:
+            return None
+        reintento = self.entrar(nombre, espera_previa(request.headers.get('X-Request-Start')))
+        if reintento is not None:
+            respuesta = responder(payload_saturado(reintento), status=503)
+            respuesta.headers['Retry-After'] = str(reintento)
+            return respuesta
+        g.admision = (nombre, time.perf_counter())
+        return None
+
+    def _despues(self, error=None):
+        admision = g.pop('admision', None)
+        if admision is not None:
+            self.salir(admision[0], time.perf_counter() - admision[1])
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'limite_total': self.limite_total,
+                'en_curso': self.en_curso,
+                'clases': {
+                    clase.nombre: {
+                        'limite': clase.limite,
+                        'en_curso': clase.en_curso,
+                        'en_cola': len(clase.cola),
+                        'cola_max': clase.cola_max,
+                        'espera_max_s': clase.espera_max_s,
+                        'servicio_ms': round(clase.servicio_s * 1000, 1),
+                        'admitidas': clase.admitidas,
+                        'rechazadas': clase.rechazadas,
+                        'caducadas': clase.caducadas,
+                    }
+                    for clase in self.clases.values()
+                },
+            }
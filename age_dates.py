@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Edad en meses a partir de las fechas de nacimiento y de medición
+
+Todas las rutas calculan la edad igual, en una pasada de NumPy datetime64 para
+el lote completo: meses cumplidos (el mes cuenta cuando se alcanza el mismo día
+del mes de nacimiento). Con las semanas de gestación de un prematuro se usa la
+edad corregida, que descuenta las semanas que faltaron hasta el término, hasta
+los 24 meses de edad cronológica.
+"""
+
+import numpy as np
+
+SEMANAS_TERMINO = 40
+# Por debajo de estas semanas de gestación se corrige la edad
+SEMANAS_PREMATURO = 37
+# Edad cronológica hasta la que se aplica la corrección
+EDAD_MAX_CORRECCION_MESES = 24
+
+
+def _dias_desde_civil(anos, meses, dias):
+    """Días desde 1970-01-01 de fechas del calendario gregoriano (aritmética entera)"""
+    anos = anos - (meses <= 2)
+    era = anos // 400
+    ano_era = anos - era * 400
+    dia_ano = (153 * np.where(meses > 2, meses - 3, meses + 9) + 2) // 5 + dias - 1
+    dia_era = ano_era * 365 + ano_era // 4 - ano_era // 100 + dia_ano
+    return era * 146097 + dia_era - 719468
+
+
+def _civil_desde_dias(dias_epoch):
+    """(años, meses, días) de días desde 1970-01-01, sin conversiones de datetime64"""
+    z = dias_epoch + 719468
+    era = z // 146097
+    dia_era = z - era * 146097
+    ano_era = (dia_era - dia_era // 1460 + dia_era // 36524 - dia_era // 146096) // 365
+    dia_ano = dia_era - (365 * ano_era + ano_era // 4 - ano_era // 100)
+    mes_marzo = (5 * dia_ano + 2) // 153
+    dias = dia_ano - (153 * mes_marzo + 2) // 5 + 1
+    meses = np.where(mes_marzo < 10, mes_marzo + 3, mes_marzo - 9)
+    return ano_era + era * 400 + (meses <= 2), meses, dias
+
+
+def _fechas_iso_rapido(textos):
+    """Lee 'AAAA-MM-DD' operando sobre los caracteres; None si algún texto no tiene esa forma"""
+    if textos.dtype.itemsize != 10 * 4:
+        if textos.size == 0 or (np.char.str_len(textos) != 10).any():
+            return None
+        textos = textos.astype('<U10')
+    caracteres = np.ascontiguousarray(textos).view(np.uint32).reshape(-1, 10)
+    # En uint32 los caracteres por debajo de '0' dan la vuelta y también quedan > 9
+    digitos = caracteres - np.uint32(ord('0'))
+    if (caracteres[:, [4, 7]] != ord('-')).any() or (digitos[:, [0, 1, 2, 3, 5, 6, 8, 9]] > 9).any():
+        return None
+    digitos = digitos.astype(np.int64)
+    anos = digitos[:, 0] * 1000 + digitos[:, 1] * 100 + digitos[:, 2] * 10 + digitos[:, 3]
+    meses = digitos[:, 5] * 10 + digitos[:, 6]
+    dias = digitos[:, 8] * 10 + digitos[:, 9]
+    fechas = _dias_desde_civil(anos, meses, dias)
+    # Un mes fuera de 1-12 o un día que no existe en el mes no vuelve a la misma fecha
+    _, meses_leidos, dias_leidos = _civil_desde_dias(fechas)
+    invalidas = (meses < 1) | (meses > 12) | (dias < 1) | (meses_leidos != meses) | (dias_leidos != dias)
+    fechas = fechas.astype('datetime64[D]')
+    fechas[invalidas] = np.datetime64('NaT')
+    return fechas.reshape(textos.shape)
+
+
+def fechas_iso(valores):
+    """Array datetime64[D] de fechas 'AAAA-MM-DD'; NaT en las que no son válidas"""
+    textos = np.atleast_1d(np.asarray(valores)).astype(str)
+    fechas = _fechas_iso_rapido(textos)
+    if fechas is not None:
+        return fechas
+    try:
+        return textos.astype('datetime64[D]')
+    except ValueError:
+        # Solo en el camino de error: localizar las filas que no se pueden leer
+        fechas = np.empty(textos.shape, dtype='datetime64[D]')
+        for i, texto in enumerate(textos):
+            try:
+                fechas[i] = np.datetime64(texto, 'D')
+            except ValueError:
+                fechas[i] = np.datetime64('NaT')
+        return fechas
+
+
+def meses_cumplidos(nacimiento, medicion):
+    """Meses cumplidos entre dos arrays datetime64[D]"""
+    ano_n, mes_n, dia_n = _civil_desde_dias(nacimiento.astype(np.int64))
+    ano_m, mes_m, dia_m = _civil_desde_dias(medicion.astype(np.int64))
+    return (ano_m - ano_n) * 12 + (mes_m - mes_n) - (dia_m < dia_n)
+
+
+def edades_meses(nacimiento, medicion, semanas_gestacion=None):
+    """(edades en meses, máscara de las corregidas por prematuridad) de fechas ya validadas"""
+    nacimiento, medicion = np.broadcast_arrays(nacimiento, medicion)
+    cronologicas = meses_cumplidos(nacimiento, medicion)
+    if semanas_gestacion is None:
+        return cronologicas, np.zeros(cronologicas.shape, dtype=bool)
+
+    semanas = np.broadcast_to(np.asarray(semanas_gestacion, dtype=np.float64), cronologicas.shape)
+    corregir = (semanas < SEMANAS_PREMATURO) & (cronologicas < EDAD_MAX_CORRECCION_MESES)
+    adelanto = np.rint((SEMANAS_TERMINO - semanas) * 7).astype(np.int64).astype('timedelta64[D]')
+    corregidas = np.maximum(meses_cumplidos(nacimiento + adelanto, medicion), 0)
+    return np.where(corregir, corregidas, cronologicas), corregir
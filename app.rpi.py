@@ -4,7 +4,7 @@ Aplicación Flask optimizada para Raspberry Pi 5
 Calculadora antropométrica con optimizaciones de memoria y CPU
 """
 
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, url_for
 import json
 import pandas as pd
 import numpy as np
@@ -14,33 +14,75 @@ import math
 import gc  # Para gestión de memoria en RPi
 import logging
 
+from async_logging import configurar_logging, estadisticas_logging
+from codec import leer_payload, responder, respuesta_binaria
+from response_cache import cacheable, cache_respuestas
+from growth_series import series_percentiles, precalcular_series, puntos_paciente, nbytes_series
+from percentile_grid import PercentileBandGrid, PERCENTILES_REF
+from batch_pool import BatchProcessPool
+from job_queue import JobQueue, COMPLETADO
+from table_artifacts import cargar_manifiesto, version_datos, MANIFIESTO
+from reference_standards import ReferenceStandards, ESTANDAR_INTEGRADO
+from height_prediction import HeightPredictor, MADURACIONES
+from measurement_store import MeasurementStore
+from client_bundle import ClientBundle
+from static_assets import StaticAssets
+from prerendered_page import PrerenderedPage
+from traffic_capture import TrafficCapture
+from admission_control import AdmissionController
+from warmup import WarmUp, peticiones_representativas, peticiones_frecuentes
+from memory_budget import (presupuesto_memoria, tamano_objeto, MemoriaInsuficiente,
+                           BYTES_POR_FILA_LOTE, DIRECTORIO_MMAP)
+from schemas import (ErrorValidacion, validar_opciones_lista, ESQUEMA_IMC, ESQUEMA_TALLA_DIANA, ESQUEMA_PERCENTIL,
+                     ESQUEMA_VELOCIDAD, ESQUEMA_SERIES, ESQUEMA_LOTE_PERCENTIL, ESQUEMA_LOTE_ESTANDARES,
+                     ESQUEMA_EDAD_OSEA, ESQUEMA_PREDICCION_TALLA, ESQUEMA_LOTE_PREDICCION_TALLA,
+                     ESQUEMA_VISITA, ESQUEMA_MEDIDAS_VISITA, ESQUEMA_LOTE_VISITAS, TIPOS_MEDIDA, validar_paciente)
+
 # Configuración optimizada para RPi
 app = Flask(__name__)
 app.config['JSON_SORT_KEYS'] = False
 app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
+# Recursos de static/ con hash en el nombre (manifiesto de static_assets.py)
+StaticAssets(app.static_folder).registrar(app)
 
-# Configurar logging optimizado para RPi
-logging.basicConfig(
+# Configurar logging optimizado para RPi: cola acotada + hilo escritor, así la
+# E/S de la tarjeta SD queda fuera de las peticiones
+configurar_logging(
+    os.environ.get('ANTROPOMETRIA_LOG', '/app/logs/app.log'),
     level=logging.INFO,
-    format='%(asctime)s %(levelname)s %(name)s %(message)s',
-    handlers=[
-        logging.FileHandler('/app/logs/app.log'),
-        logging.StreamHandler()
-    ]
+    capacidad=int(os.environ.get('ANTROPOMETRIA_LOG_COLA', 10000))
 )
 logger = logging.getLogger(__name__)
 
 class AnthropometricCalculator:
     def __init__(self):
         self.data = {}
+        self._version_datos = None
         self._percentile_cache = {}  # Cache para optimizar RPi
+        self.grids = {}
+        self.pool_lotes = None
+        self._tamano_datos = None
+        # Tablas de predicción de talla adulta, compiladas una sola vez
+        self.prediccion_talla = HeightPredictor()
         self.load_anthropometric_data()
+        if os.environ.get('ANTROPOMETRIA_GRID', '1') != '0':
+            self.construir_grids()
+            if presupuesto_memoria.activo:
+                self.mapear_grids()
+            procesos = int(os.environ.get('ANTROPOMETRIA_PROCESOS', '1'))
+            if procesos > 1:
+                self.activar_pool_procesos(procesos)
     
     def load_anthropometric_data(self):
         """Carga los datos antropométricos fusionados con manejo de errores"""
+        self._version_datos = None
         try:
             data_file = 'fused_anthropometric_data.json'
-            if os.path.exists(data_file):
+            if os.path.exists(MANIFIESTO):
+                # Manifiesto de artefactos: las tablas se leen bajo demanda
+                self.data = cargar_manifiesto(MANIFIESTO)
+                logger.info(f"Datos cargados desde el manifiesto {MANIFIESTO}")
+            elif os.path.exists(data_file):
                 with open(data_file, 'r', encoding='utf-8') as f:
                     self.data = json.load(f)
                 logger.info(f"Datos cargados correctamente desde {data_file}")
@@ -50,6 +92,14 @@ class AnthropometricCalculator:
         except Exception as e:
             logger.error(f"Error cargando datos: {e}")
             self.create_default_data()
+        # Estándares compilados: aquí solo sus metadatos, los arrays se abren bajo demanda
+        self.estandares = ReferenceStandards(self.data.get('estandares'), os.path.dirname(os.path.abspath(data_file)))
+    
+    def version_datos(self):
+        """Identificador corto de la versión de los datos de referencia cargados"""
+        if self._version_datos is None:
+            self._version_datos = version_datos(self.data.get('metadatos', {}))
+        return self._version_datos
     
     def create_default_data(self):
         """Crea datos por defecto optimizados para memoria"""
@@ -117,36 +167,78 @@ class AnthropometricCalculator:
             logger.error(f"Error calculando velocidad: {e}")
             return None
     
+    def construir_grids(self):
+        """Precalcula las rejillas de bandas de percentil (uint8) por tipo de medida"""
+        self.grids = {}
+        rangos_edad = {'peso': (0, 216), 'talla': (0, 216), 'imc': (24, 216)}
+        for tipo_medida, (edad_min, edad_max) in rangos_edad.items():
+            self.grids[tipo_medida] = PercentileBandGrid.desde_funcion(
+                lambda edad, sexo, tipo=tipo_medida: self._valores_referencia(edad, sexo, tipo),
+                edad_min, edad_max
+            )
+        total_kb = sum(grid.nbytes for grid in self.grids.values()) / 1024
+        logger.info(f"Rejillas de percentiles construidas: {total_kb:.0f} KB")
+    
+    def mapear_grids(self, directorio=DIRECTORIO_MMAP):
+        """Pasa las rejillas a ficheros mapeados en memoria (modo con presupuesto)"""
+        os.makedirs(directorio, exist_ok=True)
+        for tipo_medida, grid in self.grids.items():
+            if not grid.mapeada:
+                grid.a_mmap(os.path.join(directorio, f'rejilla_{tipo_medida}_{self.version_datos()}.npy'))
+        logger.info(f"Rejillas de percentiles mapeadas en memoria en {directorio}")
+    
+    def tamano_datos(self):
+        """Tamaño aproximado en memoria de los datos de referencia (memoizado por versión)"""
+        version = self.version_datos()
+        if self._tamano_datos is None or self._tamano_datos[0] != version:
+            self._tamano_datos = (version, tamano_objeto(self.data))
+        return self._tamano_datos[1]
+    
+    def activar_pool_procesos(self, procesos=None, filas_por_bloque=50000):
+        """Reparte los lotes grandes entre varios procesos que comparten las rejillas"""
+        self.pool_lotes = BatchProcessPool(self.grids, procesos, filas_por_bloque)
+        logger.info(f"Pool de procesos para lotes activado: {self.pool_lotes.procesos} procesos")
+    
+    def _valores_referencia(self, edad_meses, sexo, tipo_medida):
+        """Valores de referencia P3-P97 de una medida, o None si no aplica"""
+        if tipo_medida == 'peso':
+            return self._get_peso_referencias(edad_meses, sexo)
+        elif tipo_medida == 'talla':
+            return self._get_talla_referencias(edad_meses, sexo)
+        elif tipo_medida == 'imc':
+            if edad_meses < 24:
+                return None
+            return [14, 15, 15.5, 16.5, 18, 19.5, 21.5]
+        return None
+    
     def estimar_percentil(self, medida, edad_meses, sexo, tipo_medida):
         """Estima el percentil con optimizaciones para RPi"""
+        # Camino rápido: una sola indexación en la rejilla precalculada
+        grid = self.grids.get(tipo_medida)
+        if grid is not None:
+            percentil = grid.percentil(medida, edad_meses, sexo)
+            if percentil is not None:
+                return percentil
+        
         cache_key = f"perc_{medida}_{edad_meses}_{sexo}_{tipo_medida}"
         
         if cache_key in self._percentile_cache:
             return self._percentile_cache[cache_key]
         
         try:
-            percentiles_ref = [3, 10, 25, 50, 75, 90, 97]
-            
             # Simplificación de cálculos para optimizar RPi
-            if tipo_medida == 'peso':
-                valores_ref = self._get_peso_referencias(edad_meses, sexo)
-            elif tipo_medida == 'talla':
-                valores_ref = self._get_talla_referencias(edad_meses, sexo)
-            elif tipo_medida == 'imc':
-                if edad_meses < 24:
-                    return None
-                valores_ref = [14, 15, 15.5, 16.5, 18, 19.5, 21.5]
-            else:
+            valores_ref = self._valores_referencia(edad_meses, sexo, tipo_medida)
+            if valores_ref is None:
                 return None
             
             # Encontrar percentil
             for i, valor_ref in enumerate(valores_ref):
                 if medida <= valor_ref:
-                    resultado = percentiles_ref[i]
+                    resultado = PERCENTILES_REF[i]
                     self._percentile_cache[cache_key] = resultado
                     return resultado
             
-            resultado = percentiles_ref[-1]
+            resultado = PERCENTILES_REF[-1]
             self._percentile_cache[cache_key] = resultado
             return resultado
             
@@ -176,6 +268,44 @@ class AnthropometricCalculator:
         
         return [base*0.92, base*0.95, base*0.97, base, base*1.03, base*1.06, base*1.09]
     
+    def estimar_percentiles_estandares(self, medidas, edades_meses, sexos, tipo_medida, estandares=None):
+        """Percentiles de un lote contra varios estándares de referencia en una sola llamada.
+        
+        Devuelve {estandar: array uint8} (0 = sin percentil). ESTANDAR_INTEGRADO es
+        la referencia de la calculadora; el resto son los compilados por DataFusion.
+        """
+        if estandares is None:
+            estandares = [ESTANDAR_INTEGRADO] + self.estandares.disponibles(tipo_medida)
+        compilados = [estandar for estandar in estandares if estandar != ESTANDAR_INTEGRADO]
+        resultados = self.estandares.percentiles_lote(medidas, edades_meses, sexos, tipo_medida, compilados)
+        if ESTANDAR_INTEGRADO in estandares:
+            resultados[ESTANDAR_INTEGRADO] = self.estimar_percentiles_lote(medidas, edades_meses, sexos, tipo_medida)
+        return {estandar: resultados[estandar] for estandar in estandares}
+    
+    def estimar_percentiles_lote(self, medidas, edades_meses, sexos, tipo_medida):
+        """Estima percentiles de un lote vectorizado (uint8, 0 cuando no aplica)"""
+        medidas = np.asarray(medidas, dtype=np.float64)
+        edades = np.asarray(edades_meses)
+        sexos = np.broadcast_to(np.asarray(sexos), medidas.shape)
+        percentiles = np.zeros(medidas.shape, dtype=np.uint8)
+        cubiertas = np.zeros(medidas.shape, dtype=bool)
+        
+        grid = self.grids.get(tipo_medida)
+        if grid is not None:
+            # Los lotes que superan un bloque se reparten entre los procesos del pool
+            if self.pool_lotes is not None and medidas.size > self.pool_lotes.filas_por_bloque:
+                bandas, cubiertas = self.pool_lotes.bandas_lote(tipo_medida, medidas, edades, sexos)
+            else:
+                bandas, cubiertas = grid.bandas_lote(medidas, edades, sexos)
+            percentiles[cubiertas] = np.asarray(PERCENTILES_REF, dtype=np.uint8)[bandas[cubiertas]]
+        
+        # Las filas que la rejilla no cubre se resuelven con el cálculo normal
+        for i in np.flatnonzero(~cubiertas):
+            percentil = self.estimar_percentil(float(medidas[i]), int(edades[i]), str(sexos[i]), tipo_medida)
+            percentiles[i] = percentil or 0
+        
+        return percentiles
+    
     def cleanup_cache(self):
         """Limpia cache periódicamente para liberar memoria"""
         if len(self._percentile_cache) > 100:
@@ -185,13 +315,89 @@ class AnthropometricCalculator:
 
 # Instancia global del calculador
 calculator = AnthropometricCalculator()
+precalcular_series(calculator)
+
+# Cola de trabajos en disco para cohortes grandes (reanudable tras reinicios)
+cola_trabajos = JobQueue(
+    calculator.estimar_percentiles_lote,
+    calculator.version_datos,
+    os.environ.get('ANTROPOMETRIA_TRABAJOS', 'trabajos'),
+    hilos=int(os.environ.get('ANTROPOMETRIA_TRABAJOS_HILOS', 1)),
+    filas_por_bloque=int(os.environ.get('ANTROPOMETRIA_TRABAJOS_BLOQUE', 20000)),
+    redis_url=os.environ.get('ANTROPOMETRIA_REDIS_URL')
+)
+
+# Captura opcional de las peticiones /api/* para reproducirlas en local (benchmarks/replay_traffic.py)
+captura_trafico = TrafficCapture(
+    os.environ['ANTROPOMETRIA_CAPTURA'],
+    muestreo=float(os.environ.get('ANTROPOMETRIA_CAPTURA_MUESTREO', 1.0))
+) if os.environ.get('ANTROPOMETRIA_CAPTURA') else None
+if captura_trafico is not None:
+    captura_trafico.registrar(app)
+
+# Control de admisión: concurrencia por clase de ruta, colas con plazo y 503 con Retry-After
+control_admision = AdmissionController() if os.environ.get('ANTROPOMETRIA_ADMISION', '1') != '0' else None
+if control_admision is not None:
+    control_admision.registrar(app)
+
+# Paquete de referencias para el motor de cálculo del navegador (static/js/motor.js)
+paquete_cliente = ClientBundle(
+    calculator._valores_referencia,
+    TIPOS_MEDIDA,
+    {'imc': ESQUEMA_IMC, 'talla_diana': ESQUEMA_TALLA_DIANA,
+     'percentil': ESQUEMA_PERCENTIL, 'velocidad': ESQUEMA_VELOCIDAD},
+    calculator.version_datos
+)
+
+# Almacén opcional de mediciones por paciente (seguimiento longitudinal)
+almacen_mediciones = MeasurementStore(
+    os.environ['ANTROPOMETRIA_MEDICIONES'],
+    calculator.estimar_percentiles_lote,
+    calculator.version_datos
+) if os.environ.get('ANTROPOMETRIA_MEDICIONES') else None
+
+# Página principal renderizada una vez por versión y servida desde memoria (con gzip/br)
+pagina_principal = PrerenderedPage(app, 'index.html', calculator.version_datos)
+
+# Calentamiento antes de aceptar tráfico (se ejecuta al final del módulo) y estado para /ready
+calentamiento = WarmUp(app, calculator.version_datos)
+calentamiento.paso('tablas', lambda: {'tablas': sum(1 for _ in calculator.data.get('tablas_percentiles', {}).values())})
+calentamiento.paso('plantillas', lambda: {
+    'plantillas': len([app.jinja_env.get_template(nombre) for nombre in app.jinja_env.list_templates()])})
+calentamiento.peticiones('representativas', peticiones_representativas(
+    [tipo for tipo in TIPOS_MEDIDA if calculator._valores_referencia(24, 'masculino', tipo) is not None]),
+    exigir_exito=True)
+calentamiento.peticiones('captura', lambda: peticiones_frecuentes(
+    os.environ.get('ANTROPOMETRIA_CALENTAMIENTO_CAPTURA', os.environ.get('ANTROPOMETRIA_CAPTURA')),
+    calentamiento.es_cacheable))
+
+# Contabilidad de memoria: componentes medibles y reductores bajo presión
+presupuesto_memoria.registrar('datos_referencia', calculator.tamano_datos)
+presupuesto_memoria.registrar('rejillas', lambda: sum(g.nbytes for g in calculator.grids.values() if not g.mapeada))
+presupuesto_memoria.registrar('rejillas_mmap', lambda: sum(g.nbytes for g in calculator.grids.values() if g.mapeada))
+presupuesto_memoria.registrar('cache_percentiles', lambda: tamano_objeto(calculator._percentile_cache))
+presupuesto_memoria.registrar('cache_respuestas', lambda: cache_respuestas.nbytes)
+presupuesto_memoria.registrar('series_crecimiento', nbytes_series)
+presupuesto_memoria.registrar('paquete_cliente', lambda: paquete_cliente.nbytes)
+presupuesto_memoria.registrar('pagina_principal', lambda: pagina_principal.nbytes)
+presupuesto_memoria.registrar_reductor('cache_percentiles', calculator._percentile_cache.clear)
+presupuesto_memoria.registrar_reductor('cache_respuestas', cache_respuestas.reducir, cache_respuestas.restaurar)
+presupuesto_memoria.registrar_reductor('rejillas_mmap', calculator.mapear_grids)
+
+@app.before_request
+def iniciar_trabajos():
+    """Arranca los hilos de la cola en cada worker (con --preload no sobreviven al fork)"""
+    cola_trabajos.iniciar()
+    aplicados = presupuesto_memoria.comprobar()
+    if aplicados:
+        logger.warning(f"Presión de memoria: reductores aplicados {aplicados}")
 
 # Routes optimizados
 @app.route('/')
 def index():
-    """Página principal optimizada"""
+    """Página principal prerenderizada (304 en visitas repetidas)"""
     try:
-        return render_template('index.html')
+        return pagina_principal.respuesta()
     except Exception as e:
         logger.error(f"Error en página principal: {e}")
         return "Error interno del servidor", 500
@@ -202,126 +408,478 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.now().isoformat(),
-        'platform': 'Raspberry Pi 5'
+        'platform': 'Raspberry Pi 5',
+        'logging': estadisticas_logging(),
+        'captura': captura_trafico.estadisticas() if captura_trafico is not None else None,
+        'calentamiento': calentamiento.estado,
+        'admision': control_admision.estadisticas() if control_admision is not None else None,
+        'memoria': presupuesto_memoria.informe()
     })
 
-@app.route('/api/calcular_imc', methods=['POST'])
+@app.route('/live')
+def live():
+    """Sonda de vida: el proceso responde (sin tocar datos ni plantillas)"""
+    return jsonify({'status': 'ok'})
+
+@app.route('/ready')
+def ready():
+    """Sonda de disponibilidad: 503 hasta que el proceso está caliente"""
+    respuesta = jsonify(calentamiento.informe())
+    respuesta.status_code = 200 if calentamiento.listo else 503
+    respuesta.headers['Cache-Control'] = 'no-store'
+    return respuesta
+
+@app.route('/api/calcular_imc', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
 def api_calcular_imc():
     """API para calcular IMC optimizada"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'Datos requeridos'}), 400
+        valores = ESQUEMA_IMC.validar(leer_payload())
         
-        peso = float(data.get('peso', 0))
-        talla = float(data.get('talla', 0))
-        
-        if peso <= 0 or talla <= 0:
-            return jsonify({'success': False, 'error': 'Valores inválidos'}), 400
-        
-        imc = calculator.calcular_imc(peso, talla)
+        imc = calculator.calcular_imc(valores['peso'], valores['talla'])
         
         if imc is None:
-            return jsonify({'success': False, 'error': 'Error en cálculo'}), 500
+            return responder({'success': False, 'error': 'Error en cálculo'}), 500
         
-        return jsonify({
+        return responder({
             'success': True,
             'imc': imc,
             'clasificacion': clasificar_imc(imc)
         })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
     except Exception as e:
         logger.error(f"Error en API IMC: {e}")
-        return jsonify({'success': False, 'error': 'Error interno'}), 500
+        return responder({'success': False, 'error': 'Error interno'}), 500
 
-@app.route('/api/calcular_talla_diana', methods=['POST'])
+@app.route('/api/calcular_talla_diana', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
 def api_calcular_talla_diana():
     """API para calcular talla diana optimizada"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'Datos requeridos'}), 400
-        
-        talla_padre = float(data.get('talla_padre', 0))
-        talla_madre = float(data.get('talla_madre', 0))
-        sexo_hijo = data.get('sexo_hijo', '')
-        
-        if not all([talla_padre > 0, talla_madre > 0, sexo_hijo]):
-            return jsonify({'success': False, 'error': 'Datos incompletos'}), 400
+        valores = ESQUEMA_TALLA_DIANA.validar(leer_payload())
         
-        resultado = calculator.calcular_talla_diana_familiar(talla_padre, talla_madre, sexo_hijo)
+        resultado = calculator.calcular_talla_diana_familiar(
+            valores['talla_padre'], valores['talla_madre'], valores['sexo_hijo'])
         
         if resultado is None:
-            return jsonify({'success': False, 'error': 'Error en cálculo'}), 500
+            return responder({'success': False, 'error': 'Error en cálculo'}), 500
         
-        return jsonify({
+        return responder({
             'success': True,
             'resultado': resultado
         })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
     except Exception as e:
         logger.error(f"Error en API Talla Diana: {e}")
-        return jsonify({'success': False, 'error': 'Error interno'}), 500
+        return responder({'success': False, 'error': 'Error interno'}), 500
 
-@app.route('/api/calcular_percentil', methods=['POST'])
-def api_calcular_percentil():
-    """API para calcular percentiles optimizada"""
+@app.route('/api/evaluar_edad_osea', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
+def api_evaluar_edad_osea():
+    """API para comparar la edad ósea con la cronológica"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'Datos requeridos'}), 400
+        valores = ESQUEMA_EDAD_OSEA.validar(leer_payload())
         
-        medida = float(data.get('medida', 0))
-        edad_meses = int(data.get('edad_meses', 0))
-        sexo = data.get('sexo', '')
-        tipo_medida = data.get('tipo_medida', '')
+        return responder({
+            'success': True,
+            'resultado': calculator.prediccion_talla.evaluar_edad_osea(valores['edad_osea_meses'], valores['edad_meses'])
+        })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Edad Ósea: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/prediccion_talla_adulta', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
+def api_prediccion_talla_adulta():
+    """API para predecir la talla adulta (con la talla diana si se dan las tallas de los padres)"""
+    try:
+        valores = ESQUEMA_PREDICCION_TALLA.validar(leer_payload())
         
-        if not all([medida > 0, edad_meses >= 0, sexo, tipo_medida]):
-            return jsonify({'success': False, 'error': 'Datos incompletos'}), 400
+        prediccion = calculator.prediccion_talla.predecir(
+            valores['talla'], valores['edad_osea_meses'], valores['edad_meses'], valores['sexo'])
+        if prediccion is None:
+            return responder({
+                'success': False,
+                'error': calculator.prediccion_talla.motivo_sin_prediccion(
+                    valores['edad_osea_meses'], valores['edad_meses'], valores['sexo'])
+            }), 400
         
-        percentil = calculator.estimar_percentil(medida, edad_meses, sexo, tipo_medida)
+        if valores['talla_padre'] is not None and valores['talla_madre'] is not None:
+            diana = calculator.calcular_talla_diana_familiar(
+                valores['talla_padre'], valores['talla_madre'], valores['sexo'])
+            prediccion['talla_diana'] = diana
+            prediccion['dentro_rango_diana'] = diana['rango_inferior'] <= prediccion['talla_adulta'] <= diana['rango_superior']
+        
+        return responder({
+            'success': True,
+            'resultado': prediccion
+        })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Predicción Talla: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/prediccion_talla_adulta_lote', methods=['POST'])
+def api_prediccion_talla_adulta_lote():
+    """API para predecir la talla adulta de una lista de pacientes en una sola llamada"""
+    try:
+        valores = ESQUEMA_LOTE_PREDICCION_TALLA.validar(leer_payload())
+        
+        resultado = calculator.prediccion_talla.predecir_lote(
+            valores['tallas'], valores['edades_osea_meses'], valores['edades_meses'], valores['sexos'])
+        
+        binario = respuesta_binaria()
+        sin_nan = lambda array: array if binario else [None if math.isnan(v) else v for v in array.tolist()]
+        return responder({
+            'success': True,
+            'tallas_adultas': sin_nan(resultado['tallas_adultas']),
+            'porcentajes_talla_adulta': sin_nan(resultado['porcentajes']),
+            'maduraciones': np.asarray(MADURACIONES)[resultado['maduraciones']].tolist()
+        })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Predicción Talla Lote: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/calcular_percentil', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
+def api_calcular_percentil():
+    """API para calcular percentiles optimizada"""
+    try:
+        valores = ESQUEMA_PERCENTIL.validar(leer_payload())
+        
+        percentil = calculator.estimar_percentil(
+            valores['medida'], valores['edad_meses'], valores['sexo'], valores['tipo_medida'])
         
         if percentil is None:
-            return jsonify({'success': False, 'error': 'Error en cálculo'}), 500
+            return responder({'success': False, 'error': 'Error en cálculo'}), 500
         
         # Limpiar cache periódicamente
         calculator.cleanup_cache()
         
-        return jsonify({
+        return responder({
             'success': True,
             'percentil': percentil,
             'interpretacion': interpretar_percentil(percentil)
         })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
     except Exception as e:
         logger.error(f"Error en API Percentil: {e}")
-        return jsonify({'success': False, 'error': 'Error interno'}), 500
+        return responder({'success': False, 'error': 'Error interno'}), 500
 
-@app.route('/api/calcular_velocidad_crecimiento', methods=['POST'])
-def api_calcular_velocidad_crecimiento():
-    """API para calcular velocidad optimizada"""
+@app.route('/api/calcular_percentil_lote', methods=['POST'])
+def api_calcular_percentil_lote():
+    """API para calcular percentiles de un lote de medidas"""
     try:
-        data = request.get_json()
-        if not data:
-            return jsonify({'success': False, 'error': 'Datos requeridos'}), 400
+        # Validación por columnas: conversión, NaN y rangos de todo el lote de golpe
+        valores = ESQUEMA_LOTE_PERCENTIL.validar(leer_payload())
         
-        talla_inicial = float(data.get('talla_inicial', 0))
-        talla_actual = float(data.get('talla_actual', 0))
-        tiempo_meses = int(data.get('tiempo_meses', 0))
+        try:
+            with presupuesto_memoria.reservar(valores['medidas'].size * BYTES_POR_FILA_LOTE):
+                percentiles = calculator.estimar_percentiles_lote(
+                    valores['medidas'], valores['edades_meses'], valores['sexos'], valores['tipo_medida'])
+                
+                return responder({
+                    'success': True,
+                    'percentiles': percentiles if respuesta_binaria() else [p or None for p in percentiles.tolist()]
+                })
+        except MemoriaInsuficiente as e:
+            # El lote no cabe en el presupuesto: se deriva a la cola de trabajos en disco
+            logger.warning(f"Lote de {valores['medidas'].size} filas fuera de presupuesto: {e}")
+            if cola_trabajos.hilos <= 0:
+                return responder({'success': False, 'error': str(e)}), 503
+            trabajo, _ = cola_trabajos.enviar(
+                valores['tipo_medida'], valores['medidas'], valores['edades_meses'], valores['sexos'])
+            return responder({'success': True, 'encolado': True, 'trabajo': trabajo}), 202
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Percentil Lote: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/calcular_percentil_estandares', methods=['POST'])
+def api_calcular_percentil_estandares():
+    """API para evaluar un lote contra varios estándares de referencia a la vez"""
+    try:
+        data = leer_payload()
+        valores = ESQUEMA_LOTE_ESTANDARES.validar(data)
+        estandares = validar_opciones_lista(
+            'estandares', data.get('estandares'),
+            [ESTANDAR_INTEGRADO] + calculator.estandares.disponibles(valores['tipo_medida']))
         
-        if not all([talla_inicial > 0, talla_actual > 0, tiempo_meses > 0]):
-            return jsonify({'success': False, 'error': 'Datos inválidos'}), 400
+        resultados = calculator.estimar_percentiles_estandares(
+            valores['medidas'], valores['edades_meses'], valores['sexos'], valores['tipo_medida'], estandares)
+        
+        binario = respuesta_binaria()
+        return responder({
+            'success': True,
+            'estandares': {
+                estandar: percentiles if binario else [p or None for p in percentiles.tolist()]
+                for estandar, percentiles in resultados.items()
+            }
+        })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Percentil Estándares: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/estandares')
+@cacheable(lambda: calculator.version_datos())
+def api_estandares():
+    """Estándares de referencia disponibles"""
+    return responder({
+        'success': True,
+        'estandares': {
+            ESTANDAR_INTEGRADO: {'descripcion': 'Referencia integrada de la calculadora', 'fuentes': [],
+                                 'tipos_medida': sorted(calculator.grids) or ['peso', 'talla', 'imc']},
+            **calculator.estandares.resumen()
+        }
+    })
+
+@app.route('/api/calcular_velocidad_crecimiento', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
+def api_calcular_velocidad_crecimiento():
+    """API para calcular velocidad optimizada"""
+    try:
+        valores = ESQUEMA_VELOCIDAD.validar(leer_payload())
         
-        velocidad = calculator.calcular_velocidad_crecimiento(talla_inicial, talla_actual, tiempo_meses)
+        velocidad = calculator.calcular_velocidad_crecimiento(
+            valores['talla_inicial'], valores['talla_actual'], valores['tiempo_meses'])
         
         if velocidad is None:
-            return jsonify({'success': False, 'error': 'Error en cálculo'}), 500
+            return responder({'success': False, 'error': 'Error en cálculo'}), 500
         
-        return jsonify({
+        return responder({
             'success': True,
             'velocidad_cm_año': velocidad,
             'evaluacion': evaluar_velocidad_crecimiento(velocidad)
         })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
     except Exception as e:
         logger.error(f"Error en API Velocidad: {e}")
-        return jsonify({'success': False, 'error': 'Error interno'}), 500
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/series_crecimiento', methods=['GET', 'POST'])
+@cacheable(lambda: calculator.version_datos())
+def api_series_crecimiento():
+    """API de curvas de percentiles para Chart.js optimizada"""
+    try:
+        data = leer_payload()
+        valores = ESQUEMA_SERIES.validar(data)
+        tipo_medida, sexo = valores['tipo_medida'], valores['sexo']
+        
+        serie = series_percentiles(calculator, tipo_medida, sexo, valores['puntos'])
+        paciente = puntos_paciente(calculator, tipo_medida, sexo, data)
+        
+        return responder({
+            'success': True,
+            'version_datos': calculator.version_datos(),
+            **serie,
+            'paciente': paciente
+        })
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except ValueError as e:
+        return responder({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Error en API Series: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/paquete_cliente/version')
+def api_version_paquete_cliente():
+    """Versión vigente del paquete del cliente (sin caché: así detecta el navegador uno obsoleto)"""
+    try:
+        contenido, version = paquete_cliente.obtener()
+        respuesta = responder({
+            'success': True,
+            'version': version,
+            'version_datos': calculator.version_datos(),
+            'url': url_for('api_paquete_cliente', v=version),
+            'bytes': len(contenido)
+        })
+        respuesta.headers['Cache-Control'] = 'no-cache'
+        return respuesta
+    except Exception as e:
+        logger.error(f"Error en versión del paquete del cliente: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/paquete_cliente')
+def api_paquete_cliente():
+    """Paquete binario de referencias para el motor del navegador (inmutable con ?v=<versión>)"""
+    try:
+        contenido, version = paquete_cliente.obtener()
+        if version in request.if_none_match:
+            respuesta = Response(status=304)
+        else:
+            respuesta = Response(contenido, mimetype='application/octet-stream')
+        respuesta.set_etag(version)
+        respuesta.headers['Cache-Control'] = (
+            'public, max-age=31536000, immutable' if request.args.get('v') == version else 'no-cache')
+        respuesta.headers['X-Version-Paquete'] = version
+        return respuesta
+    except Exception as e:
+        logger.error(f"Error en paquete del cliente: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/sw.js')
+def service_worker():
+    """Service worker desde la raíz para que controle la página principal"""
+    respuesta = send_from_directory(os.path.join(app.static_folder, 'js'), 'sw.js',
+                                    mimetype='application/javascript', max_age=0)
+    respuesta.headers['Cache-Control'] = 'no-cache'
+    return respuesta
+
+def almacen_no_configurado():
+    """Respuesta de las rutas de seguimiento cuando no hay almacén de mediciones"""
+    return responder({'success': False, 'error': 'Almacén de mediciones no configurado (ANTROPOMETRIA_MEDICIONES)'}), 503
+
+@app.route('/api/pacientes/<paciente>/visitas', methods=['POST'])
+def api_anadir_visita(paciente):
+    """API para guardar las medidas de una visita y devolver la trayectoria del paciente"""
+    if almacen_mediciones is None:
+        return almacen_no_configurado()
+    try:
+        validar_paciente(paciente)
+        data = leer_payload()
+        valores = ESQUEMA_VISITA.validar(data)
+        medidas = {
+            tipo_medida: valor
+            for tipo_medida, valor in ESQUEMA_MEDIDAS_VISITA.validar(data.get('medidas') or {}).items()
+            if valor is not None
+        }
+        if not medidas:
+            raise ErrorValidacion([{'campo': 'medidas', 'error': f"requiere al menos una de: {', '.join(TIPOS_MEDIDA)}"}])
+        if 'imc' not in medidas and 'peso' in medidas and 'talla' in medidas:
+            medidas['imc'] = calculator.calcular_imc(medidas['peso'], medidas['talla'])
+        
+        guardadas = almacen_mediciones.anadir(
+            paciente, valores['fecha_medicion'], valores['edad_meses'], valores['sexo'],
+            list(medidas), list(medidas.values()))
+        
+        return responder({
+            'success': True,
+            'guardadas': guardadas,
+            'trayectoria': almacen_mediciones.trayectoria(paciente)
+        }), 201
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Visita: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/pacientes/<paciente>/trayectoria')
+def api_trayectoria(paciente):
+    """Mediciones puntuadas de un paciente, ordenadas por fecha (opcionalmente de un tipo)"""
+    if almacen_mediciones is None:
+        return almacen_no_configurado()
+    try:
+        validar_paciente(paciente)
+        tipo_medida = request.args.get('tipo_medida') or None
+        if tipo_medida is not None and tipo_medida not in TIPOS_MEDIDA:
+            raise ErrorValidacion([{'campo': 'tipo_medida', 'error': f"debe ser uno de: {', '.join(TIPOS_MEDIDA)}"}])
+        
+        trayectoria = almacen_mediciones.trayectoria(paciente, tipo_medida)
+        if trayectoria is None:
+            return responder({'success': False, 'error': 'Paciente sin mediciones'}), 404
+        return responder({'success': True, 'version_datos': calculator.version_datos(), **trayectoria})
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Trayectoria: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/visitas', methods=['POST'])
+def api_anadir_visitas():
+    """API para cargar en bloque mediciones de muchos pacientes (un tipo de medida por llamada)"""
+    if almacen_mediciones is None:
+        return almacen_no_configurado()
+    try:
+        valores = ESQUEMA_LOTE_VISITAS.validar(leer_payload())
+        guardadas = almacen_mediciones.anadir(
+            valores['pacientes'], valores['fechas_medicion'], valores['edades_meses'], valores['sexos'],
+            valores['tipo_medida'], valores['medidas'])
+        
+        return responder({'success': True, 'guardadas': guardadas})
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Visitas Lote: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/memoria')
+def api_memoria():
+    """Memoria usada por datos, rejillas, cachés y lotes en curso, y presupuesto"""
+    return responder(presupuesto_memoria.informe())
+
+@app.route('/api/admision')
+def api_admision():
+    """Peticiones en curso, en cola, rechazadas y tiempo de servicio por clase de ruta"""
+    if control_admision is None:
+        return responder({'activo': False})
+    return responder({'activo': True, **control_admision.estadisticas()})
+
+@app.route('/api/trabajos', methods=['POST'])
+def api_crear_trabajo():
+    """API para encolar un lote grande como trabajo asíncrono"""
+    try:
+        valores = ESQUEMA_LOTE_PERCENTIL.validar(leer_payload())
+        trabajo, nuevo = cola_trabajos.enviar(
+            valores['tipo_medida'], valores['medidas'], valores['edades_meses'], valores['sexos'])
+        
+        if nuevo:
+            logger.info(f"Trabajo {trabajo['id']} encolado ({trabajo['filas']} filas)")
+        return responder({'success': True, 'trabajo': trabajo}), 202 if nuevo else 200
+    except ErrorValidacion as e:
+        return responder(e.payload()), 400
+    except Exception as e:
+        logger.error(f"Error en API Trabajos: {e}")
+        return responder({'success': False, 'error': 'Error interno'}), 500
+
+@app.route('/api/trabajos/<trabajo_id>')
+def api_estado_trabajo(trabajo_id):
+    """Estado y progreso de un trabajo"""
+    trabajo = cola_trabajos.estado(trabajo_id)
+    if trabajo is None:
+        return responder({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return responder({'success': True, 'trabajo': trabajo})
+
+@app.route('/api/trabajos/<trabajo_id>/eventos')
+def api_eventos_trabajo(trabajo_id):
+    """Progreso de un trabajo como Server-Sent Events"""
+    if cola_trabajos.estado(trabajo_id) is None:
+        return responder({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    
+    def flujo():
+        # Se corta antes del timeout de gunicorn; EventSource reconecta solo
+        for trabajo in cola_trabajos.eventos(trabajo_id, espera_max=100):
+            yield f"data: {json.dumps(trabajo)}\n\n"
+    
+    return Response(flujo(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/trabajos/<trabajo_id>/resultado')
+def api_resultado_trabajo(trabajo_id):
+    """Percentiles de un trabajo completado"""
+    trabajo = cola_trabajos.estado(trabajo_id)
+    if trabajo is None:
+        return responder({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    if trabajo['estado'] != COMPLETADO:
+        return responder({'success': False, 'error': 'El trabajo no ha terminado', 'trabajo': trabajo}), 409
+    
+    percentiles = cola_trabajos.resultado(trabajo_id)
+    return responder({
+        'success': True,
+        'percentiles': percentiles if respuesta_binaria() else [p or None for p in percentiles.tolist()]
+    })
 
 # Funciones auxiliares optimizadas
 def clasificar_imc(imc):
@@ -357,6 +915,13 @@ def evaluar_velocidad_crecimiento(velocidad):
     else:
         return {"evaluacion": "Velocidad rápida", "color": "orange"}
 
+# Antes de aceptar tráfico: con --preload una sola vez en el maestro
+calentamiento.calentar()
+if calentamiento.listo:
+    logger.info(f"Calentamiento {calentamiento.estado} en {calentamiento.duracion_s} s")
+else:
+    logger.error(f"Calentamiento {calentamiento.estado}: {calentamiento.resultados}")
+
 if __name__ == '__main__':
     logger.info("Iniciando aplicación antropométrica para Raspberry Pi 5")
     app.run(debug=False, host='0.0.0.0', port=5000)
\ No newline at end of file
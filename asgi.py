@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Punto de entrada ASGI de la calculadora antropométrica
+
+Expone el mismo contrato /api/* que app.py. Las rutas normales pasan por el
+adaptador WSGI; el lote de percentiles se atiende de forma asíncrona y delega
+el cálculo vectorizado en un pool de hilos acotado, de modo que las conexiones
+en espera no ocupan un hilo cada una.
+
+La ruta nativa no pasa por los `before_request` de Flask, así que aplica por su
+cuenta lo mismo que ellos: control de admisión (clase lote) y vigilancia del
+presupuesto de memoria. La cola de trabajos, a la que se derivan los lotes que
+no caben en memoria, arranca en el `lifespan` del servidor.
+
+Uso:
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 2
+"""
+
+import asyncio
+import json
+import os
+import time
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+
+from admission_control import clasificar, espera_previa, payload_saturado
+from app import app, cola_trabajos, control_admision, procesar_lote_percentiles
+from codec import MIME_JSON, MIME_MSGPACK, codificar, decodificar, es_msgpack, prefiere_msgpack
+from memory_budget import presupuesto_memoria
+from schemas import ErrorValidacion
+
+RUTA_LOTE = '/api/calcular_percentil_lote'
+ENDPOINT_LOTE = 'api_calcular_percentil_lote'
+
+# Hilos para las rutas WSGI, hilos dedicados al cálculo de lotes y lotes
+# admitidos a la vez (en cálculo o en cola)
+MAX_HILOS_WSGI = int(os.environ.get('ANTROPOMETRIA_ASGI_HILOS_WSGI', 8))
+MAX_HILOS_LOTE = int(os.environ.get('ANTROPOMETRIA_ASGI_HILOS', min(4, os.cpu_count() or 1)))
+MAX_LOTES_PENDIENTES = int(os.environ.get('ANTROPOMETRIA_ASGI_PENDIENTES', 64))
+
+
+class AnthropometricASGI:
+    def __init__(self, wsgi_app):
+        self.wsgi = WSGIMiddleware(wsgi_app, workers=MAX_HILOS_WSGI)
+        self.executor = ThreadPoolExecutor(max_workers=MAX_HILOS_LOTE, thread_name_prefix='lote')
+        self._pendientes = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == RUTA_LOTE and scope['method'] == 'POST':
+            await self.calcular_lote(scope, receive, send)
+        else:
+            await self.wsgi(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        """Gestiona el arranque y la parada del servidor"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                # Sin esto los hilos de la cola solo arrancarían con alguna petición WSGI
+                cola_trabajos.iniciar()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def calcular_lote(self, scope, receive, send):
+        """Atiende /api/calcular_percentil_lote sin bloquear el bucle de eventos"""
+        if self._pendientes is None:
+            self._pendientes = asyncio.Semaphore(MAX_LOTES_PENDIENTES)
+
+        if self._pendientes.locked():
+            await self.responder(send, {'success': False, 'error': 'Servidor ocupado'}, status=503)
+            return
+
+        cabeceras = {nombre.decode('latin-1'): valor.decode('latin-1') for nombre, valor in scope['headers']}
+        binario = prefiere_msgpack(cabeceras.get('accept'))
+        async with self._pendientes:
+            try:
+                cuerpo = await self.leer_cuerpo(receive)
+                content_type = cabeceras.get('content-type')
+                data = decodificar(cuerpo) if es_msgpack(content_type) else json.loads(cuerpo)
+                loop = asyncio.get_running_loop()
+                payload, status = await loop.run_in_executor(
+                    self.executor, partial(self.procesar_admitido, data, binario,
+                                           espera_previa(cabeceras.get('x-request-start')))
+                )
+                reintento = payload.get('reintentar_s') if status == 503 else None
+                cabeceras_extra = [(b'retry-after', str(reintento).encode())] if reintento else []
+                await self.responder(send, payload, status=status, binario=binario, cabeceras_extra=cabeceras_extra)
+            except ErrorValidacion as e:
+                await self.responder(send, e.payload(), status=400, binario=binario)
+            except Exception as e:
+                await self.responder(send, {'success': False, 'error': str(e)}, binario=binario)
+
+    def procesar_admitido(self, data, binario, previa_s):
+        """Lo que harían los `before_request` de Flask y la ruta (en un hilo del pool de lotes)"""
+        cola_trabajos.iniciar()
+        presupuesto_memoria.comprobar()
+        clase = clasificar(ENDPOINT_LOTE)
+        if control_admision is not None:
+            reintento = control_admision.entrar(clase, previa_s)
+            if reintento is not None:
+                return payload_saturado(reintento), 503
+        inicio = time.perf_counter()
+        try:
+            return procesar_lote_percentiles(data, binario=binario)
+        finally:
+            if control_admision is not None:
+                control_admision.salir(clase, time.perf_counter() - inicio)
+
+    async def leer_cuerpo(self, receive):
+        """Lee el cuerpo completo de la petición"""
+        partes = []
+        while True:
+            message = await receive()
+            partes.append(message.get('body', b''))
+            if not message.get('more_body'):
+                return b''.join(partes)
+
+    async def responder(self, send, payload, status=200, binario=False, cabeceras_extra=()):
+        """Envía una respuesta JSON (mismo formato que jsonify) o MessagePack"""
+        if binario:
+            body, mimetype = codificar(payload), MIME_MSGPACK
+        else:
+            body, mimetype = (json.dumps(payload, separators=(',', ':'), sort_keys=True) + '\n').encode(), MIME_JSON
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [
+                (b'content-type', mimetype.encode()),
+                (b'vary', b'Accept'),
+                (b'content-length', str(len(body)).encode()),
+                *cabeceras_extra,
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+application = AnthropometricASGI(app)
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Logging asíncrono y estructurado que no bloquea las peticiones
+
+Los registros se encolan en una cola acotada y un hilo en segundo plano los
+escribe como líneas JSON. Si la cola se llena (p. ej. la tarjeta SD se atasca)
+los registros se descartan y se cuentan en lugar de bloquear la petición, y los
+errores repetitivos se muestrean para no inundar el disco. Las trazas de las
+excepciones también se formatean en el hilo de escritura y salen en su propio
+campo `excepcion`.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+# Atributos estándar de LogRecord que no se copian como campos extra
+_ATRIBUTOS_RECORD = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """Formatea cada registro como una línea JSON"""
+
+    def format(self, record):
+        linea = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'nivel': record.levelname,
+            'logger': record.name,
+            'mensaje': record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_RECORD:
+                linea[clave] = valor
+        if record.exc_info and not record.exc_text:
+            # Se guarda en el registro: los demás destinos reutilizan el texto
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            linea['excepcion'] = record.exc_text
+        if record.stack_info:
+            linea['pila'] = self.formatStack(record.stack_info)
+        return json.dumps(linea, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar las primeras `rafaga` repeticiones de un mismo mensaje por ventana.
+
+    El resto se descarta y se cuenta; el primer registro de la ventana
+    siguiente lleva el número de repeticiones suprimidas en `suprimidos`.
+    """
+
+    def __init__(self, rafaga=10, ventana_s=60.0, nivel_minimo=logging.WARNING):
+        super().__init__()
+        self.rafaga = rafaga
+        self.ventana_s = ventana_s
+        self.nivel_minimo = nivel_minimo
+        self.muestreados = 0
+        self._ventanas = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.nivel_minimo:
+            return True
+        clave = (record.name, record.levelno, str(record.msg))
+        ahora = time.monotonic()
+        with self._lock:
+            inicio, emitidos, suprimidos = self._ventanas.get(clave, (ahora, 0, 0))
+            if ahora - inicio >= self.ventana_s:
+                if suprimidos:
+                    record.suprimidos = suprimidos
+                inicio, emitidos, suprimidos = ahora, 0, 0
+            if emitidos >= self.rafaga:
+                self._ventanas[clave] = (inicio, emitidos, suprimidos + 1)
+                self.muestreados += 1
+                return False
+            self._ventanas[clave] = (inicio, emitidos + 1, suprimidos)
+            if len(self._ventanas) > 1000:
+                # Evita que la tabla de ventanas crezca sin límite con mensajes únicos
+                self._ventanas = {c: v for c, v in self._ventanas.items() if ahora - v[0] < self.ventana_s}
+        return True
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (y cuenta) en lugar de bloquear con la cola llena"""
+
+    def __init__(self, cola):
+        super().__init__(cola)
+        self.encolados = 0
+        self.descartados = 0
+
+    def prepare(self, record):
+        """Copia el registro con el mensaje ya resuelto, sin formatearlo.
+
+        El QueueHandler estándar formatea el registro aquí (en el hilo de la
+        petición) y borra `exc_info`, con lo que la traza acabaría dentro del
+        mensaje. Se conserva `exc_info` para que JSONFormatter la formatee en el
+        hilo de escritura, en su campo.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+            self.encolados += 1
+        except queue.Full:
+            self.descartados += 1
+
+
+_estado = {}
+
+
+def configurar_logging(ruta_fichero, level=logging.INFO, capacidad=10000, rafaga=10, ventana_s=60.0):
+    """Sustituye los handlers del logger raíz por la tubería asíncrona.
+
+    Devuelve el QueueListener que escribe en segundo plano (se detiene al salir).
+    """
+    cola = queue.Queue(maxsize=capacidad)
+    handler_cola = BoundedQueueHandler(cola)
+    muestreo = SamplingFilter(rafaga, ventana_s)
+    handler_cola.addFilter(muestreo)
+
+    formato_json = JSONFormatter()
+    destinos = [logging.StreamHandler()]
+    try:
+        destinos.append(logging.FileHandler(ruta_fichero))
+    except OSError as e:
+        print(f"No se puede abrir el log {ruta_fichero}: {e}")
+    for destino in destinos:
+        destino.setFormatter(formato_json)
+
+    raiz = logging.getLogger()
+    for handler in list(raiz.handlers):
+        raiz.removeHandler(handler)
+    raiz.addHandler(handler_cola)
+    raiz.setLevel(level)
+
+    listener = logging.handlers.QueueListener(cola, *destinos, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+    _estado.update(handler=handler_cola, muestreo=muestreo, cola=cola)
+    return listener
+
+
+def estadisticas_logging():
+    """Contadores de la tubería de logging para monitorización"""
+    if not _estado:
+        return {}
+    return {
+        'encolados': _estado['handler'].encolados,
+        'descartados': _estado['handler'].descartados,
+        'muestreados': _estado['muestreo'].muestreados,
+        'pendientes': _estado['cola'].qsize(),
+    }
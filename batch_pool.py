@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Reparto de lotes muy grandes entre varios núcleos con un pool de procesos
+
+Las rejillas de percentiles se publican una sola vez en memoria compartida y
+los procesos del pool las leen directamente, sin copiarlas ni serializarlas en
+cada tarea. Cada tarea solo transporta su trozo de medidas, edades y sexos.
+"""
+
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from percentile_grid import PercentileBandGrid
+
+# Rejillas adjuntadas en cada proceso del pool: tipo_medida -> (grid, SharedMemory)
+_grids_proceso = {}
+
+
+def _inicializar_proceso(descriptores):
+    """Adjunta las rejillas publicadas en memoria compartida (en el proceso hijo)"""
+    for tipo_medida, (nombre, forma, edad_min, q_min, paso) in descriptores.items():
+        shm = shared_memory.SharedMemory(name=nombre)
+        bandas = np.ndarray(forma, dtype=np.uint8, buffer=shm.buf)
+        _grids_proceso[tipo_medida] = (PercentileBandGrid.desde_bandas(bandas, edad_min, q_min, paso), shm)
+
+
+def _procesar_bloque(tipo_medida, medidas, edades, es_masculino):
+    """Calcula las bandas de un bloque (en el proceso hijo)"""
+    grid, _ = _grids_proceso[tipo_medida]
+    return grid.bandas_lote(medidas, edades, es_masculino)
+
+
+class BatchProcessPool:
+    """Pool persistente de procesos para calcular bandas de percentil por bloques"""
+
+    def __init__(self, grids, procesos=None, filas_por_bloque=50000):
+        self.procesos = procesos or os.cpu_count() or 1
+        self.filas_por_bloque = filas_por_bloque
+        self._memorias = []
+        self._executor = None
+        self._pid_creador = os.getpid()
+
+        # Publicar cada rejilla en un bloque de memoria compartida
+        self._descriptores = {}
+        for tipo_medida, grid in grids.items():
+            shm = shared_memory.SharedMemory(create=True, size=grid.bandas.nbytes)
+            np.ndarray(grid.bandas.shape, dtype=np.uint8, buffer=shm.buf)[:] = grid.bandas
+            self._memorias.append(shm)
+            self._descriptores[tipo_medida] = (
+                shm.name, grid.bandas.shape, grid.edad_min_meses, grid.q_min, grid.paso
+            )
+        atexit.register(self.cerrar)
+
+    @property
+    def executor(self):
+        """Pool de procesos, creado en el primer uso y reutilizado después"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_proceso,
+                initargs=(self._descriptores,)
+            )
+        return self._executor
+
+    def bandas_lote(self, tipo_medida, medidas, edades_meses, sexos):
+        """Equivalente a PercentileBandGrid.bandas_lote repartido en bloques.
+
+        Los resultados se reúnen en el orden original de las filas.
+        """
+        medidas = np.asarray(medidas, dtype=np.float64)
+        edades = np.asarray(edades_meses, dtype=np.float64)
+        sexos = np.broadcast_to(np.asarray(sexos), medidas.shape)
+        es_masculino = sexos if sexos.dtype == np.bool_ else sexos == 'masculino'
+
+        bandas = np.zeros(medidas.shape, dtype=np.uint8)
+        cubiertas = np.zeros(medidas.shape, dtype=bool)
+        inicios = range(0, medidas.size, self.filas_por_bloque)
+        futuros = [
+            self.executor.submit(
+                _procesar_bloque, tipo_medida,
+                medidas[i:i + self.filas_por_bloque],
+                edades[i:i + self.filas_por_bloque],
+                es_masculino[i:i + self.filas_por_bloque]
+            )
+            for i in inicios
+        ]
+        for i, futuro in zip(inicios, futuros):
+            bandas_bloque, cubiertas_bloque = futuro.result()
+            bandas[i:i + bandas_bloque.size] = bandas_bloque
+            cubiertas[i:i + cubiertas_bloque.size] = cubiertas_bloque
+        return bandas, cubiertas
+
+    def cerrar(self):
+        """Detiene el pool y libera la memoria compartida"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+        # Con gunicorn --preload los workers heredan los bloques: solo el
+        # proceso que los creó los libera
+        if os.getpid() != self._pid_creador:
+            return
+        for shm in self._memorias:
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        self._memorias = []
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Eficiencia de escalado del pool de procesos para lotes grandes
+
+Mide el cálculo de percentiles de un lote con 1..N procesos y lo compara con
+la llamada vectorizada en un solo proceso.
+
+Uso:
+    python benchmarks/bench_batch_pool.py --filas 1000000 --procesos 4
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_pool import BatchProcessPool  # noqa: E402
+
+
+def cronometrar(funcion, repeticiones):
+    """Mejor tiempo (s) de varias ejecuciones"""
+    mejor = float('inf')
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--filas', type=int, default=1000000)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--filas-por-bloque', type=int, default=50000)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    # Importado aquí para que los procesos hijos (spawn) no reconstruyan el calculador
+    from app import calculator
+
+    rng = np.random.default_rng(0)
+    medidas = np.round(rng.uniform(45, 190, args.filas), 1)
+    edades = rng.integers(0, 217, args.filas)
+    sexos = rng.random(args.filas) < 0.5
+    grid = calculator.grids['talla']
+
+    base = cronometrar(lambda: grid.bandas_lote(medidas, edades, sexos), args.repeticiones)
+    print(f"{args.filas} filas, bloques de {args.filas_por_bloque}")
+    print(f"{'Procesos':>9}{'Tiempo s':>10}{'Filas/s':>14}{'Speedup':>9}{'Eficiencia':>12}")
+    print(f"{'vector':>9}{base:>10.3f}{args.filas / base:>14.0f}{1.0:>9.2f}{'-':>12}")
+
+    referencia = None
+    for procesos in range(1, args.procesos + 1):
+        pool = BatchProcessPool(calculator.grids, procesos, args.filas_por_bloque)
+        try:
+            # Calentar el pool: arranque de procesos y adjuntado de la memoria compartida
+            pool.bandas_lote('talla', medidas[:procesos], edades[:procesos], sexos[:procesos])
+            tiempo = cronometrar(lambda: pool.bandas_lote('talla', medidas, edades, sexos), args.repeticiones)
+        finally:
+            pool.cerrar()
+        referencia = referencia or tiempo
+        speedup = referencia / tiempo
+        print(f"{procesos:>9}{tiempo:>10.3f}{args.filas / tiempo:>14.0f}{speedup:>9.2f}{speedup / procesos:>12.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Benchmark de servicio: gunicorn (configuración actual) frente al modo ASGI
+
+Lanza muchas conexiones keep-alive concurrentes contra cada servidor con una
+mezcla de peticiones individuales y de lote, y muestra rendimiento y latencias.
+
+Uso:
+    python benchmarks/bench_serving.py --arrancar
+    python benchmarks/bench_serving.py --url http://localhost:8080 --conexiones 500
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Misma configuración que Dockerfile.rpi
+COMANDO_GUNICORN = [
+    sys.executable, '-m', 'gunicorn', '--workers', '2', '--threads', '4',
+    '--worker-class', 'gthread', '--timeout', '120', '--preload', 'app:app'
+]
+COMANDO_UVICORN = [sys.executable, '-m', 'uvicorn', '--workers', '2', '--log-level', 'warning', 'asgi:application']
+
+
+def payload_individual():
+    return '/api/calcular_percentil', {
+        'medida': round(random.uniform(60, 180), 1),
+        'edad_meses': random.randint(0, 216),
+        'sexo': random.choice(['masculino', 'femenino']),
+        'tipo_medida': 'talla'
+    }
+
+
+def payload_lote(filas):
+    return '/api/calcular_percentil_lote', {
+        'tipo_medida': 'talla',
+        'medidas': [round(random.uniform(60, 180), 1) for _ in range(filas)],
+        'edades_meses': [random.randint(0, 216) for _ in range(filas)],
+        'sexo': 'femenino'
+    }
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) de una lista ya ordenada"""
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def resumir(latencias, errores, duracion):
+    """Rendimiento, percentiles de latencia (ms) y tasa de error"""
+    latencias = sorted(latencias)
+    total = len(latencias) + errores
+    return {
+        'peticiones': total,
+        'rps': total / duracion if duracion else 0.0,
+        'p50_ms': percentil(latencias, 50) * 1000,
+        'p95_ms': percentil(latencias, 95) * 1000,
+        'p99_ms': percentil(latencias, 99) * 1000,
+        'errores_pct': 100 * errores / total if total else 0.0,
+    }
+
+
+async def peticion(reader, writer, host, metodo, ruta, cuerpo=b'', cabeceras=None):
+    """Envía una petición HTTP/1.1 keep-alive y devuelve (status, cuerpo)"""
+    lineas = [f'{metodo} {ruta} HTTP/1.1', f'Host: {host}', f'Content-Length: {len(cuerpo)}']
+    for nombre, valor in (cabeceras or {}).items():
+        lineas.append(f'{nombre}: {valor}')
+    writer.write(('\r\n'.join(lineas) + '\r\n\r\n').encode() + cuerpo)
+    await writer.drain()
+
+    cabecera = await reader.readuntil(b'\r\n\r\n')
+    lineas = cabecera.decode('latin-1').split('\r\n')
+    status = int(lineas[0].split()[1])
+    longitud = 0
+    for linea in lineas[1:]:
+        if linea.lower().startswith('content-length:'):
+            longitud = int(linea.split(':', 1)[1])
+    return status, await reader.readexactly(longitud)
+
+
+async def cliente(url, fin, proporcion_lote, filas_lote, latencias, contador):
+    """Una conexión que envía peticiones en bucle hasta el instante `fin`"""
+    partes = urlsplit(url)
+    try:
+        reader, writer = await asyncio.open_connection(partes.hostname, partes.port or 80)
+    except OSError:
+        contador['errores'] += 1
+        return
+    try:
+        while time.perf_counter() < fin:
+            if random.random() < proporcion_lote:
+                ruta, data = payload_lote(filas_lote)
+            else:
+                ruta, data = payload_individual()
+            inicio = time.perf_counter()
+            try:
+                status, _ = await peticion(reader, writer, partes.netloc, 'POST', ruta,
+                                           json.dumps(data).encode(),
+                                           {'Content-Type': 'application/json'})
+            except (OSError, asyncio.IncompleteReadError):
+                contador['errores'] += 1
+                return
+            if status == 200:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                contador['errores'] += 1
+    finally:
+        writer.close()
+
+
+async def medir(url, conexiones, duracion, proporcion_lote, filas_lote):
+    latencias, contador = [], {'errores': 0}
+    inicio = time.perf_counter()
+    fin = inicio + duracion
+    await asyncio.gather(*(
+        cliente(url, fin, proporcion_lote, filas_lote, latencias, contador)
+        for _ in range(conexiones)
+    ))
+    return resumir(latencias, contador['errores'], time.perf_counter() - inicio)
+
+
+def arrancar(comando, puerto):
+    """Arranca un servidor en segundo plano desde la raíz del repositorio"""
+    if 'gunicorn' in comando:
+        comando = comando[:3] + ['--bind', f'127.0.0.1:{puerto}'] + comando[3:]
+    else:
+        comando = comando[:3] + ['--port', str(puerto)] + comando[3:]
+    proceso = subprocess.Popen(comando, cwd=RAIZ, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(3)
+    return proceso
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', action='append', help='Servidor ya arrancado (repetible)')
+    parser.add_argument('--arrancar', action='store_true', help='Arranca gunicorn y uvicorn localmente')
+    parser.add_argument('--conexiones', type=int, default=200)
+    parser.add_argument('--duracion', type=float, default=10.0, help='Segundos por servidor')
+    parser.add_argument('--proporcion-lote', type=float, default=0.1)
+    parser.add_argument('--filas-lote', type=int, default=1000)
+    args = parser.parse_args()
+
+    objetivos, procesos = [], []
+    if args.arrancar:
+        procesos.append(arrancar(COMANDO_GUNICORN, 5101))
+        objetivos.append(('gunicorn gthread 2x4', 'http://127.0.0.1:5101'))
+        procesos.append(arrancar(COMANDO_UVICORN, 5102))
+        objetivos.append(('uvicorn ASGI x2', 'http://127.0.0.1:5102'))
+    for url in args.url or []:
+        objetivos.append((url, url))
+
+    try:
+        print(f"{'Servidor':<24}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'error %':>10}")
+        for nombre, url in objetivos:
+            r = asyncio.run(medir(url, args.conexiones, args.duracion, args.proporcion_lote, args.filas_lote))
+            print(f"{nombre:<24}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+                  f"{r['p99_ms']:>10.1f}{r['errores_pct']:>10.2f}")
+    finally:
+        for proceso in procesos:
+            proceso.terminate()
+            proceso.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Reproducción de tráfico real contra una instancia local
+
+Lee las peticiones /api/* de los logs de acceso de nginx (formato `main` de
+nginx/nginx.conf y nginx/nginx.rpi.conf, también rotados en .gz) o de la
+captura de la app (traffic_capture.py, `ANTROPOMETRIA_CAPTURA`) y las
+reproduce respetando los intervalos originales divididos por --aceleracion.
+Muestra rendimiento, latencias p50/p95/p99 y tasa de error, en total y por
+ruta, para comparar workers, cachés o motores con la mezcla real.
+
+La latencia se mide desde el instante en que la petición debía salir, así que
+incluye la espera por una conexión libre cuando el servidor no da abasto. El
+log de nginx no guarda cuerpos: los GET se reproducen tal cual y los POST de
+las rutas de cálculo llevan cuerpos sintéticos (columna "sint."); la captura
+de la app reproduce los cuerpos reales.
+
+Uso:
+    python benchmarks/replay_traffic.py --log /var/log/nginx/access.log --url http://localhost:5000
+    python benchmarks/replay_traffic.py --captura captura.jsonl --url http://localhost:5000 --aceleracion 10
+"""
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import random
+import re
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+from bench_serving import payload_individual, payload_lote, peticion, resumir
+
+# log_format main de nginx: '$remote_addr - $remote_user [$time_local] "$request" $status ...'
+LINEA_NGINX = re.compile(
+    r'^\S+ - \S+ \[(?P<fecha>[^\]]+)\] "(?P<metodo>[A-Z]+) (?P<ruta>\S+)[^"]*" (?P<status>\d{3}) ')
+FORMATO_FECHA_NGINX = '%d/%b/%Y:%H:%M:%S %z'
+
+# Rutas de streaming (eventos SSE) que no tienen sentido en una reproducción
+RUTAS_EXCLUIDAS = re.compile(r'/eventos$')
+# Identificadores en la ruta que se agrupan en el informe por ruta
+IDENTIFICADORES = re.compile(r'^(/api/(?:pacientes|trabajos))/[^/]+')
+
+FILAS_LOTE_SINTETICO = 1000
+
+
+def _sexo():
+    return random.choice(['masculino', 'femenino'])
+
+
+# Cuerpos de los POST que el log de nginx no guarda
+CUERPOS_SINTETICOS = {
+    '/api/calcular_percentil': lambda: payload_individual()[1],
+    '/api/calcular_percentil_lote': lambda: payload_lote(FILAS_LOTE_SINTETICO)[1],
+    '/api/calcular_imc': lambda: {
+        'peso': round(random.uniform(3, 90), 1), 'talla': round(random.uniform(50, 190), 1)},
+    '/api/calcular_talla_diana': lambda: {
+        'talla_padre': round(random.uniform(160, 195), 1), 'talla_madre': round(random.uniform(150, 180), 1),
+        'sexo_hijo': _sexo()},
+    '/api/calcular_velocidad_crecimiento': lambda: {
+        'talla_inicial': round(random.uniform(60, 140), 1), 'talla_actual': round(random.uniform(140, 150), 1),
+        'tiempo_meses': random.randint(3, 24)},
+    '/api/series_crecimiento': lambda: {'tipo_medida': random.choice(['peso', 'talla', 'imc']), 'sexo': _sexo()},
+}
+
+
+def _reproducible(metodo, ruta, prefijo):
+    return metodo in ('GET', 'POST') and ruta.startswith(prefijo) and not RUTAS_EXCLUIDAS.search(ruta.split('?')[0])
+
+
+def _sintetica(ts, ruta, status):
+    """POST con cuerpo sintético, o None si la ruta no tiene generador"""
+    generador = CUERPOS_SINTETICOS.get(ruta.split('?')[0])
+    if generador is None:
+        return None
+    return {'ts': ts, 'metodo': 'POST', 'ruta': ruta, 'cuerpo': json.dumps(generador()).encode(),
+            'cabeceras': {'Content-Type': 'application/json'}, 'status': status, 'sintetica': True}
+
+
+def leer_log_nginx(ruta_log, prefijo='/api/'):
+    """Peticiones de un log de acceso de nginx; devuelve (peticiones, omitidas)"""
+    peticiones, omitidas = [], 0
+    abrir = gzip.open if ruta_log.endswith('.gz') else open
+    with abrir(ruta_log, 'rt', encoding='utf-8', errors='replace') as f:
+        for linea in f:
+            campos = LINEA_NGINX.match(linea)
+            if campos is None or not _reproducible(campos['metodo'], campos['ruta'], prefijo):
+                continue
+            ts = datetime.strptime(campos['fecha'], FORMATO_FECHA_NGINX).timestamp()
+            status = int(campos['status'])
+            if campos['metodo'] == 'GET':
+                peticiones.append({'ts': ts, 'metodo': 'GET', 'ruta': campos['ruta'], 'cuerpo': b'',
+                                   'cabeceras': {}, 'status': status, 'sintetica': False})
+                continue
+            sintetica = _sintetica(ts, campos['ruta'], status)
+            if sintetica is None:
+                omitidas += 1
+            else:
+                peticiones.append(sintetica)
+    return peticiones, omitidas
+
+
+def leer_captura(ruta_captura, prefijo='/api/'):
+    """Peticiones de una captura de traffic_capture.py; devuelve (peticiones, omitidas)"""
+    peticiones, omitidas = [], 0
+    with open(ruta_captura, 'r', encoding='utf-8') as f:
+        for linea in f:
+            try:
+                registro = json.loads(linea)
+            except ValueError:
+                continue
+            if not _reproducible(registro['metodo'], registro['ruta'], prefijo):
+                continue
+            if 'cuerpo_omitido' in registro:
+                sintetica = _sintetica(registro['ts'], registro['ruta'], registro['status'])
+                if sintetica is None:
+                    omitidas += 1
+                else:
+                    peticiones.append(sintetica)
+                continue
+            if 'cuerpo_b64' in registro:
+                cuerpo = base64.b64decode(registro['cuerpo_b64'])
+            else:
+                cuerpo = registro.get('cuerpo', '').encode('utf-8')
+            cabeceras = {nombre: registro[clave] for nombre, clave in
+                         (('Content-Type', 'tipo'), ('Accept', 'accept')) if registro.get(clave)}
+            peticiones.append({'ts': registro['ts'], 'metodo': registro['metodo'], 'ruta': registro['ruta'],
+                               'cuerpo': cuerpo, 'cabeceras': cabeceras, 'status': registro['status'],
+                               'sintetica': False})
+    return peticiones, omitidas
+
+
+def clave_ruta(ruta):
+    """Ruta sin query string y con los identificadores agrupados"""
+    return IDENTIFICADORES.sub(r'\1/<id>', ruta.split('?')[0])
+
+
+async def reproducir(url, peticiones, conexiones, aceleracion):
+    """Reproduce las peticiones (ordenadas por ts); devuelve (resultados, duración en s).
+
+    Cada resultado es (petición, status o None si falló la conexión, latencia en s).
+    Con aceleracion 0 se envían sin esperas, tan rápido como lo permitan las conexiones.
+    """
+    partes = urlsplit(url)
+    cola = asyncio.Queue()
+    for p in peticiones:
+        cola.put_nowait(p)
+    resultados = []
+    t0 = peticiones[0]['ts'] if peticiones else 0.0
+    inicio = time.perf_counter()
+
+    async def conexion():
+        reader = writer = None
+        while not cola.empty():
+            p = cola.get_nowait()
+            programado = inicio + (p['ts'] - t0) / aceleracion if aceleracion > 0 else time.perf_counter()
+            espera = programado - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+            try:
+                if writer is None:
+                    reader, writer = await asyncio.open_connection(partes.hostname, partes.port or 80)
+                status, _ = await peticion(reader, writer, partes.netloc, p['metodo'], p['ruta'],
+                                           p['cuerpo'], p['cabeceras'])
+            except (OSError, asyncio.IncompleteReadError, ValueError):
+                status = None
+                if writer is not None:
+                    writer.close()
+                reader = writer = None
+            resultados.append((p, status, time.perf_counter() - programado))
+        if writer is not None:
+            writer.close()
+
+    await asyncio.gather(*(conexion() for _ in range(conexiones)))
+    return resultados, time.perf_counter() - inicio
+
+
+def informe(resultados, duracion):
+    """{ruta: resumen} más la fila 'TOTAL'; error = fallo de conexión o 5xx"""
+    grupos = {}
+    for p, status, latencia in resultados:
+        for clave in (clave_ruta(p['ruta']), 'TOTAL'):
+            grupo = grupos.setdefault(clave, {'latencias': [], 'errores': 0, 'distintas': 0, 'sinteticas': 0})
+            if status is None or status >= 500:
+                grupo['errores'] += 1
+            else:
+                grupo['latencias'].append(latencia)
+            grupo['distintas'] += status != p['status']
+            grupo['sinteticas'] += p['sintetica']
+    filas = {}
+    for clave, grupo in grupos.items():
+        filas[clave] = resumir(grupo['latencias'], grupo['errores'], duracion)
+        filas[clave]['status_distinto'] = grupo['distintas']
+        filas[clave]['sinteticas'] = grupo['sinteticas']
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', required=True, help='Instancia local (p. ej. http://localhost:5000)')
+    parser.add_argument('--log', action='append', default=[], help='Log de acceso de nginx (repetible, admite .gz)')
+    parser.add_argument('--captura', action='append', default=[], help='Captura JSON lines de la app (repetible)')
+    parser.add_argument('--aceleracion', type=float, default=1.0,
+                        help='Factor de aceleración del reloj original (0 = sin esperas)')
+    parser.add_argument('--conexiones', type=int, default=64, help='Conexiones keep-alive simultáneas')
+    parser.add_argument('--limite', type=int, help='Reproduce solo las primeras N peticiones')
+    parser.add_argument('--prefijo', default='/api/', help='Prefijo de las rutas a reproducir')
+    parser.add_argument('--semilla', type=int, default=0, help='Semilla de los cuerpos sintéticos')
+    parser.add_argument('--json', help='Guarda el informe en este fichero')
+    args = parser.parse_args()
+    if not args.log and not args.captura:
+        parser.error('indica al menos un --log o una --captura')
+
+    random.seed(args.semilla)
+    peticiones, omitidas = [], 0
+    for ruta_log in args.log:
+        leidas, sin_cuerpo = leer_log_nginx(ruta_log, args.prefijo)
+        peticiones += leidas
+        omitidas += sin_cuerpo
+    for ruta_captura in args.captura:
+        leidas, sin_cuerpo = leer_captura(ruta_captura, args.prefijo)
+        peticiones += leidas
+        omitidas += sin_cuerpo
+    peticiones.sort(key=lambda p: p['ts'])
+    if args.limite:
+        peticiones = peticiones[:args.limite]
+    if not peticiones:
+        parser.error('no hay peticiones que reproducir')
+
+    original = peticiones[-1]['ts'] - peticiones[0]['ts']
+    print(f"{len(peticiones)} peticiones ({omitidas} POST omitidos sin cuerpo ni generador), "
+          f"{original:.0f} s de tráfico original "
+          f"{'sin esperas' if args.aceleracion <= 0 else f'a x{args.aceleracion:g}'}")
+    resultados, duracion = asyncio.run(reproducir(args.url, peticiones, args.conexiones, args.aceleracion))
+    filas = informe(resultados, duracion)
+
+    print(f"{'Ruta':<40}{'n':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'error %':>10}{'≠status':>9}{'sint.':>7}")
+    for clave in sorted(filas, key=lambda clave: (clave == 'TOTAL', -filas[clave]['peticiones'])):
+        r = filas[clave]
+        print(f"{clave:<40}{r['peticiones']:>8}{r['rps']:>10.1f}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}"
+              f"{r['p99_ms']:>10.1f}{r['errores_pct']:>10.2f}{r['status_distinto']:>9}{r['sinteticas']:>7}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'url': args.url, 'aceleracion': args.aceleracion, 'conexiones': args.conexiones,
+                       'duracion_s': duracion, 'omitidas': omitidas, 'rutas': filas},
+                      f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Paquete binario de referencias para el motor de cálculo del navegador
+
+El servidor publica en un único fichero versionado todo lo que necesita
+static/js/motor.js para reproducir en el navegador los cálculos de
+AnthropometricCalculator: los valores de referencia P3-P97 de cada tipo de
+medida, sexo y mes de edad (float64, los mismos números con que compara el
+servidor) y los rangos de validación de los esquemas. Formato:
+
+    'ANTP' | formato uint16 | reservado uint16 | longitud cabecera uint32
+    cabecera JSON UTF-8 (rellena con espacios hasta múltiplo de 8)
+    referencias float64 little-endian, (2 sexos, n edades, 7) por tipo
+
+La versión es el hash del contenido, así que cambia con los datos de
+referencia o con la fórmula que los genera, y la URL versionada se puede
+cachear como inmutable (navegador, service worker y nginx).
+"""
+
+import hashlib
+import json
+import struct
+import threading
+
+import numpy as np
+
+from percentile_grid import PERCENTILES_REF, SEXOS
+
+MAGIA = b'ANTP'
+FORMATO_PAQUETE = 1
+_PREAMBULO = struct.Struct('<4sHHI')
+
+
+def reglas_esquema(esquema):
+    """Rangos, opciones y normalización de los campos de un Esquema, para validar en el cliente"""
+    return {
+        campo.nombre: {
+            clave: valor for clave, valor in (
+                ('tipo', 'entero' if campo.tipo is int else 'texto' if campo.tipo is str else 'real'),
+                ('minimo', campo.minimo), ('maximo', campo.maximo),
+                ('opciones', list(campo.opciones) if campo.opciones else None),
+                ('minusculas', True if campo.normalizar is str.lower else None),
+            ) if valor is not None
+        }
+        for campo in esquema.campos
+    }
+
+
+def construir_paquete(valores_referencia, tipos_medida, esquemas, version_datos):
+    """(contenido, versión) del paquete.
+
+    `valores_referencia(edad, sexo, tipo)` es el de la calculadora y
+    `esquemas` {nombre: Esquema} los de las rutas que replica el cliente. Cada
+    tipo se publica desde la primera edad con referencias hasta la edad máxima
+    que admite el esquema 'percentil'.
+    """
+    validacion = {nombre: reglas_esquema(esquema) for nombre, esquema in esquemas.items()}
+    edad_max_meses = int(validacion['percentil']['edad_meses']['maximo'])
+    tipos, bloques, offset = {}, [], 0
+    for tipo_medida in tipos_medida:
+        edades = [edad for edad in range(edad_max_meses + 1)
+                  if valores_referencia(edad, SEXOS[0], tipo_medida) is not None]
+        if not edades:
+            continue
+        edades = range(edades[0], edad_max_meses + 1)
+        referencias = np.array([
+            [valores_referencia(edad, sexo, tipo_medida) for edad in edades] for sexo in SEXOS
+        ], dtype='<f8')
+        tipos[tipo_medida] = {'edad_min': edades[0], 'edad_max': edades[-1], 'offset': offset}
+        bloques.append(referencias.tobytes())
+        offset += referencias.size
+
+    datos = b''.join(bloques)
+    cabecera = {
+        'percentiles': PERCENTILES_REF,
+        'sexos': SEXOS,
+        'tipos': tipos,
+        'validacion': validacion,
+        'version_datos': version_datos,
+    }
+    version = hashlib.sha256(
+        json.dumps(cabecera, sort_keys=True).encode('utf-8') + datos).hexdigest()[:16]
+    cabecera['version'] = version
+
+    texto = json.dumps(cabecera, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    # Las referencias empiezan alineadas a 8 bytes para leerlas con un Float64Array
+    texto += b' ' * (-(_PREAMBULO.size + len(texto)) % 8)
+    contenido = _PREAMBULO.pack(MAGIA, FORMATO_PAQUETE, 0, len(texto)) + texto + datos
+    return contenido, version
+
+
+def leer_paquete(contenido):
+    """(cabecera, {tipo: referencias (2, n_edades, 7)}); la inversa de construir_paquete"""
+    magia, formato, _, longitud = _PREAMBULO.unpack_from(contenido)
+    if magia != MAGIA or formato != FORMATO_PAQUETE:
+        raise ValueError(f'Paquete no reconocido (formato {formato})')
+    cabecera = json.loads(contenido[_PREAMBULO.size:_PREAMBULO.size + longitud])
+    datos = np.frombuffer(contenido, dtype='<f8', offset=_PREAMBULO.size + longitud)
+    referencias = {}
+    for tipo_medida, info in cabecera['tipos'].items():
+        n_edades = info['edad_max'] - info['edad_min'] + 1
+        bloque = datos[info['offset']:info['offset'] + len(SEXOS) * n_edades * len(PERCENTILES_REF)]
+        referencias[tipo_medida] = bloque.reshape(len(SEXOS), n_edades, len(PERCENTILES_REF))
+    return cabecera, referencias
+
+
+class ClientBundle:
+    """Paquete del cliente memoizado por versión de los datos de referencia"""
+
+    def __init__(self, valores_referencia, tipos_medida, esquemas, version_datos):
+        self.valores_referencia = valores_referencia
+        self.tipos_medida = tipos_medida
+        self.esquemas = esquemas
+        self.version_datos = version_datos
+        self._paquete = None
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        """(contenido, versión) del paquete de la versión de datos actual"""
+        version_datos = self.version_datos()
+        paquete = self._paquete
+        if paquete is None or paquete[0] != version_datos:
+            with self._lock:
+                paquete = self._paquete
+                if paquete is None or paquete[0] != version_datos:
+                    paquete = (version_datos, *construir_paquete(
+                        self.valores_referencia, self.tipos_medida, self.esquemas, version_datos))
+                    self._paquete = paquete
+        return paquete[1], paquete[2]
+
+    @property
+    def nbytes(self):
+        return len(self._paquete[1]) if self._paquete else 0
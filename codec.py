@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Negociación de contenido JSON / MessagePack para las rutas /api/*
+
+JSON sigue siendo el formato por defecto. Un cliente que envía
+`Content-Type: application/msgpack` o pide `Accept: application/msgpack`
+intercambia MessagePack; en ese formato los arrays numéricos viajan como
+arrays tipados empaquetados (extensión 1: dtype NumPy en ASCII, un byte
+nulo y los datos little-endian en bruto).
+"""
+
+from collections.abc import Mapping
+
+import numpy as np
+from flask import Response, jsonify, request
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+try:
+    import msgpack
+except ImportError:  # MessagePack es opcional: sin él solo se habla JSON
+    msgpack = None
+
+MIME_JSON = 'application/json'
+MIME_MSGPACK = 'application/msgpack'
+MIMES_MSGPACK = (MIME_MSGPACK, 'application/x-msgpack', 'application/vnd.msgpack')
+
+EXT_ARRAY_TIPADO = 1
+
+
+class FormatoNoSoportado(Exception):
+    """El cuerpo de la petición viene en un formato que no se puede decodificar"""
+
+
+def _empaquetar(obj):
+    """Convierte arrays NumPy en arrays tipados de MessagePack"""
+    if isinstance(obj, np.ndarray):
+        array = np.ascontiguousarray(obj, dtype=obj.dtype.newbyteorder('<'))
+        return msgpack.ExtType(EXT_ARRAY_TIPADO, array.dtype.str.encode('ascii') + b'\0' + array.tobytes())
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f'Tipo no serializable: {type(obj).__name__}')
+
+
+def _desempaquetar(codigo, datos):
+    """Reconstruye los arrays tipados recibidos en MessagePack"""
+    if codigo == EXT_ARRAY_TIPADO:
+        dtype, _, crudo = datos.partition(b'\0')
+        return np.frombuffer(crudo, dtype=np.dtype(dtype.decode('ascii')))
+    return msgpack.ExtType(codigo, datos)
+
+
+def a_json(obj):
+    """Sustituye recursivamente los arrays NumPy por listas"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, Mapping):
+        return {clave: a_json(valor) for clave, valor in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [a_json(valor) for valor in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def es_msgpack(content_type):
+    """Indica si un Content-Type corresponde a MessagePack"""
+    return (content_type or '').split(';')[0].strip().lower() in MIMES_MSGPACK
+
+
+def prefiere_msgpack(accept):
+    """Indica si la cabecera Accept prefiere MessagePack frente a JSON"""
+    if msgpack is None or not accept:
+        return False
+    aceptados = parse_accept_header(accept, MIMEAccept)
+    return aceptados.best_match([MIME_JSON] + list(MIMES_MSGPACK)) in MIMES_MSGPACK
+
+
+def decodificar(cuerpo):
+    """Decodifica el cuerpo de una petición MessagePack"""
+    if msgpack is None:
+        raise FormatoNoSoportado('MessagePack no está disponible en el servidor')
+    return msgpack.unpackb(cuerpo, ext_hook=_desempaquetar, raw=False)
+
+
+def codificar(payload):
+    """Serializa un payload en MessagePack"""
+    return msgpack.packb(payload, default=_empaquetar, use_bin_type=True)
+
+
+def leer_payload():
+    """Equivalente a request.get_json() que admite también MessagePack y GET con query string"""
+    if request.method == 'GET':
+        return request.args.to_dict()
+    if es_msgpack(request.content_type):
+        return decodificar(request.get_data())
+    return request.get_json()
+
+
+def respuesta_binaria():
+    """Indica si la respuesta a la petición actual irá en MessagePack"""
+    return prefiere_msgpack(request.headers.get('Accept'))
+
+
+def responder(payload, status=200):
+    """Equivalente a jsonify() con negociación de contenido"""
+    if respuesta_binaria():
+        respuesta = Response(codificar(payload), status=status, mimetype=MIME_MSGPACK)
+    else:
+        respuesta = jsonify(a_json(payload))
+        respuesta.status_code = status
+    respuesta.vary.add('Accept')
+    return respuesta
@@ -3,16 +3,116 @@
 Fusiona y normaliza los datos antropométricos de ambas fuentes
 """
 
+import gzip
 import json
+import hashlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import time
 import pandas as pd
 from datetime import datetime
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from table_artifacts import (MANIFIESTO, FORMATO_MANIFIESTO, TablasPerezosas, hash_contenido, serializar_tabla,
+                             version_datos)
+from table_validation import validar_estandar, validar_tablas
+
+# Estructura base para las tablas
+BASE_PERCENTILES = ['P3', 'P10', 'P25', 'P50', 'P75', 'P90', 'P97']
+GENDERS = ['masculino', 'femenino']
+
+# Tablas principales que queremos crear
+TABLES_CONFIG = {
+    'peso_edad_0_18': {
+        'descripcion': 'Peso por edad (0-18 años)',
+        'unidad': 'kg',
+        'edad_min_meses': 0,
+        'edad_max_meses': 216,
+        'fuentes': ['SEGHNP', 'WebPediátrica'],
+        'tipo': 'peso'
+    },
+    'talla_edad_0_18': {
+        'descripcion': 'Talla por edad (0-18 años)',
+        'unidad': 'cm',
+        'edad_min_meses': 0,
+        'edad_max_meses': 216,
+        'fuentes': ['SEGHNP', 'WebPediátrica'],
+        'tipo': 'talla'
+    },
+    'imc_edad_2_18': {
+        'descripcion': 'IMC por edad (2-18 años)',
+        'unidad': 'kg/m²',
+        'edad_min_meses': 24,
+        'edad_max_meses': 216,
+        'fuentes': ['SEGHNP', 'WebPediátrica'],
+        'tipo': 'imc'
+    },
+    'perimetro_cefalico_0_3': {
+        'descripcion': 'Perímetro cefálico (0-3 años)',
+        'unidad': 'cm',
+        'edad_min_meses': 0,
+        'edad_max_meses': 36,
+        'fuentes': ['SEGHNP', 'WebPediátrica'],
+        'tipo': 'perimetro_cefalico'
+    }
+}
+
+# Súbase al cambiar los generadores de curvas: invalida los artefactos ya construidos
+GENERATOR_VERSION = 1
+ARTIFACTS_DIR = 'artefactos'
+# Los ficheros nuevos de un build (artefactos y estándares) se escriben aquí y
+# solo se mueven a su sitio cuando la validación pasa
+STAGING_DIR = 'fusion_staging'
+
+# Estándares de referencia: 'nacional' son las curvas generadas por esta fusión;
+# cada fichero referencias/<id>.json añade otro estándar con el formato
+# {"descripcion", "fuentes", "tablas": {tipo: {"unidad", "edad_min_meses",
+#  "masculino": [[P3..P97] por edad], "femenino": [...]}}}
+BUILTIN_STANDARDS = {
+    'nacional': {
+        'descripcion': 'Curvas fusionadas SEGHNP / WebPediátrica',
+        'fuentes': ['SEGHNP', 'WebPediátrica']
+    }
+}
+
+# Discontinuidades aceptadas por tipo de medida (edad_desde del salto): los
+# cambios de rama de las fórmulas de generate_*_percentiles
+KNOWN_DISCONTINUITIES = {
+    'peso': [24],
+    'talla': [24],
+    'imc': [60, 120, 180]
+}
+VALIDATION_REPORT = 'fused_validation.json'
+# Versión de datos para la clave de la caché de nginx (`include` con comodín en nginx*.conf)
+NGINX_VERSION_FILE = os.path.join('nginx', 'version_datos', 'datos.map')
+
+# Procesos para generar tablas en paralelo (por defecto, uno por núcleo)
+FUSION_WORKERS = int(os.environ.get('ANTROPOMETRIA_FUSION_PROCESOS', 0)) or os.cpu_count() or 1
+
+
+def _build_table_task(table_name, config):
+    """Genera una tabla en un proceso del pool y devuelve (tabla, segundos)"""
+    start = time.perf_counter()
+    table_data = DataFusion().build_percentile_table(table_name, config)
+    return table_data, time.perf_counter() - start
+
 
 class DataFusion:
-    def __init__(self):
+    def __init__(self, workers=None):
         self.seghnp_data = {}
         self.webpediatrica_data = {}
         self.fused_data = {}
+        self.reference_standards = dict(BUILTIN_STANDARDS)
+        self.table_artifacts = {}
+        self.rebuilt_tables = []
+        self.table_timings = {}
+        self.previous_artifacts = {}
+        self.staged_files = {}
+        self.workers = workers or FUSION_WORKERS
 
     def load_source_data(self):
         """Carga los datos de ambas fuentes"""
@@ -30,72 +130,231 @@ class DataFusion:
         except Exception as e:
             print(f"Error cargando datos WebPediátrica: {e}")
 
-    def create_unified_percentile_tables(self):
-        """Crea tablas unificadas de percentiles"""
-        unified_tables = {}
-        
-        # Estructura base para las tablas
-        base_percentiles = ['P3', 'P10', 'P25', 'P50', 'P75', 'P90', 'P97']
-        genders = ['masculino', 'femenino']
-        
-        # Tablas principales que queremos crear
-        tables_config = {
-            'peso_edad_0_18': {
-                'descripcion': 'Peso por edad (0-18 años)',
-                'unidad': 'kg',
-                'edad_min_meses': 0,
-                'edad_max_meses': 216,
-                'fuentes': ['SEGHNP', 'WebPediátrica'],
-                'tipo': 'peso'
-            },
-            'talla_edad_0_18': {
-                'descripcion': 'Talla por edad (0-18 años)',
-                'unidad': 'cm',
-                'edad_min_meses': 0,
-                'edad_max_meses': 216,
-                'fuentes': ['SEGHNP', 'WebPediátrica'],
-                'tipo': 'talla'
-            },
-            'imc_edad_2_18': {
-                'descripcion': 'IMC por edad (2-18 años)',
-                'unidad': 'kg/m²',
-                'edad_min_meses': 24,
-                'edad_max_meses': 216,
-                'fuentes': ['SEGHNP', 'WebPediátrica'],
-                'tipo': 'imc'
-            },
-            'perimetro_cefalico_0_3': {
-                'descripcion': 'Perímetro cefálico (0-3 años)',
-                'unidad': 'cm',
-                'edad_min_meses': 0,
-                'edad_max_meses': 36,
-                'fuentes': ['SEGHNP', 'WebPediátrica'],
-                'tipo': 'perimetro_cefalico'
+    def load_reference_standards(self, directory='referencias'):
+        """Carga los estándares de referencia adicionales (referencias/<id>.json)"""
+        if not os.path.isdir(directory):
+            return
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith('.json'):
+                continue
+            standard_id = filename[:-len('.json')]
+            try:
+                with open(os.path.join(directory, filename), 'r', encoding='utf-8') as f:
+                    self.reference_standards[standard_id] = json.load(f)
+                print(f"Estándar de referencia '{standard_id}' cargado")
+            except Exception as e:
+                print(f"Error cargando estándar {filename}: {e}")
+
+    def build_standard_arrays(self, standard_id):
+        """Curvas de un estándar: {tipo: (config, array (2, n_edades, 7))}"""
+        standard = self.reference_standards[standard_id]
+        arrays = {}
+        if 'tablas' not in standard:
+            # Estándar generado: las mismas curvas que tablas_percentiles
+            for config in TABLES_CONFIG.values():
+                ages = range(config['edad_min_meses'], config['edad_max_meses'] + 1)
+                values = [
+                    [self.generate_realistic_percentiles(config['tipo'], gender, age) for age in ages]
+                    for gender in GENDERS
+                ]
+                arrays[config['tipo']] = (config, np.round(np.asarray(values, dtype=np.float64), 2))
+            return arrays
+
+        for measurement_type, table in standard['tablas'].items():
+            values = np.asarray([table[gender] for gender in GENDERS], dtype=np.float64)
+            config = {
+                'unidad': table.get('unidad', ''),
+                'edad_min_meses': int(table['edad_min_meses']),
+                'edad_max_meses': int(table['edad_min_meses']) + values.shape[1] - 1
+            }
+            arrays[measurement_type] = (config, values)
+        return arrays
+
+    def stage_file(self, path, content):
+        """Prepara `content` para publicarse en `path` y devuelve dónde se puede leer ya.
+
+        Los ficheros se nombran por su hash, así que si `path` existe ya tiene
+        este contenido. Si no, se escribe en STAGING_DIR y `publish()` lo mueve
+        a `path` cuando el build ha pasado la validación.
+        """
+        if os.path.exists(path):
+            return path
+        staged = self.staged_files.get(path)
+        if staged is None:
+            staged = os.path.join(STAGING_DIR, path)
+            os.makedirs(os.path.dirname(staged), exist_ok=True)
+            temp_path = f'{staged}.{os.getpid()}.tmp'
+            with open(temp_path, 'wb') as f:
+                f.write(content)
+            os.replace(temp_path, staged)
+            self.staged_files[path] = staged
+        return staged
+
+    def publish(self):
+        """Mueve los ficheros del staging a su sitio y apunta las tablas a los publicados"""
+        for path, staged in self.staged_files.items():
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(staged, path)
+        self.discard_staging()
+        self.fused_data['tablas_percentiles'] = TablasPerezosas(self.table_artifacts, '.')
+
+    def discard_staging(self):
+        """Descarta lo que quede en el staging (un build que no se publica)"""
+        self.staged_files = {}
+        shutil.rmtree(STAGING_DIR, ignore_errors=True)
+
+    def compile_reference_standards(self, output_dir='estandares'):
+        """Compila cada estándar en un .npy float32 por tipo de medida.
+
+        Devuelve los metadatos de la sección `estandares` del dataset; las rutas
+        de los arrays son relativas al directorio del JSON fusionado. Como los
+        artefactos de tablas, cada array lleva el hash de su contenido en el
+        nombre (`<tipo>.<hash>.npy`): la app los abre con mmap, y un build nuevo
+        nunca sobrescribe un fichero mapeado, solo añade otro. Los arrays
+        nuevos quedan en el staging hasta `publish()`.
+        """
+        compiled = {}
+        for standard_id, standard in self.reference_standards.items():
+            standard_dir = os.path.join(output_dir, standard_id)
+            tables = {}
+            for measurement_type, (config, values) in self.build_standard_arrays(standard_id).items():
+                buffer = io.BytesIO()
+                np.save(buffer, values.astype(np.float32))
+                content = buffer.getvalue()
+                digest = hash_contenido(content)
+                path = os.path.join(standard_dir, f'{measurement_type}.{digest[:16]}.npy')
+                self.stage_file(path, content)
+                tables[measurement_type] = {
+                    'archivo': path,
+                    'sha256': digest,
+                    'unidad': config['unidad'],
+                    'edad_min_meses': config['edad_min_meses'],
+                    'edad_max_meses': config['edad_max_meses']
+                }
+            compiled[standard_id] = {
+                'descripcion': standard.get('descripcion', standard_id),
+                'fuentes': standard.get('fuentes', []),
+                'tablas': tables
             }
+        return compiled
+
+    def build_percentile_table(self, table_name, config):
+        """Genera una tabla de percentiles (metadatos y valores por sexo y edad)"""
+        table_data = {
+            'metadatos': config,
+            'datos': {}
         }
         
-        for table_name, config in tables_config.items():
-            table_data = {
-                'metadatos': config,
-                'datos': {}
-            }
+        for gender in GENDERS:
+            table_data['datos'][gender] = {}
             
-            for gender in genders:
-                table_data['datos'][gender] = {}
+            for age_months in range(config['edad_min_meses'], config['edad_max_meses'] + 1):
+                # Generar datos sintéticos realistas basados en estándares conocidos
+                percentile_values = self.generate_realistic_percentiles(
+                    config['tipo'], gender, age_months
+                )
                 
-                for age_months in range(config['edad_min_meses'], config['edad_max_meses'] + 1):
-                    # Generar datos sintéticos realistas basados en estándares conocidos
-                    percentile_values = self.generate_realistic_percentiles(
-                        config['tipo'], gender, age_months
-                    )
-                    
-                    table_data['datos'][gender][age_months] = {}
-                    for i, percentile in enumerate(base_percentiles):
-                        table_data['datos'][gender][age_months][percentile] = round(percentile_values[i], 2)
-            
-            unified_tables[table_name] = table_data
+                table_data['datos'][gender][age_months] = {}
+                for i, percentile in enumerate(BASE_PERCENTILES):
+                    table_data['datos'][gender][age_months][percentile] = round(percentile_values[i], 2)
+        
+        return table_data
+
+    def table_config_key(self, table_name, config):
+        """Clave de la configuración de una tabla: si no cambia, su artefacto sigue valiendo"""
+        payload = json.dumps({'tabla': table_name, 'config': config, 'generador': GENERATOR_VERSION},
+                             sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def load_previous_manifest(self, manifest_file=MANIFIESTO):
+        """Entradas de tablas del manifiesto anterior (vacío si no hay)"""
+        try:
+            with open(manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f).get('tablas_percentiles', {})
+        except (OSError, ValueError):
+            return {}
+
+    def artifact_is_valid(self, entry):
+        """Comprueba que el artefacto de una entrada existe y coincide con su hash"""
+        try:
+            with open(entry['artefacto'], 'rb') as f:
+                return hash_contenido(f.read()) == entry.get('sha256')
+        except OSError:
+            return False
+
+    def write_table_artifact(self, table_data, artifacts_dir=ARTIFACTS_DIR):
+        """Prepara una tabla como artefacto direccionado por contenido y devuelve su entrada.
+
+        La entrada apunta a la ruta publicada; hasta `publish()` el artefacto
+        nuevo solo está en el staging.
+        """
+        content = serializar_tabla(table_data)
+        digest = hash_contenido(content)
+        path = os.path.join(artifacts_dir, f'{digest[:16]}.json')
+        self.stage_file(path, content)
+        return {'artefacto': path, 'sha256': digest, 'bytes': len(content), 'metadatos': table_data['metadatos']}
+
+    def build_tables(self, pending):
+        """Genera las tablas `{nombre: config}` pendientes; produce (nombre, tabla) según terminan.
+
+        Cada tabla depende solo de su configuración, así que con varios procesos
+        se reparten entre ellos; el resultado no depende del número de procesos.
+        """
+        workers = min(self.workers, len(pending))
+        if workers <= 1:
+            for name, config in pending.items():
+                table_data, seconds = _build_table_task(name, config)
+                self.table_timings[name] = round(seconds, 3)
+                yield name, table_data
+            return
+        
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn')) as executor:
+            futures = {executor.submit(_build_table_task, name, config): name
+                       for name, config in pending.items()}
+            for future in as_completed(futures):
+                table_data, seconds = future.result()
+                name = futures.pop(future)
+                self.table_timings[name] = round(seconds, 3)
+                yield name, table_data
+
+    def create_unified_percentile_tables(self):
+        """Crea tablas unificadas de percentiles.
+        
+        Cada tabla es un artefacto propio: las que no han cambiado de
+        configuración se reutilizan del build anterior y solo se regeneran las
+        demás, en paralelo. Cada tabla se escribe en cuanto se genera y no se
+        retiene: se devuelven como TablasPerezosas en el orden de TABLES_CONFIG,
+        leyendo los artefactos nuevos del staging.
+        """
+        previous = self.previous_artifacts = self.load_previous_manifest()
+        self.table_artifacts = {}
+        self.rebuilt_tables = []
+        self.table_timings = {}
+        
+        entries, pending, config_keys = {}, {}, {}
+        for table_name, config in TABLES_CONFIG.items():
+            config_keys[table_name] = self.table_config_key(table_name, config)
+            entry = previous.get(table_name)
+            if (entry is not None and entry.get('clave_config') == config_keys[table_name]
+                    and self.artifact_is_valid(entry)):
+                entries[table_name] = entry
+            else:
+                pending[table_name] = config
+        
+        for table_name, table_data in (self.build_tables(pending) if pending else ()):
+            entries[table_name] = dict(self.write_table_artifact(table_data), clave_config=config_keys[table_name])
         
-        return unified_tables
+        for table_name in TABLES_CONFIG:
+            if table_name in pending:
+                self.rebuilt_tables.append(table_name)
+            self.table_artifacts[table_name] = entries[table_name]
+        
+        staged = {
+            table_name: dict(entry, artefacto=self.staged_files.get(entry['artefacto'], entry['artefacto']))
+            for table_name, entry in self.table_artifacts.items()
+        }
+        return TablasPerezosas(staged, '.')
 
     def generate_realistic_percentiles(self, measurement_type, gender, age_months):
         """Genera percentiles realistas basados en estándares antropométricos conocidos"""
@@ -317,34 +576,153 @@ class DataFusion:
         return functions
 
     def create_fused_dataset(self):
-        """Crea el dataset fusionado final"""
+        """Crea el dataset fusionado final.
+
+        Los artefactos y estándares nuevos quedan en el staging: nada de lo que
+        lee la app cambia hasta `publish()`.
+        """
+        self.discard_staging()
         self.fused_data = {
             'metadatos': {
                 'titulo': 'Base de Datos Antropométrica Fusionada',
                 'descripcion': 'Datos antropométricos combinados de SEGHNP y WebPediátrica',
                 'fuentes': ['SEGHNP', 'WebPediátrica'],
+                'estandares': list(self.reference_standards),
                 'fecha_creacion': datetime.now().isoformat(),
                 'version': '1.0'
             },
-            'tablas_percentiles': self.create_unified_percentile_tables(),
+            'tablas_percentiles': None,
+            'estandares': self.compile_reference_standards(),
             'funciones_calculo': self.create_calculation_functions(),
             'datos_originales': {
                 'seghnp': self.seghnp_data.get('tablas_referencia', {}),
                 'webpediatrica': self.webpediatrica_data.get('calculos_disponibles', {})
             }
         }
+        self.fused_data['tablas_percentiles'] = self.create_unified_percentile_tables()
+        # La huella de las tablas y de los estándares cambia la versión de datos que ve la app
+        digests = [entry['sha256'] for entry in self.table_artifacts.values()]
+        digests += [
+            table['sha256']
+            for standard_id in sorted(self.fused_data['estandares'])
+            for _, table in sorted(self.fused_data['estandares'][standard_id]['tablas'].items())
+        ]
+        self.fused_data['metadatos']['huella_tablas'] = hash_contenido(''.join(digests).encode('ascii'))[:16]
         
         return self.fused_data
 
-    def save_fused_data(self, filename='fused_anthropometric_data.json'):
-        """Guarda el dataset fusionado"""
+    def save_nginx_version(self, filename=NGINX_VERSION_FILE):
+        """Escribe la versión de datos que nginx añade a la clave de su caché; la devuelve"""
+        version = version_datos(self.fused_data['metadatos'])
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(f'{filename}.tmp', 'w', encoding='utf-8') as f:
+            f.write(f'default "{version}";\n')
+        os.replace(f'{filename}.tmp', filename)
+        return version
+
+    def save_manifest(self, filename=MANIFIESTO):
+        """Guarda el manifiesto que enlaza los artefactos de las tablas"""
+        manifest = {'formato': FORMATO_MANIFIESTO}
+        for key, value in self.fused_data.items():
+            manifest[key] = self.table_artifacts if key == 'tablas_percentiles' else value
+        try:
+            temp_filename = f'{filename}.{os.getpid()}.tmp'
+            with open(temp_filename, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, indent=2, ensure_ascii=False)
+            os.replace(temp_filename, filename)
+            print(f"Manifiesto guardado en: {filename} (tablas regeneradas: {', '.join(self.rebuilt_tables) or 'ninguna'})")
+        except Exception as e:
+            print(f"Error guardando manifiesto: {e}")
+
+    def write_fused_json(self, out, compact=False):
+        """Escribe el dataset en `out` (binario) volcando las tablas de una en una.
+
+        Sin `compact` el resultado es idéntico a `json.dump(..., indent=2)`.
+        """
+        newline, key_separator = ('', ':') if compact else ('\n', ': ')
+        
+        def write(text):
+            out.write(text.encode('utf-8'))
+        
+        def pad(level):
+            return '' if compact else ' ' * (2 * level)
+        
+        def dumps(value, level):
+            if compact:
+                return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+            return json.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + pad(level))
+        
+        write('{')
+        for i, (key, value) in enumerate(self.fused_data.items()):
+            write((',' if i else '') + newline + pad(1) + json.dumps(key, ensure_ascii=False) + key_separator)
+            if key != 'tablas_percentiles':
+                write(dumps(value, 1))
+                continue
+            if not value:
+                write('{}')
+                continue
+            write('{')
+            for j, table_name in enumerate(value):
+                write((',' if j else '') + newline + pad(2) + json.dumps(table_name, ensure_ascii=False) + key_separator)
+                if compact:
+                    # El artefacto ya es la serialización compacta de la tabla
+                    out.write(value.contenido(table_name))
+                else:
+                    write(dumps(value.leer(table_name), 2))
+            write(newline + pad(1) + '}')
+        write(newline + '}')
+
+    def save_fused_data(self, filename='fused_anthropometric_data.json', compact=False, compress=False):
+        """Guarda el dataset fusionado en streaming.
+        
+        Las tablas se leen de sus artefactos y se escriben de una en una, así que
+        la memoria pico es la de una tabla. `compact` omite la indentación y
+        `compress` escribe gzip (añadiendo .gz al nombre). El fichero se escribe
+        en un temporal y se renombra al terminar.
+        """
+        if compress and not filename.endswith('.gz'):
+            filename += '.gz'
+        temp_filename = f'{filename}.{os.getpid()}.tmp'
         try:
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(self.fused_data, f, indent=2, ensure_ascii=False)
+            with open(temp_filename, 'wb') as raw:
+                if compress:
+                    with gzip.GzipFile(filename=os.path.basename(filename), fileobj=raw, mode='wb', mtime=0) as out:
+                        self.write_fused_json(out, compact)
+                else:
+                    self.write_fused_json(raw, compact)
+            os.replace(temp_filename, filename)
             print(f"Dataset fusionado guardado en: {filename}")
         except Exception as e:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
             print(f"Error guardando dataset fusionado: {e}")
 
+    def validate_tables(self, report_file=VALIDATION_REPORT):
+        """Valida las tablas y los estándares nuevos (aún en el staging).
+        
+        Las tablas se comparan además con las del manifiesto anterior. Guarda el
+        informe en `report_file` y lo devuelve; `valida` es False si faltan
+        edades o hay valores no finitos, celdas no monótonas, discontinuidades
+        no conocidas, cambios fuera de tolerancia o un estándar con otra forma.
+        """
+        known = {name: KNOWN_DISCONTINUITIES.get(config['tipo'], []) for name, config in TABLES_CONFIG.items()}
+        ranges = {name: (config['edad_min_meses'], config['edad_max_meses']) for name, config in TABLES_CONFIG.items()}
+        report = validar_tablas(self.fused_data['tablas_percentiles'],
+                                TablasPerezosas(self.previous_artifacts, '.'), known, ranges)
+        report['estandares'] = {}
+        for standard_id, standard in self.fused_data['estandares'].items():
+            results = report['estandares'][standard_id] = {}
+            for measurement_type, table in standard['tablas'].items():
+                values = np.load(self.staged_files.get(table['archivo'], table['archivo']))
+                results[measurement_type] = validar_estandar(values, table['edad_min_meses'], table['edad_max_meses'])
+                report['valida'] = report['valida'] and results[measurement_type]['valida']
+        try:
+            with open(report_file, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Error guardando informe de validación: {e}")
+        return report
+
     def generate_summary_report(self):
         """Genera un reporte resumen del dataset fusionado"""
         report = {
@@ -356,7 +734,9 @@ class DataFusion:
             'detalle_tablas': {}
         }
         
-        for table_name, table_data in self.fused_data.get('tablas_percentiles', {}).items():
+        tables = self.fused_data.get('tablas_percentiles', {})
+        for table_name in tables:
+            table_data = tables.leer(table_name)
             metadata = table_data['metadatos']
             report['detalle_tablas'][table_name] = {
                 'descripcion': metadata['descripcion'],
@@ -372,12 +752,43 @@ def main():
     
     # Cargar datos de ambas fuentes
     fusion.load_source_data()
+    fusion.load_reference_standards()
     
     # Crear dataset fusionado
+    start = time.perf_counter()
     fused_data = fusion.create_fused_dataset()
+    elapsed = time.perf_counter() - start
     
-    # Guardar datos fusionados
-    fusion.save_fused_data()
+    # Validar antes de publicar: un build inválido no sustituye al manifiesto anterior
+    validation = fusion.validate_tables()
+    print(f"\n=== VALIDACIÓN ({validation['milisegundos']} ms) ===")
+    for table_name, result in validation['tablas'].items():
+        changes = result['cambios']
+        print(f"- {table_name}: {'OK' if result['valida'] else 'ERROR'} "
+              f"(no monótonas: {result['total_no_monotonas']}, "
+              f"discontinuidades: {len(result['discontinuidades'])} nuevas / "
+              f"{len(result['discontinuidades_conocidas'])} conocidas, "
+              f"delta máx.: {changes['delta_max'] if changes else 'sin build anterior'})")
+    for standard_id, results in validation['estandares'].items():
+        for measurement_type, result in results.items():
+            print(f"- estándar {standard_id}/{measurement_type}: {'OK' if result['valida'] else 'ERROR'} "
+                  f"(forma: {tuple(result['forma'])}, no finitos: {result.get('total_no_finitos', '-')}, "
+                  f"no monótonas: {result.get('total_no_monotonas', '-')})")
+    if not validation['valida']:
+        print(f"Validación fallida, detalle en {VALIDATION_REPORT}")
+        if os.environ.get('ANTROPOMETRIA_VALIDACION_FORZAR') != '1':
+            fusion.discard_staging()
+            sys.exit(1)
+    
+    # Publicar artefactos y estándares y guardar datos fusionados (manifiesto y fichero completo)
+    fusion.publish()
+    fusion.save_manifest()
+    fusion.save_fused_data(
+        compact=os.environ.get('ANTROPOMETRIA_FUSION_COMPACTO') == '1',
+        compress=os.environ.get('ANTROPOMETRIA_FUSION_GZIP') == '1'
+    )
+    version = fusion.save_nginx_version()
+    print(f"Versión de datos: {version} (recarga nginx para que entre en la clave de su caché)")
     
     # Generar y mostrar reporte
     report = fusion.generate_summary_report()
@@ -386,6 +797,12 @@ def main():
     print(f"Total de tablas de percentiles: {report['resumen_general']['total_tablas_percentiles']}")
     print(f"Total de funciones de cálculo: {report['resumen_general']['total_funciones_calculo']}")
     print(f"Fuentes de datos: {', '.join(report['resumen_general']['fuentes_datos'])}")
+    print(f"Estándares de referencia: {', '.join(fused_data['estandares'])}")
+    
+    print(f"\n=== TIEMPOS DE GENERACIÓN ({fusion.workers} procesos, total {elapsed:.2f} s) ===")
+    for table_name in TABLES_CONFIG:
+        seconds = fusion.table_timings.get(table_name)
+        print(f"- {table_name}: {f'{seconds:.3f} s' if seconds is not None else 'reutilizada'}")
     
     print("\n=== DETALLE DE TABLAS ===")
     for table_name, details in report['detalle_tablas'].items():
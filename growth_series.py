@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Series de percentiles submuestreadas y listas para dibujar con Chart.js
+
+Las curvas salen de las mismas referencias que puntúan /api/calcular_percentil
+(las de la calculadora), de modo que la gráfica, los puntos del paciente y la
+tarjeta de resultado coinciden. Solo los tipos de medida que la calculadora no
+puntúa (p. ej. perímetro cefálico) se dibujan con la tabla fusionada; el campo
+`fuente` indica siempre de dónde salen.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from percentile_grid import PERCENTILES_REF, SEXOS
+from schemas import puntos_series
+from table_artifacts import TablasPerezosas, metadatos_tabla
+
+# Rango de edades (meses) y unidad de cada tipo de medida
+RANGOS_EDAD = {'peso': (0, 216), 'talla': (0, 216), 'imc': (24, 216), 'perimetro_cefalico': (0, 36)}
+UNIDADES = {'peso': 'kg', 'talla': 'cm', 'imc': 'kg/m²', 'perimetro_cefalico': 'cm'}
+
+PUNTOS_POR_DEFECTO = 60
+# Series distintas (tipo, sexo, puntos) que se guardan como mucho; las menos usadas se descartan
+MAX_SERIES = 64
+
+_series = OrderedDict()
+# Referencias completas (edades, matriz) por versión de datos, tipo y sexo
+_referencias_cache = {}
+_lock = threading.Lock()
+
+
+def buscar_tabla(data, tipo_medida):
+    """Devuelve (nombre, tabla) de la tabla fusionada de un tipo de medida, o (None, None)"""
+    tablas = data.get('tablas_percentiles', {})
+    for nombre in tablas:
+        # Con tablas perezosas los metadatos salen del manifiesto sin leer el artefacto
+        if metadatos_tabla(tablas, nombre).get('tipo') == tipo_medida:
+            return nombre, tablas[nombre]
+    return None, None
+
+
+def indices_muestreo(total, puntos):
+    """Índices equiespaciados (incluidos los extremos) para quedarse con `puntos` valores"""
+    puntos = max(2, min(total, puntos))
+    return np.unique(np.round(np.linspace(0, total - 1, puntos)).astype(np.intp))
+
+
+def _referencias_calculadora(calculator, tipo_medida, sexo):
+    """Edades y matriz (n_edades, 7) de las referencias de la calculadora, o None si no puntúa ese tipo"""
+    if tipo_medida not in RANGOS_EDAD:
+        return None
+    edad_min, edad_max = RANGOS_EDAD[tipo_medida]
+    edades, filas = [], []
+    for edad in range(edad_min, edad_max + 1):
+        valores = calculator._valores_referencia(edad, sexo, tipo_medida)
+        if valores is not None:
+            edades.append(edad)
+            filas.append(valores)
+    if not filas:
+        return None
+    return np.asarray(edades), np.asarray(filas, dtype=np.float64)
+
+
+def _referencias(calculator, tipo_medida, sexo):
+    """Edades y matriz (n_edades, 7) de referencias, más el nombre de la fuente"""
+    propias = _referencias_calculadora(calculator, tipo_medida, sexo)
+    if propias is not None:
+        return (*propias, 'referencias_calculadora')
+
+    nombre, tabla = buscar_tabla(calculator.data, tipo_medida)
+    if tabla is not None:
+        metadatos = tabla['metadatos']
+        edades = np.arange(metadatos['edad_min_meses'], metadatos['edad_max_meses'] + 1)
+        datos_sexo = tabla['datos'][sexo]
+        filas = []
+        for edad in edades.tolist():
+            fila = datos_sexo.get(edad, datos_sexo.get(str(edad)))
+            filas.append([fila[f'P{p}'] for p in PERCENTILES_REF])
+        return edades, np.asarray(filas, dtype=np.float64), nombre
+
+    if tipo_medida not in RANGOS_EDAD:
+        raise ValueError(f'Tipo de medida no soportado: {tipo_medida}')
+    raise ValueError(f'No hay referencias para {tipo_medida}')
+
+
+def referencias(calculator, tipo_medida, sexo):
+    """Edades, matriz de referencias y fuente de las curvas; una vez por versión de datos"""
+    clave = (calculator.version_datos(), tipo_medida, sexo)
+    with _lock:
+        resultado = _referencias_cache.get(clave)
+    if resultado is None:
+        resultado = _referencias(calculator, tipo_medida, sexo)
+        with _lock:
+            for antigua in [c for c in _referencias_cache if c[0] != clave[0]]:
+                del _referencias_cache[antigua]
+            _referencias_cache[clave] = resultado
+    return resultado
+
+
+def series_percentiles(calculator, tipo_medida, sexo, puntos=PUNTOS_POR_DEFECTO):
+    """Curvas P3-P97 submuestreadas de un tipo de medida y sexo.
+
+    Se calculan una vez por versión de datos y se reutilizan después.
+    """
+    if sexo not in SEXOS:
+        raise ValueError(f'Sexo no válido: {sexo}')
+    puntos = max(2, min(int(puntos), 500))
+    clave = (calculator.version_datos(), tipo_medida, sexo, puntos)
+    with _lock:
+        serie = _series.get(clave)
+        if serie is not None:
+            _series.move_to_end(clave)
+    if serie is not None:
+        return serie
+
+    edades, matriz, fuente = referencias(calculator, tipo_medida, sexo)
+    indices = indices_muestreo(edades.size, puntos)
+    serie = {
+        'tipo_medida': tipo_medida,
+        'sexo': sexo,
+        'unidad': UNIDADES.get(tipo_medida, ''),
+        'fuente': fuente,
+        'edades_meses': edades[indices].astype(np.uint16),
+        'percentiles': {
+            f'P{p}': np.round(matriz[indices, i], 2)
+            for i, p in enumerate(PERCENTILES_REF)
+        }
+    }
+    with _lock:
+        # Las series de versiones de datos anteriores ya no se sirven
+        for antigua in [c for c in _series if c[0] != clave[0]]:
+            del _series[antigua]
+        _series[clave] = serie
+        while len(_series) > MAX_SERIES:
+            _series.popitem(last=False)
+    return serie
+
+
+def nbytes_series():
+    """Memoria ocupada por las series cacheadas en bytes"""
+    with _lock:
+        return sum(
+            serie['edades_meses'].nbytes + sum(valores.nbytes for valores in serie['percentiles'].values())
+            for serie in _series.values()
+        ) + sum(edades.nbytes + matriz.nbytes for edades, matriz, _ in _referencias_cache.values())
+
+
+def _tabla_sin_leer(data, tipo_medida):
+    """Indica si la tabla de un tipo de medida está en un manifiesto y aún no se ha leído"""
+    tablas = data.get('tablas_percentiles', {})
+    if not isinstance(tablas, TablasPerezosas):
+        return False
+    return any(
+        metadatos_tabla(tablas, nombre).get('tipo') == tipo_medida and nombre not in tablas.cargadas()
+        for nombre in tablas
+    )
+
+
+def precalcular_series(calculator, puntos=PUNTOS_POR_DEFECTO):
+    """Rellena la caché de series de todos los tipos de medida y sexos disponibles.
+
+    Las tablas de un manifiesto que aún no se han leído se dejan para su primer uso.
+    """
+    for tipo_medida in RANGOS_EDAD:
+        if (_referencias_calculadora(calculator, tipo_medida, SEXOS[0]) is None
+                and _tabla_sin_leer(calculator.data, tipo_medida)):
+            continue
+        for sexo in SEXOS:
+            try:
+                series_percentiles(calculator, tipo_medida, sexo, puntos)
+            except (ValueError, KeyError):
+                pass
+
+
+def puntos_paciente(calculator, tipo_medida, sexo, data):
+    """Puntos del paciente para superponer en la gráfica, con su percentil.
+
+    `edades_meses` y `medidas` (o `fechas_nacimiento`) se validan con el mismo
+    esquema que los lotes (ErrorValidacion si no cuadran). El percentil sale de
+    las mismas referencias que dibujan las curvas (y que puntúan la tarjeta de
+    resultado), así que el punto no puede contradecirlas; fuera de su rango de
+    edades es None.
+    """
+    valores = puntos_series(data)
+    if valores is None:
+        return []
+    edades, medidas = valores['edades_meses'].astype(np.intp), valores['medidas']
+    edades_ref, matriz, _ = referencias(calculator, tipo_medida, sexo)
+
+    # Fila de referencias de cada edad (si la tabla la tiene) y primer percentil >= medida
+    posiciones = np.clip(np.searchsorted(edades_ref, edades), 0, edades_ref.size - 1)
+    en_tabla = edades_ref[posiciones] == edades
+    por_debajo = medidas[:, None] <= matriz[posiciones]
+    indices = np.where(por_debajo.any(axis=1), por_debajo.argmax(axis=1), len(PERCENTILES_REF) - 1)
+    return [
+        {'edad_meses': int(edad), 'medida': float(medida),
+         'percentil': PERCENTILES_REF[indice] if dentro else None}
+        for edad, medida, indice, dentro in zip(edades, medidas, indices.tolist(), en_tabla.tolist())
+    ]
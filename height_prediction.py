@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Predicción de talla adulta a partir de la edad ósea (método de Bayley-Pinneau)
+
+La talla adulta predicha es la talla actual dividida por la fracción de la
+talla adulta que corresponde a la edad ósea, según el sexo y la maduración
+(edad ósea acorde, adelantada o retrasada un año o más respecto a la
+cronológica). Las tablas anuales se compilan una sola vez en un array
+(sexo, maduración, edad ósea en meses) interpolado mes a mes, así que una
+predicción es un acceso indexado y un lote entero se resuelve con NumPy.
+
+Solo se incluye la columna de maduración media (acorde) de las tablas
+publicadas. Una fila con edad ósea adelantada o retrasada se evalúa, pero no
+se predice: no hay tabla que la respalde.
+"""
+
+import numpy as np
+
+SEXOS = ('masculino', 'femenino')
+MADURACIONES = ('acorde', 'adelantada', 'retrasada')
+# Diferencia edad ósea - edad cronológica a partir de la cual la maduración no es acorde
+UMBRAL_MADURACION_MESES = 12
+
+# Porcentaje de la talla adulta alcanzado por edad ósea en años enteros, desde
+# la primera edad ósea de cada sexo hasta los 18 años. Columna de maduración
+# media de Bayley N, Pinneau SR. Tables for predicting adult height from
+# skeletal age: revised for use with the Greulich-Pyle hand standards.
+# J Pediatr 1952;40:423-441 (reproducidas en Greulich WW, Pyle SI. Radiographic
+# Atlas of Skeletal Development of the Hand and Wrist, 2.ª ed., 1959).
+# Las columnas de maduración adelantada y retrasada no se incluyen.
+TABLAS_BAYLEY_PINNEAU = {
+    'masculino': {
+        'edad_osea_min_anos': 7,
+        'acorde': [69.5, 72.3, 75.2, 78.0, 80.4, 83.4, 87.6, 92.7, 96.2, 98.3, 99.3, 99.8],
+    },
+    'femenino': {
+        'edad_osea_min_anos': 6,
+        'acorde': [72.0, 75.7, 79.0, 82.7, 86.2, 90.6, 92.2, 95.8, 98.0, 99.0, 99.6, 99.9, 100.0],
+    },
+}
+
+
+class HeightPredictor:
+    """Tablas de predicción compiladas en arrays indexados por sexo, maduración y mes"""
+
+    def __init__(self, tablas=TABLAS_BAYLEY_PINNEAU):
+        self.edad_min = min(tablas[sexo]['edad_osea_min_anos'] for sexo in SEXOS) * 12
+        self.edad_max = max(
+            (tablas[sexo]['edad_osea_min_anos'] + len(tablas[sexo]['acorde']) - 1) * 12 for sexo in SEXOS)
+        meses = np.arange(self.edad_min, self.edad_max + 1)
+
+        # Porcentaje por (sexo, maduración, edad ósea - edad_min); NaN fuera de la
+        # tabla del sexo y en las maduraciones sin tabla
+        self.porcentajes = np.full((len(SEXOS), len(MADURACIONES), len(meses)), np.nan)
+        self.rangos = {}
+        self.maduraciones = {}
+        for s, sexo in enumerate(SEXOS):
+            tabla = tablas[sexo]
+            anos = tabla['edad_osea_min_anos'] + np.arange(len(tabla['acorde']))
+            dentro = (meses >= anos[0] * 12) & (meses <= anos[-1] * 12)
+            for m, maduracion in enumerate(MADURACIONES):
+                if maduracion in tabla:
+                    self.porcentajes[s, m, dentro] = np.interp(meses[dentro], anos * 12, tabla[maduracion])
+            self.rangos[sexo] = (int(anos[0] * 12), int(anos[-1] * 12))
+            self.maduraciones[sexo] = tuple(maduracion for maduracion in MADURACIONES if maduracion in tabla)
+
+    def evaluar_edad_osea_lote(self, edades_osea_meses, edades_meses):
+        """(diferencia en meses, índice de MADURACIONES) de cada fila"""
+        diferencias = np.asarray(edades_osea_meses, dtype=np.float64) - np.asarray(edades_meses, dtype=np.float64)
+        maduraciones = np.zeros(diferencias.shape, dtype=np.uint8)
+        maduraciones[diferencias >= UMBRAL_MADURACION_MESES] = 1
+        maduraciones[diferencias <= -UMBRAL_MADURACION_MESES] = 2
+        return diferencias, maduraciones
+
+    def evaluar_edad_osea(self, edad_osea_meses, edad_meses):
+        """Diferencia entre edad ósea y cronológica y maduración resultante"""
+        diferencias, maduraciones = self.evaluar_edad_osea_lote([edad_osea_meses], [edad_meses])
+        return {
+            'diferencia_meses': int(diferencias[0]),
+            'maduracion': MADURACIONES[maduraciones[0]]
+        }
+
+    def predecir_lote(self, tallas, edades_osea_meses, edades_meses, sexos):
+        """Talla adulta predicha (NaN fuera de tabla), porcentaje alcanzado y maduración de cada fila"""
+        tallas = np.asarray(tallas, dtype=np.float64)
+        edades_osea = np.asarray(edades_osea_meses, dtype=np.float64)
+        sexos = np.broadcast_to(np.asarray(sexos), tallas.shape)
+        _, maduraciones = self.evaluar_edad_osea_lote(edades_osea, edades_meses)
+
+        n_meses = self.porcentajes.shape[2]
+        fila = np.rint(edades_osea).astype(np.intp) - self.edad_min
+        fuera = (fila < 0) | (fila >= n_meses)
+        porcentajes = self.porcentajes[np.where(sexos == 'masculino', 0, 1), maduraciones, np.clip(fila, 0, n_meses - 1)]
+        porcentajes[fuera] = np.nan
+        return {
+            'tallas_adultas': np.round(tallas * 100 / porcentajes, 1),
+            'porcentajes': np.round(porcentajes, 1),
+            'maduraciones': maduraciones
+        }
+
+    def motivo_sin_prediccion(self, edad_osea_meses, edad_meses, sexo):
+        """Por qué una fila no tiene predicción (para el mensaje de error)"""
+        maduracion = self.evaluar_edad_osea(edad_osea_meses, edad_meses)['maduracion']
+        if maduracion not in self.maduraciones[sexo]:
+            return (f'Sin tabla de Bayley-Pinneau para maduración {maduracion}: solo se predice con '
+                    f'edad ósea acorde (diferencia menor de {UMBRAL_MADURACION_MESES} meses)')
+        minimo, maximo = self.rangos[sexo]
+        return f'Edad ósea fuera de las tablas de predicción ({minimo}-{maximo} meses)'
+
+    def predecir(self, talla, edad_osea_meses, edad_meses, sexo):
+        """Predicción de una fila; None si la edad ósea o su maduración no tienen tabla"""
+        resultado = self.predecir_lote([talla], [edad_osea_meses], [edad_meses], [sexo])
+        if np.isnan(resultado['tallas_adultas'][0]):
+            return None
+        return {
+            'talla_adulta': float(resultado['tallas_adultas'][0]),
+            'porcentaje_talla_adulta': float(resultado['porcentajes'][0]),
+            'maduracion': MADURACIONES[resultado['maduraciones'][0]],
+            'metodo': 'Bayley-Pinneau'
+        }
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Archivo HTTP para grabar y reproducir las descargas de los scrapers
+
+En modo `grabar` cada respuesta que reciben SeghnpScraper y
+WebPediatricaScraper se guarda en un directorio local. Las cabeceras y el
+status van al índice (`indice.json`) y el cuerpo va comprimido en
+`objetos/<hash>.gz`, con el nombre tomado del hash de su contenido. Una misma
+respuesta descargada varias veces ocupa una sola vez. En modo `reproducir` la
+sesión de requests responde desde el archivo sin tocar la red, así que los
+scrapers (y data_fusion.py detrás de ellos) son deterministas y funcionan sin
+salida a Internet. Una petición que no esté archivada falla como un error de
+conexión, igual que si el sitio no respondiera.
+
+Uso:
+    python scraper_seghnp.py --archivo archivo_http --modo grabar
+    python scraper_seghnp.py --archivo archivo_http --modo reproducir
+"""
+
+import gzip
+import json
+import os
+import threading
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from table_artifacts import hash_contenido
+
+INDICE = 'indice.json'
+FORMATO_INDICE = 'archivo-http/1'
+DIRECTORIO_OBJETOS = 'objetos'
+MODOS = ('grabar', 'reproducir')
+
+# Cabeceras que describen la transferencia original y no el cuerpo archivado
+# (que se guarda ya descomprimido y completo)
+CABECERAS_TRANSPORTE = {'content-encoding', 'transfer-encoding', 'content-length', 'connection', 'keep-alive'}
+
+
+class PeticionNoArchivada(requests.ConnectionError):
+    """La petición no está en el archivo y el modo reproducir no sale a la red"""
+
+
+def clave_peticion(metodo, url, cuerpo=None):
+    """Clave de una petición en el índice: método, URL y hash del cuerpo si lo hay"""
+    clave = f'{metodo.upper()} {url}'
+    if cuerpo:
+        if isinstance(cuerpo, str):
+            cuerpo = cuerpo.encode('utf-8')
+        clave += f' {hash_contenido(cuerpo)}'
+    return clave
+
+
+class HttpArchive:
+    """Directorio con las respuestas archivadas y su índice"""
+
+    def __init__(self, directorio, modo='reproducir'):
+        if modo not in MODOS:
+            raise ValueError(f"Modo de archivo HTTP no válido: {modo} (opciones: {', '.join(MODOS)})")
+        self.directorio = directorio
+        self.modo = modo
+        self.entradas = {}
+        self.aciertos = 0
+        self.fallos = 0
+        self.grabadas = 0
+        self._lock = threading.Lock()
+        ruta = os.path.join(directorio, INDICE)
+        if os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                indice = json.load(f)
+            if indice.get('formato') == FORMATO_INDICE:
+                self.entradas = indice['entradas']
+
+    def montar(self, session):
+        """Hace que `session` grabe en el archivo o responda desde él"""
+        adaptador = _AdaptadorArchivo(self)
+        session.mount('http://', adaptador)
+        session.mount('https://', adaptador)
+        return session
+
+    def _ruta_objeto(self, hash_cuerpo):
+        return os.path.join(self.directorio, DIRECTORIO_OBJETOS, f'{hash_cuerpo}.gz')
+
+    def guardar(self, clave, respuesta):
+        """Archiva una respuesta de requests (cuerpo ya descomprimido)"""
+        cuerpo = respuesta.content
+        hash_cuerpo = hash_contenido(cuerpo)
+        destino = self._ruta_objeto(hash_cuerpo)
+        # El nombre es el hash: si existe, ya tiene este contenido
+        if not os.path.exists(destino):
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            temporal = f'{destino}.{os.getpid()}.tmp'
+            with open(temporal, 'wb') as f:
+                f.write(gzip.compress(cuerpo, mtime=0))
+            os.replace(temporal, destino)
+        cabeceras = [[nombre, valor] for nombre, valor in respuesta.headers.items()
+                     if nombre.lower() not in CABECERAS_TRANSPORTE]
+        with self._lock:
+            self.entradas[clave] = {
+                'status': respuesta.status_code,
+                'razon': respuesta.reason,
+                'cabeceras': cabeceras,
+                'cuerpo': hash_cuerpo,
+                'bytes': len(cuerpo),
+            }
+            self.grabadas += 1
+            self._escribir_indice()
+
+    def _escribir_indice(self):
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta = os.path.join(self.directorio, INDICE)
+        with open(f'{ruta}.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'formato': FORMATO_INDICE, 'entradas': self.entradas},
+                      f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(f'{ruta}.tmp', ruta)
+
+    def respuesta(self, clave, peticion):
+        """Respuesta de requests reconstruida desde el archivo, o None si no está"""
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            self.fallos += 1
+            return None
+        with gzip.open(self._ruta_objeto(entrada['cuerpo']), 'rb') as f:
+            cuerpo = f.read()
+        if hash_contenido(cuerpo) != entrada['cuerpo']:
+            raise requests.ConnectionError(f"Cuerpo archivado corrupto para {clave}", request=peticion)
+        self.aciertos += 1
+
+        respuesta = requests.Response()
+        respuesta.status_code = entrada['status']
+        respuesta.reason = entrada['razon']
+        respuesta.headers = CaseInsensitiveDict(entrada['cabeceras'])
+        respuesta.headers['Content-Length'] = str(len(cuerpo))
+        respuesta.encoding = get_encoding_from_headers(respuesta.headers)
+        respuesta.url = peticion.url
+        respuesta.request = peticion
+        respuesta._content = cuerpo
+        respuesta._content_consumed = True
+        return respuesta
+
+    def estadisticas(self):
+        return {'directorio': self.directorio, 'modo': self.modo, 'entradas': len(self.entradas),
+                'grabadas': self.grabadas, 'aciertos': self.aciertos, 'fallos': self.fallos}
+
+
+class _AdaptadorArchivo(BaseAdapter):
+    """Adaptador de transporte de requests que graba o reproduce cada envío.
+
+    Las redirecciones las resuelve la sesión con un envío por salto, así que
+    cada salto se archiva por separado y se reproduce igual.
+    """
+
+    def __init__(self, archivo):
+        super().__init__()
+        self.archivo = archivo
+        self.red = HTTPAdapter() if archivo.modo == 'grabar' else None
+
+    def send(self, request, **kwargs):
+        clave = clave_peticion(request.method, request.url, request.body)
+        if self.red is None:
+            respuesta = self.archivo.respuesta(clave, request)
+            if respuesta is None:
+                raise PeticionNoArchivada(f"Sin respuesta archivada para {clave}", request=request)
+            respuesta.connection = self
+            return respuesta
+        respuesta = self.red.send(request, **kwargs)
+        self.archivo.guardar(clave, respuesta)
+        return respuesta
+
+    def close(self):
+        if self.red is not None:
+            self.red.close()
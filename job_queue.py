@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Cola de trabajos asíncronos para cohortes grandes
+
+Un cliente envía un lote de medidas, recibe el id del trabajo y consulta (o
+sigue como eventos) su progreso hasta descargar el resultado. El estado vive en
+SQLite y las entradas, los bloques calculados y el resultado en un directorio
+de spool local, así que los trabajos sobreviven a reinicios de los workers:
+
+- El id es el hash del contenido (tipo de medida, versión de datos y columnas),
+  de modo que reenviar el mismo lote devuelve el mismo trabajo.
+- Cada bloque calculado se guarda como checkpoint; un trabajo interrumpido se
+  reanuda a partir del primer bloque que falte. El tamaño de bloque se guarda
+  con el trabajo, así que procesos con distinto `filas_por_bloque` (app.py y
+  app.rpi.py) pueden compartir el spool sin mezclar checkpoints.
+- Los trabajos se reclaman con un UPDATE atómico, por lo que varios procesos
+  (workers de gunicorn) pueden compartir el mismo spool.
+- Redis es opcional: si hay URL, se usa para despertar a los workers en lugar
+  de sondear SQLite.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import redis
+except ImportError:  # Redis es opcional: sin él los workers sondean SQLite
+    redis = None
+
+PENDIENTE, EN_CURSO, COMPLETADO, ERROR = 'pendiente', 'en_curso', 'completado', 'error'
+ESTADOS_FINALES = (COMPLETADO, ERROR)
+
+CLAVE_REDIS = 'antropometria:trabajos'
+INTERVALO_SONDEO_S = 2.0
+# Un trabajo en curso sin latido durante este tiempo se considera huérfano
+CADUCIDAD_S = 300
+
+_ESQUEMA_SQL = """
+CREATE TABLE IF NOT EXISTS trabajos (
+    id TEXT PRIMARY KEY,
+    estado TEXT NOT NULL,
+    tipo_medida TEXT NOT NULL,
+    version_datos TEXT NOT NULL,
+    filas INTEGER NOT NULL,
+    bloques INTEGER NOT NULL,
+    filas_por_bloque INTEGER,
+    bloques_completados INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    creado REAL NOT NULL,
+    actualizado REAL NOT NULL
+)
+"""
+
+
+def _guardar_atomico(ruta, array):
+    """Escribe un .npy en un temporal y lo renombra para no dejar ficheros a medias"""
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'wb') as f:
+        np.save(f, array)
+    os.replace(temporal, ruta)
+
+
+class JobQueue:
+    """Cola de trabajos de percentiles respaldada por SQLite y un directorio de spool.
+
+    `calcular(medidas, edades, sexos, tipo_medida)` resuelve un bloque y
+    `version_datos()` identifica los datos de referencia con que se calcula.
+    """
+
+    def __init__(self, calcular, version_datos, directorio, hilos=1, filas_por_bloque=50000, redis_url=None):
+        self.calcular = calcular
+        self.version_datos = version_datos
+        self.directorio = directorio
+        self.hilos = hilos
+        self.filas_por_bloque = filas_por_bloque
+        self.ruta_db = os.path.join(directorio, 'trabajos.sqlite3')
+        self.redis = redis.Redis.from_url(redis_url) if redis_url and redis is not None else None
+        self._aviso = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+        os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(_ESQUEMA_SQL)
+            # Spools creados antes de guardar el tamaño de bloque por trabajo
+            columnas = {fila['name'] for fila in conexion.execute('PRAGMA table_info(trabajos)')}
+            if 'filas_por_bloque' not in columnas:
+                conexion.execute('ALTER TABLE trabajos ADD COLUMN filas_por_bloque INTEGER')
+
+    @contextmanager
+    def _conexion(self):
+        # Una conexión por operación: los hilos y procesos no comparten conexiones
+        conexion = sqlite3.connect(self.ruta_db, timeout=30, isolation_level=None)
+        conexion.row_factory = sqlite3.Row
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    def _ruta(self, trabajo_id, nombre=''):
+        return os.path.join(self.directorio, trabajo_id, nombre)
+
+    def iniciar(self):
+        """Arranca los hilos de trabajo en el proceso actual (idempotente).
+
+        Se comprueba el pid porque con `--preload` los hilos creados en el
+        proceso maestro de gunicorn no sobreviven al fork de los workers.
+        """
+        if self.hilos <= 0 or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            for i in range(self.hilos):
+                threading.Thread(target=self._trabajador, name=f'trabajos-{i}', daemon=True).start()
+
+    @staticmethod
+    def id_contenido(tipo_medida, version, medidas, edades, es_masculino):
+        """Hash del contenido del trabajo: mismo lote y mismos datos, mismo id"""
+        h = hashlib.sha256(f'{tipo_medida}|{version}|{medidas.size}|'.encode('utf-8'))
+        h.update(np.ascontiguousarray(medidas, dtype='<f8').tobytes())
+        h.update(np.ascontiguousarray(edades, dtype='<f8').tobytes())
+        h.update(np.packbits(es_masculino).tobytes())
+        return h.hexdigest()[:32]
+
+    def enviar(self, tipo_medida, medidas, edades_meses, sexos):
+        """Encola un lote ya validado. Devuelve (estado, nuevo)"""
+        medidas = np.asarray(medidas, dtype=np.float64)
+        edades = np.asarray(edades_meses, dtype=np.float64)
+        es_masculino = np.broadcast_to(np.asarray(sexos) == 'masculino', medidas.shape)
+        version = self.version_datos()
+        trabajo_id = self.id_contenido(tipo_medida, version, medidas, edades, es_masculino)
+
+        existente = self.estado(trabajo_id)
+        if existente is not None and existente['estado'] != ERROR:
+            return existente, False
+
+        # Las entradas se escriben antes de dar de alta el trabajo para que
+        # ningún worker lo reclame sin ellas
+        os.makedirs(self._ruta(trabajo_id), exist_ok=True)
+        _guardar_atomico(self._ruta(trabajo_id, 'medidas.npy'), medidas)
+        _guardar_atomico(self._ruta(trabajo_id, 'edades.npy'), edades)
+        _guardar_atomico(self._ruta(trabajo_id, 'sexos.npy'), np.ascontiguousarray(es_masculino))
+
+        ahora = time.time()
+        bloques = max(1, -(-medidas.size // self.filas_por_bloque))
+        with self._conexion() as conexion:
+            conexion.execute(
+                'INSERT INTO trabajos (id, estado, tipo_medida, version_datos, filas, bloques, filas_por_bloque, '
+                'creado, actualizado) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT(id) DO UPDATE SET estado = excluded.estado, error = NULL, actualizado = excluded.actualizado '
+                'WHERE trabajos.estado = ?',
+                (trabajo_id, PENDIENTE, tipo_medida, version, int(medidas.size), bloques, self.filas_por_bloque,
+                 ahora, ahora, ERROR)
+            )
+        self._avisar(trabajo_id)
+        return self.estado(trabajo_id), True
+
+    def estado(self, trabajo_id):
+        """Estado público de un trabajo, o None si no existe"""
+        with self._conexion() as conexion:
+            fila = conexion.execute('SELECT * FROM trabajos WHERE id = ?', (trabajo_id,)).fetchone()
+        if fila is None:
+            return None
+        estado = dict(fila)
+        estado['progreso'] = round(estado['bloques_completados'] / estado['bloques'], 4)
+        return estado
+
+    def resultado(self, trabajo_id):
+        """Array uint8 de percentiles (0 = sin percentil) de un trabajo completado, o None"""
+        estado = self.estado(trabajo_id)
+        if estado is None or estado['estado'] != COMPLETADO:
+            return None
+        return np.load(self._ruta(trabajo_id, 'resultado.npy'))
+
+    def eventos(self, trabajo_id, intervalo=1.0, espera_max=None):
+        """Generador de estados cada vez que cambia el progreso, hasta que el trabajo termina"""
+        inicio, anterior = time.monotonic(), None
+        while True:
+            estado = self.estado(trabajo_id)
+            if estado is None:
+                return
+            firma = (estado['estado'], estado['bloques_completados'])
+            if firma != anterior:
+                anterior = firma
+                yield estado
+            if estado['estado'] in ESTADOS_FINALES:
+                return
+            if espera_max is not None and time.monotonic() - inicio > espera_max:
+                return
+            time.sleep(intervalo)
+
+    def _avisar(self, trabajo_id):
+        self._aviso.set()
+        if self.redis is not None:
+            try:
+                self.redis.rpush(CLAVE_REDIS, trabajo_id)
+            except redis.RedisError:
+                pass
+
+    def _esperar_aviso(self):
+        """Espera a que haya trabajo nuevo (o vence el intervalo de sondeo)"""
+        if self.redis is not None:
+            try:
+                self.redis.blpop(CLAVE_REDIS, timeout=int(INTERVALO_SONDEO_S))
+                return
+            except redis.RedisError:
+                pass
+        self._aviso.wait(INTERVALO_SONDEO_S)
+        self._aviso.clear()
+
+    def _reclamar(self):
+        """Reclama atómicamente el trabajo pendiente (o huérfano) más antiguo"""
+        ahora = time.time()
+        with self._conexion() as conexion:
+            conexion.execute('BEGIN IMMEDIATE')
+            try:
+                fila = conexion.execute(
+                    'SELECT id FROM trabajos WHERE estado = ? OR (estado = ? AND actualizado < ?) '
+                    'ORDER BY creado LIMIT 1',
+                    (PENDIENTE, EN_CURSO, ahora - CADUCIDAD_S)
+                ).fetchone()
+                if fila is not None:
+                    conexion.execute('UPDATE trabajos SET estado = ?, actualizado = ? WHERE id = ?',
+                                     (EN_CURSO, ahora, fila['id']))
+                conexion.execute('COMMIT')
+            except Exception:
+                conexion.execute('ROLLBACK')
+                raise
+        return fila['id'] if fila is not None else None
+
+    def _actualizar(self, trabajo_id, **campos):
+        campos['actualizado'] = time.time()
+        asignaciones = ', '.join(f'{campo} = ?' for campo in campos)
+        with self._conexion() as conexion:
+            conexion.execute(f'UPDATE trabajos SET {asignaciones} WHERE id = ?', (*campos.values(), trabajo_id))
+
+    def _procesar(self, trabajo_id):
+        """Calcula los bloques que falten, guardando cada uno como checkpoint"""
+        estado = self.estado(trabajo_id)
+        medidas = np.load(self._ruta(trabajo_id, 'medidas.npy'), mmap_mode='r')
+        edades = np.load(self._ruta(trabajo_id, 'edades.npy'), mmap_mode='r')
+        es_masculino = np.load(self._ruta(trabajo_id, 'sexos.npy'), mmap_mode='r')
+        sexos_posibles = np.array(['femenino', 'masculino'])
+
+        filas_por_bloque = estado['filas_por_bloque']
+        if filas_por_bloque is None:
+            # Trabajo de un spool antiguo: no se sabe con qué tamaño se cortaron sus
+            # checkpoints, así que se descartan y se recalcula con el tamaño actual
+            filas_por_bloque = self.filas_por_bloque
+            for bloque in range(estado['bloques']):
+                ruta_bloque = self._ruta(trabajo_id, f'bloque_{bloque:05d}.npy')
+                if os.path.exists(ruta_bloque):
+                    os.remove(ruta_bloque)
+            estado['bloques'] = max(1, -(-estado['filas'] // filas_por_bloque))
+            self._actualizar(trabajo_id, filas_por_bloque=filas_por_bloque, bloques=estado['bloques'],
+                             bloques_completados=0)
+
+        rutas_bloques = []
+        for bloque in range(estado['bloques']):
+            ruta_bloque = self._ruta(trabajo_id, f'bloque_{bloque:05d}.npy')
+            rutas_bloques.append(ruta_bloque)
+            if os.path.exists(ruta_bloque):
+                continue
+            inicio = bloque * filas_por_bloque
+            fin = inicio + filas_por_bloque
+            percentiles = self.calcular(
+                np.asarray(medidas[inicio:fin]), np.asarray(edades[inicio:fin]),
+                sexos_posibles[np.asarray(es_masculino[inicio:fin], dtype=np.intp)], estado['tipo_medida']
+            )
+            _guardar_atomico(ruta_bloque, np.asarray(percentiles, dtype=np.uint8))
+            # El recuento también sirve de latido frente a la caducidad
+            self._actualizar(trabajo_id, bloques_completados=bloque + 1)
+
+        resultado = np.concatenate([np.load(ruta) for ruta in rutas_bloques])
+        _guardar_atomico(self._ruta(trabajo_id, 'resultado.npy'), resultado)
+        self._actualizar(trabajo_id, estado=COMPLETADO, bloques_completados=estado['bloques'])
+        for ruta in rutas_bloques:
+            os.remove(ruta)
+
+    def _trabajador(self):
+        while True:
+            try:
+                trabajo_id = self._reclamar()
+            except sqlite3.Error:
+                trabajo_id = None
+            if trabajo_id is None:
+                self._esperar_aviso()
+                continue
+            try:
+                self._procesar(trabajo_id)
+            except Exception as e:
+                try:
+                    self._actualizar(trabajo_id, estado=ERROR, error=str(e))
+                except sqlite3.Error:
+                    pass
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Almacén de mediciones por paciente para el seguimiento longitudinal
+
+Opcional (`ANTROPOMETRIA_MEDICIONES` apunta al fichero SQLite). Cada medición
+se guarda con su percentil, calculado al escribir, y con la versión de los
+datos de referencia con que se calculó. La clave primaria (paciente, fecha,
+tipo de medida) en una tabla WITHOUT ROWID deja las mediciones de un paciente
+contiguas y ordenadas por fecha, así que la trayectoria completa es una sola
+lectura por índice. Las filas calculadas con otra versión de los datos se
+vuelven a puntuar, en lote, la primera vez que se leen.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+_ESQUEMA_SQL = """
+CREATE TABLE IF NOT EXISTS mediciones (
+    paciente TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    tipo_medida TEXT NOT NULL,
+    valor REAL NOT NULL,
+    edad_meses INTEGER NOT NULL,
+    sexo TEXT NOT NULL,
+    percentil INTEGER NOT NULL,
+    version_datos TEXT NOT NULL,
+    actualizado REAL NOT NULL,
+    PRIMARY KEY (paciente, fecha, tipo_medida)
+) WITHOUT ROWID
+"""
+
+_COLUMNAS = 'paciente, fecha, tipo_medida, valor, edad_meses, sexo, percentil, version_datos, actualizado'
+
+
+class MeasurementStore:
+    """Mediciones por paciente en SQLite.
+
+    `calcular(medidas, edades, sexos, tipo_medida)` devuelve los percentiles
+    uint8 de un lote (0 = sin percentil) y `version_datos()` identifica los
+    datos de referencia con que se calculan.
+    """
+
+    def __init__(self, ruta, calcular, version_datos):
+        self.ruta = ruta
+        self.calcular = calcular
+        self.version_datos = version_datos
+
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+        with self._conexion() as conexion:
+            conexion.execute('PRAGMA journal_mode=WAL')
+            conexion.execute(_ESQUEMA_SQL)
+
+    @contextmanager
+    def _conexion(self):
+        # Una conexión por operación: los hilos y procesos no comparten conexiones
+        conexion = sqlite3.connect(self.ruta, timeout=30, isolation_level=None)
+        try:
+            yield conexion
+        finally:
+            conexion.close()
+
+    def _puntuar(self, valores, edades, sexos, tipos):
+        """Percentiles de filas de varios tipos de medida: un lote por tipo"""
+        percentiles = np.zeros(len(valores), dtype=np.uint8)
+        for tipo_medida in np.unique(tipos):
+            filas = tipos == tipo_medida
+            percentiles[filas] = self.calcular(valores[filas], edades[filas], sexos[filas], str(tipo_medida))
+        return percentiles
+
+    def anadir(self, pacientes, fechas, edades_meses, sexos, tipos_medida, valores):
+        """Guarda (o sustituye) mediciones ya validadas; las columnas pueden ser escalares comunes.
+
+        Devuelve el número de filas escritas.
+        """
+        valores = np.atleast_1d(np.asarray(valores, dtype=np.float64))
+        pacientes, fechas, edades, sexos, tipos = (
+            np.broadcast_to(np.asarray(columna), valores.shape)
+            for columna in (pacientes, fechas, edades_meses, sexos, tipos_medida)
+        )
+        percentiles = self._puntuar(valores, edades, sexos, tipos)
+
+        version, ahora = self.version_datos(), time.time()
+        filas = zip(pacientes.tolist(), fechas.tolist(), tipos.tolist(), valores.tolist(),
+                    np.asarray(edades, dtype=np.int64).tolist(), sexos.tolist(), percentiles.tolist())
+        with self._conexion() as conexion:
+            conexion.execute('BEGIN')
+            conexion.executemany(
+                f'INSERT OR REPLACE INTO mediciones ({_COLUMNAS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(*fila, version, ahora) for fila in filas]
+            )
+            conexion.execute('COMMIT')
+        return int(valores.size)
+
+    def trayectoria(self, paciente, tipo_medida=None):
+        """Mediciones puntuadas de un paciente agrupadas por tipo y ordenadas por fecha, o None"""
+        consulta = f'SELECT {_COLUMNAS} FROM mediciones WHERE paciente = ?'
+        parametros = [paciente]
+        if tipo_medida is not None:
+            consulta += ' AND tipo_medida = ?'
+            parametros.append(tipo_medida)
+        with self._conexion() as conexion:
+            filas = conexion.execute(consulta + ' ORDER BY fecha', parametros).fetchall()
+            if not filas:
+                return None
+            filas = self._actualizar_version(conexion, filas)
+
+        serie = {}
+        for _, fecha, tipo, valor, edad, _, percentil, _, _ in filas:
+            serie.setdefault(tipo, []).append({
+                'fecha': fecha, 'edad_meses': edad, 'valor': valor, 'percentil': percentil or None
+            })
+        return {'paciente': paciente, 'sexo': filas[-1][5], 'mediciones': serie}
+
+    def _actualizar_version(self, conexion, filas):
+        """Vuelve a puntuar las filas calculadas con otra versión de los datos"""
+        version = self.version_datos()
+        antiguas = [i for i, fila in enumerate(filas) if fila[7] != version]
+        if not antiguas:
+            return filas
+
+        columnas = list(zip(*(filas[i] for i in antiguas)))
+        percentiles = self._puntuar(
+            np.asarray(columnas[3], dtype=np.float64), np.asarray(columnas[4]),
+            np.asarray(columnas[5]), np.asarray(columnas[2])
+        ).tolist()
+        ahora = time.time()
+        conexion.execute('BEGIN')
+        conexion.executemany(
+            'UPDATE mediciones SET percentil = ?, version_datos = ?, actualizado = ? '
+            'WHERE paciente = ? AND fecha = ? AND tipo_medida = ?',
+            [(percentil, version, ahora, filas[i][0], filas[i][1], filas[i][2])
+             for i, percentil in zip(antiguas, percentiles)]
+        )
+        conexion.execute('COMMIT')
+
+        filas = list(filas)
+        for i, percentil in zip(antiguas, percentiles):
+            filas[i] = (*filas[i][:6], percentil, version, ahora)
+        return filas
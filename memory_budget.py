@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Contabilidad y presupuesto de memoria de la aplicación
+
+Cada componente que ocupa memoria (tablas de referencia, rejillas, cachés)
+registra una función que devuelve su tamaño, y los lotes reservan una
+estimación de sus buffers mientras se calculan. Con un presupuesto configurado
+(`ANTROPOMETRIA_MEMORIA_MB`, por proceso) la app reacciona antes de que el
+contenedor la mate por OOM: al acercarse al límite ejecuta los reductores
+registrados (encoger cachés, pasar las rejillas a mmap) y los lotes que no
+caben se rechazan o se derivan a la cola de trabajos.
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Bytes estimados por fila de lote: columnas NumPy más las listas Python del
+# payload decodificado y de la respuesta
+BYTES_POR_FILA_LOTE = 160
+# Fracción del presupuesto a partir de la cual se ejecutan los reductores
+UMBRAL_PRESION = 0.85
+# Por debajo de esta fracción se deshacen poco a poco las reducciones
+UMBRAL_RECUPERACION = 0.6
+INTERVALO_COMPROBACION_S = 5.0
+# Directorio de los ficheros mapeados en memoria (ruta de datos con mmap)
+DIRECTORIO_MMAP = os.environ.get('ANTROPOMETRIA_MMAP', os.path.join(tempfile.gettempdir(), 'antropometria'))
+
+
+class MemoriaInsuficiente(Exception):
+    """La reserva pedida no cabe en el presupuesto de memoria"""
+
+
+def memoria_residente():
+    """Memoria residente (RSS) del proceso en bytes, o None si no se puede leer"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def tamano_objeto(obj):
+    """Tamaño profundo aproximado de una estructura de dicts, listas y escalares"""
+    total, vistos, pendientes = 0, set(), [obj]
+    while pendientes:
+        actual = pendientes.pop()
+        if id(actual) in vistos:
+            continue
+        vistos.add(id(actual))
+        if isinstance(actual, np.ndarray):
+            total += actual.nbytes
+            continue
+        total += sys.getsizeof(actual)
+        if isinstance(actual, dict):
+            pendientes.extend(actual.keys())
+            pendientes.extend(actual.values())
+        elif isinstance(actual, (list, tuple, set, frozenset)):
+            pendientes.extend(actual)
+    return total
+
+
+class MemoryBudget:
+    """Registro de componentes de memoria y presupuesto opcional por proceso"""
+
+    def __init__(self, limite_bytes=0):
+        self.limite = int(limite_bytes)
+        self.en_vuelo = 0
+        self.rechazados = 0
+        self.reducciones = 0
+        self._componentes = {}
+        self._reductores = []
+        self._ultima_comprobacion = 0.0
+        self._ultima_reduccion = float('-inf')
+        self._reducido = False
+        self._residente_base = None
+        self._lock = threading.Lock()
+        self._lock_reduccion = threading.Lock()
+
+    @property
+    def activo(self):
+        return self.limite > 0
+
+    def registrar(self, nombre, medir):
+        """Registra un componente; `medir()` devuelve su tamaño en bytes"""
+        self._componentes[nombre] = medir
+
+    def registrar_reductor(self, nombre, reducir, restaurar=None):
+        """Registra una acción que libera memoria bajo presión (en orden de registro).
+
+        `restaurar()`, opcional, deshace la reducción poco a poco cuando la
+        presión desaparece (p. ej. devolver su capacidad a una caché).
+        """
+        self._reductores.append((nombre, reducir, restaurar))
+
+    def componentes(self):
+        tamanos = {}
+        for nombre, medir in self._componentes.items():
+            try:
+                tamanos[nombre] = int(medir())
+            except Exception:
+                tamanos[nombre] = None
+        tamanos['lotes_en_vuelo'] = self.en_vuelo
+        return tamanos
+
+    def uso(self):
+        """Memoria usada: la residente si se puede leer, si no la contabilizada"""
+        residente = memoria_residente()
+        if residente is not None:
+            return residente
+        return sum(tamano or 0 for tamano in self.componentes().values())
+
+    def ocupado(self):
+        """Memoria ocupada contando una sola vez los lotes en vuelo.
+
+        La memoria residente ya incluye los buffers que los lotes han llegado a
+        reservar, así que no se les suma `en_vuelo` entero: se toma la mayor
+        entre la residente y la residente sin lotes (medida la última vez que
+        no había ninguno) más lo reservado. Sin /proc, la contabilizada ya
+        incluye los lotes en vuelo.
+        """
+        residente = memoria_residente()
+        if residente is None:
+            return sum(tamano or 0 for tamano in self.componentes().values())
+        if self.en_vuelo == 0 or self._residente_base is None:
+            self._residente_base = residente
+        return max(residente, self._residente_base + self.en_vuelo)
+
+    def disponible(self):
+        """Bytes que aún caben en el presupuesto (None sin presupuesto)"""
+        if not self.activo:
+            return None
+        return self.limite - self.ocupado()
+
+    def reducir(self, forzar=False):
+        """Ejecuta los reductores y fuerza una recolección; devuelve los que se aplicaron.
+
+        Como mucho una vez cada INTERVALO_COMPROBACION_S (salvo `forzar`) y nunca
+        en dos hilos a la vez: las peticiones que llegan mientras tanto no
+        esperan a otra recolección completa.
+        """
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_reduccion < INTERVALO_COMPROBACION_S:
+            return []
+        if not self._lock_reduccion.acquire(blocking=False):
+            return []
+        try:
+            self._ultima_reduccion = ahora
+            aplicados = []
+            for nombre, reducir, _ in self._reductores:
+                try:
+                    reducir()
+                    aplicados.append(nombre)
+                except Exception:
+                    pass
+            gc.collect()
+            self.reducciones += 1
+            self._reducido = True
+            return aplicados
+        finally:
+            self._lock_reduccion.release()
+
+    def restaurar(self):
+        """Deshace un paso de las reducciones (reductores con `restaurar`)"""
+        for _, _, restaurar in self._reductores:
+            if restaurar is not None:
+                try:
+                    restaurar()
+                except Exception:
+                    pass
+
+    def comprobar(self):
+        """Reduce si el uso supera el umbral de presión y restaura cuando baja (como mucho cada pocos segundos)"""
+        if not self.activo:
+            return []
+        ahora = time.monotonic()
+        if ahora - self._ultima_comprobacion < INTERVALO_COMPROBACION_S:
+            return []
+        self._ultima_comprobacion = ahora
+        with self._lock:
+            ocupado = self.ocupado()
+        if ocupado > self.limite * UMBRAL_PRESION:
+            return self.reducir()
+        if self._reducido and ocupado < self.limite * UMBRAL_RECUPERACION:
+            self.restaurar()
+        return []
+
+    def _reservar_si_cabe(self, nbytes):
+        with self._lock:
+            if self.activo and nbytes > self.disponible():
+                return False
+            self.en_vuelo += nbytes
+            return True
+
+    @contextmanager
+    def reservar(self, nbytes):
+        """Reserva `nbytes` mientras dura el bloque o lanza MemoriaInsuficiente.
+
+        La comprobación y la reserva van bajo el mismo cerrojo: dos lotes
+        concurrentes no pueden ver ambos el mismo hueco libre. Si no cabe se
+        reduce (fuera del cerrojo y con el mismo límite de frecuencia que
+        `comprobar`) y se vuelve a intentar una vez.
+        """
+        if not self._reservar_si_cabe(nbytes):
+            self.reducir()
+            if not self._reservar_si_cabe(nbytes):
+                with self._lock:
+                    self.rechazados += 1
+                raise MemoriaInsuficiente(f'El lote necesita ~{nbytes // 1024} KB y no cabe en el presupuesto')
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.en_vuelo -= nbytes
+
+    def informe(self):
+        """Resumen para monitorización"""
+        componentes = self.componentes()
+        return {
+            'presupuesto_bytes': self.limite or None,
+            'residente_bytes': memoria_residente(),
+            'contabilizado_bytes': sum(tamano or 0 for tamano in componentes.values()),
+            'componentes': componentes,
+            'lotes_rechazados': self.rechazados,
+            'reducciones': self.reducciones,
+        }
+
+
+presupuesto_memoria = MemoryBudget(float(os.environ.get('ANTROPOMETRIA_MEMORIA_MB', 0)) * 1024 * 1024)
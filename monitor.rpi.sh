@@ -89,6 +89,13 @@ test_connectivity() {
                 echo "Health check: ❌ FALLO"
             fi
             
+            # Memoria contabilizada por la propia app (por worker)
+            MEMORIA_APP=$(curl -s "http://localhost:$PORT/api/memoria" | \
+                jq -r '"\((.residente_bytes // 0) / 1048576 | floor) MB residentes, presupuesto \(if .presupuesto_bytes then (.presupuesto_bytes / 1048576 | floor | tostring) + " MB" else "sin límite" end), \(.lotes_rechazados) lotes fuera de presupuesto"' 2>/dev/null)
+            if [ -n "$MEMORIA_APP" ]; then
+                echo "Memoria app: $MEMORIA_APP"
+            fi
+            
             # Test API básico
             API_TEST=$(curl -s -X POST "http://localhost:$PORT/api/calcular_imc" \
                 -H "Content-Type: application/json" \
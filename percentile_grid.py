@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Rejilla precalculada de bandas de percentil para clasificación en O(1)
+"""
+
+import math
+import os
+
+import numpy as np
+
+PERCENTILES_REF = [3, 10, 25, 50, 75, 90, 97]
+SEXOS = ['masculino', 'femenino']
+
+
+class PercentileBandGrid:
+    """Rejilla (sexo, edad en meses, medida cuantizada) -> banda de percentil.
+
+    Cada celda guarda en un uint8 el índice de la banda que devolvería el
+    recorrido lineal de las referencias ("primer percentil cuya referencia es
+    >= medida"). Las medidas que no caen exactamente en la rejilla (más
+    decimales que el paso) o fuera del rango de edades no se resuelven aquí y
+    el llamador debe recurrir al cálculo normal.
+    """
+
+    def __init__(self, referencias, edad_min_meses, paso=0.1):
+        # referencias: array (2, n_edades, 7) con los valores P3..P97 por sexo y edad
+        referencias = np.asarray(referencias, dtype=np.float64)
+        self.edad_min_meses = int(edad_min_meses)
+        self.edad_max_meses = self.edad_min_meses + referencias.shape[1] - 1
+        self.paso = paso
+
+        # Rango cuantizado con una celda de margen a cada lado: fuera de él la
+        # banda ya es constante (0 por debajo, la última por encima)
+        self.q_min = int(math.floor(referencias.min() / paso)) - 1
+        q_max = int(math.ceil(referencias.max() / paso)) + 1
+        valores = np.round(np.arange(self.q_min, q_max + 1) * paso, 6)
+
+        self.bandas = np.empty((2, referencias.shape[1], valores.size), dtype=np.uint8)
+        ultima = len(PERCENTILES_REF) - 1
+        for s in range(2):
+            for e in range(referencias.shape[1]):
+                dentro = valores[:, None] <= referencias[s, e][None, :]
+                self.bandas[s, e] = np.where(dentro.any(axis=1), dentro.argmax(axis=1), ultima)
+
+    @classmethod
+    def desde_funcion(cls, funcion_ref, edad_min_meses, edad_max_meses, paso=0.1):
+        """Construye la rejilla evaluando funcion_ref(edad_meses, sexo) -> 7 valores"""
+        referencias = [
+            [funcion_ref(edad, sexo) for edad in range(edad_min_meses, edad_max_meses + 1)]
+            for sexo in SEXOS
+        ]
+        return cls(referencias, edad_min_meses, paso)
+
+    @classmethod
+    def desde_tabla(cls, tabla, paso=0.1):
+        """Construye la rejilla a partir de una tabla de `tablas_percentiles`"""
+        metadatos = tabla['metadatos']
+        edades = range(metadatos['edad_min_meses'], metadatos['edad_max_meses'] + 1)
+        referencias = []
+        for sexo in SEXOS:
+            datos_sexo = tabla['datos'][sexo]
+            filas = []
+            for edad in edades:
+                # Las claves de edad son enteros recién fusionados y cadenas tras leer el JSON
+                fila = datos_sexo.get(edad, datos_sexo.get(str(edad)))
+                filas.append([fila[f'P{p}'] for p in PERCENTILES_REF])
+            referencias.append(filas)
+        return cls(referencias, metadatos['edad_min_meses'], paso)
+
+    @classmethod
+    def desde_bandas(cls, bandas, edad_min_meses, q_min, paso=0.1):
+        """Reconstruye una rejilla sobre un array de bandas ya calculado (sin copiarlo)"""
+        grid = cls.__new__(cls)
+        grid.bandas = bandas
+        grid.edad_min_meses = int(edad_min_meses)
+        grid.edad_max_meses = grid.edad_min_meses + bandas.shape[1] - 1
+        grid.q_min = int(q_min)
+        grid.paso = paso
+        return grid
+
+    @property
+    def nbytes(self):
+        """Memoria ocupada por la rejilla en bytes"""
+        return self.bandas.nbytes
+
+    @property
+    def mapeada(self):
+        """Indica si las bandas viven en un fichero mapeado en memoria"""
+        return isinstance(self.bandas, np.memmap)
+
+    def a_mmap(self, ruta):
+        """Pasa las bandas a un fichero .npy mapeado en solo lectura.
+
+        Las páginas las gestiona el kernel: se comparten entre procesos y se
+        pueden desalojar bajo presión de memoria en lugar de ocupar el heap.
+        """
+        temporal = f'{ruta}.{os.getpid()}.tmp'
+        with open(temporal, 'wb') as f:
+            np.save(f, np.asarray(self.bandas))
+        os.replace(temporal, ruta)
+        self.bandas = np.load(ruta, mmap_mode='r')
+
+    def banda(self, medida, edad_meses, sexo):
+        """Índice de banda (0-6) o None si la medida no está cubierta por la rejilla"""
+        if not math.isfinite(medida) or edad_meses != int(edad_meses):
+            return None
+        if not self.edad_min_meses <= edad_meses <= self.edad_max_meses:
+            return None
+        q = round(medida / self.paso)
+        if abs(medida - q * self.paso) > 1e-9:
+            return None
+        fila = self.bandas[0 if sexo == 'masculino' else 1, int(edad_meses) - self.edad_min_meses]
+        return int(fila[min(max(q - self.q_min, 0), fila.size - 1)])
+
+    def percentil(self, medida, edad_meses, sexo):
+        """Percentil de referencia (3-97) o None si la medida no está cubierta"""
+        banda = self.banda(medida, edad_meses, sexo)
+        return None if banda is None else PERCENTILES_REF[banda]
+
+    def bandas_lote(self, medidas, edades_meses, sexos):
+        """Versión vectorizada de banda().
+
+        `sexos` puede ser un array de cadenas o una máscara booleana (True =
+        masculino). Devuelve (bandas, cubiertas): un array uint8 con la banda de
+        cada fila y una máscara booleana con las filas resueltas por la rejilla.
+        """
+        medidas = np.asarray(medidas, dtype=np.float64)
+        edades = np.nan_to_num(np.asarray(edades_meses, dtype=np.float64), nan=-1.0)
+        sexos = np.asarray(sexos)
+        es_masculino = sexos if sexos.dtype == np.bool_ else sexos == 'masculino'
+        indice_sexo = np.where(es_masculino, 0, 1)
+
+        q = np.round(medidas / self.paso)
+        cubiertas = (
+            (edades >= self.edad_min_meses) & (edades <= self.edad_max_meses)
+            & (edades == np.floor(edades))
+            & (np.abs(medidas - q * self.paso) <= 1e-9)
+        )
+        fila = np.clip(edades, self.edad_min_meses, self.edad_max_meses).astype(np.intp) - self.edad_min_meses
+        columna = np.clip(np.nan_to_num(q) - self.q_min, 0, self.bandas.shape[2] - 1).astype(np.intp)
+        bandas = self.bandas[indice_sexo, fila, columna]
+        return np.where(cubiertas, bandas, 0).astype(np.uint8), cubiertas
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Páginas prerenderizadas y servidas desde memoria con respuestas condicionales
+
+La página principal es estática para cada despliegue: solo depende de las
+plantillas y del manifiesto de recursos con hash. En lugar de pasar por Jinja
+en cada visita, se renderiza una vez por versión (la de los datos, las
+plantillas y la raíz de la app). Los bytes se guardan junto a sus variantes
+gzip y Brotli (si está instalado) y se sirven con `ETag` y `Last-Modified`. Una
+visita repetida se resuelve con un 304. La primera visita de cada cliente
+recibe la variante comprimida ya hecha, sin pasar por Jinja ni comprimir.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from email.utils import formatdate
+
+from flask import Response, render_template, request
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se sirven gzip e identidad
+    brotli = None
+
+# Las páginas llevan a recursos con hash, así que siempre se revalidan (304 barato)
+CACHE_CONTROL = 'no-cache'
+# Preferencia de codificación cuando el cliente acepta varias
+CODIFICACIONES = ('br', 'gzip')
+
+
+class PrerenderedPage:
+    """Una plantilla renderizada una vez por versión, con sus variantes comprimidas"""
+
+    def __init__(self, app, plantilla, version_datos, contexto=None):
+        self.app = app
+        self.plantilla = plantilla
+        self.version_datos = version_datos
+        self.contexto = contexto or {}
+        self.renderizados = 0
+        self._version = None
+        self._variantes = {}
+        self._lock = threading.Lock()
+
+    def _ficheros_plantillas(self):
+        """Rutas de las plantillas del directorio de la app (la página y sus bases)"""
+        directorio = os.path.join(self.app.root_path, self.app.template_folder or 'templates')
+        return [os.path.join(directorio, nombre) for nombre in self.app.jinja_env.list_templates()
+                if os.path.exists(os.path.join(directorio, nombre))]
+
+    def _version_actual(self):
+        """Versión de la página; en modo recarga de plantillas incluye sus fechas de modificación"""
+        version = (self.version_datos(), request.script_root)
+        if self.app.jinja_env.auto_reload:
+            version += tuple(os.stat(ruta).st_mtime_ns for ruta in self._ficheros_plantillas())
+        return version
+
+    def _renderizar(self):
+        cuerpo = render_template(self.plantilla, **self.contexto).encode('utf-8')
+        etag = hashlib.sha1(cuerpo).hexdigest()[:24]
+        modificada = max((os.stat(ruta).st_mtime for ruta in self._ficheros_plantillas()), default=0)
+        variantes = {None: cuerpo}
+        variantes['gzip'] = gzip.compress(cuerpo, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variantes['br'] = brotli.compress(cuerpo, quality=11)
+        self.renderizados += 1
+        return {
+            codificacion: (datos, etag if codificacion is None else f'{etag}-{codificacion}', int(modificada))
+            for codificacion, datos in variantes.items()
+        }
+
+    def respuesta(self):
+        """Respuesta para la petición actual: variante según Accept-Encoding, 304 si no ha cambiado"""
+        version = self._version_actual()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._variantes = self._renderizar()
+                    self._version = version
+        variantes = self._variantes
+
+        codificacion = next((c for c in CODIFICACIONES
+                             if c in variantes and request.accept_encodings[c]), None)
+        cuerpo, etag, modificada = variantes[codificacion]
+        respuesta = Response(cuerpo, mimetype='text/html')
+        if codificacion is not None:
+            respuesta.headers['Content-Encoding'] = codificacion
+        respuesta.vary.add('Accept-Encoding')
+        respuesta.set_etag(etag)
+        respuesta.headers['Last-Modified'] = formatdate(modificada, usegmt=True)
+        respuesta.headers['Cache-Control'] = CACHE_CONTROL
+        return respuesta.make_conditional(request)
+
+    @property
+    def nbytes(self):
+        """Bytes de la página y sus variantes en memoria"""
+        return sum(len(datos) for datos, _, _ in self._variantes.values())
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Estándares de referencia compilados para evaluar una medida contra varios a la vez
+
+DataFusion compila cada estándar (conjunto de curvas P3-P97) en un array
+float32 por tipo de medida con forma (sexo, edad, percentil), guardado como
+.npy; el JSON fusionado solo lleva sus metadatos. Los arrays se abren bajo
+demanda con mmap, así que comparar contra N estándares no exige cargar N
+copias de las tablas en JSON.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+from percentile_grid import PERCENTILES_REF
+
+# Id de la referencia integrada en la calculadora (rejilla + recorrido lineal)
+ESTANDAR_INTEGRADO = 'calculadora'
+
+
+class ReferenceStandards:
+    """Estándares compilados descritos por `metadatos` (sección `estandares` del JSON fusionado)"""
+
+    def __init__(self, metadatos, directorio_base):
+        self.metadatos = metadatos or {}
+        self.directorio_base = directorio_base
+        self._tablas = {}
+        self._lock = threading.Lock()
+
+    def resumen(self):
+        """Descripción, fuentes y tipos de medida de cada estándar compilado"""
+        return {
+            estandar: {
+                'descripcion': info.get('descripcion', estandar),
+                'fuentes': info.get('fuentes', []),
+                'tipos_medida': sorted(info.get('tablas', {}))
+            }
+            for estandar, info in self.metadatos.items()
+        }
+
+    def disponibles(self, tipo_medida=None):
+        """Ids de los estándares (que tienen tabla para `tipo_medida`, si se indica)"""
+        return [
+            estandar for estandar, info in self.metadatos.items()
+            if tipo_medida is None or tipo_medida in info.get('tablas', {})
+        ]
+
+    def tabla(self, estandar, tipo_medida):
+        """(edad_min_meses, array (2, n_edades, 7)) de un estándar, o None si no tiene esa tabla"""
+        clave = (estandar, tipo_medida)
+        with self._lock:
+            if clave in self._tablas:
+                return self._tablas[clave]
+        info = self.metadatos.get(estandar, {}).get('tablas', {}).get(tipo_medida)
+        if info is None:
+            return None
+        referencias = np.load(os.path.join(self.directorio_base, info['archivo']), mmap_mode='r')
+        tabla = (int(info['edad_min_meses']), referencias)
+        with self._lock:
+            self._tablas[clave] = tabla
+        return tabla
+
+    def bandas_lote(self, estandar, tipo_medida, medidas, edades, es_masculino):
+        """Banda (0-6) de cada fila según un estándar y máscara de filas con referencia"""
+        edad_min, referencias = self.tabla(estandar, tipo_medida)
+        edades = np.asarray(edades, dtype=np.float64)
+        cubiertas = (edades >= edad_min) & (edades < edad_min + referencias.shape[1]) & (edades == np.floor(edades))
+        fila = np.clip(edades, edad_min, edad_min + referencias.shape[1] - 1).astype(np.intp) - edad_min
+        filas_ref = referencias[np.where(es_masculino, 0, 1), fila]
+        # Primer percentil cuya referencia es >= medida (comparado en float32, como se guardó)
+        bandas = (np.asarray(medidas, dtype=np.float32)[:, None] > filas_ref).sum(axis=1)
+        np.minimum(bandas, len(PERCENTILES_REF) - 1, out=bandas)
+        return bandas.astype(np.uint8), cubiertas
+
+    def percentiles_lote(self, medidas, edades, sexos, tipo_medida, estandares=None):
+        """Percentiles de un lote contra varios estándares: {estandar: array uint8 (0 = sin percentil)}"""
+        medidas = np.asarray(medidas, dtype=np.float64)
+        es_masculino = np.broadcast_to(np.asarray(sexos) == 'masculino', medidas.shape)
+        tabla_percentiles = np.asarray(PERCENTILES_REF, dtype=np.uint8)
+        if estandares is None:
+            estandares = self.disponibles(tipo_medida)
+        resultados = {}
+        for estandar in estandares:
+            if self.tabla(estandar, tipo_medida) is None:
+                resultados[estandar] = np.zeros(medidas.shape, dtype=np.uint8)
+                continue
+            bandas, cubiertas = self.bandas_lote(estandar, tipo_medida, medidas, edades, es_masculino)
+            resultados[estandar] = np.where(cubiertas, tabla_percentiles[bandas], 0).astype(np.uint8)
+        return resultados
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Caché de respuestas para las rutas de cálculo deterministas
+
+Las rutas de cálculo son funciones puras de sus parámetros y de la versión de
+los datos de referencia. El decorador `cacheable` construye una clave canónica
+(ruta, versión de datos, formato de respuesta y parámetros normalizados), sirve
+las repeticiones desde una caché LRU en memoria, responde 304 a los
+revalidados con `If-None-Match` y marca la respuesta con `ETag` y
+`Cache-Control` para que nginx (proxy_cache) pueda servirlas sin llegar a Python.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+from codec import MIME_MSGPACK, decodificar, leer_payload, respuesta_binaria
+
+MAX_ENTRADAS = int(os.environ.get('ANTROPOMETRIA_CACHE_RESPUESTAS', 2048))
+MAX_AGE = int(os.environ.get('ANTROPOMETRIA_CACHE_MAX_AGE', 3600))
+
+
+class ResponseCache:
+    """Caché LRU acotada de respuestas ya serializadas"""
+
+    def __init__(self, max_entradas=MAX_ENTRADAS):
+        self.max_entradas = max_entradas
+        self.capacidad = max_entradas
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+
+    def put(self, clave, entrada):
+        with self._lock:
+            self._entradas[clave] = entrada
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def reducir(self, fraccion=0.5, minimo=64):
+        """Reduce la capacidad (descartando las entradas menos usadas) bajo presión de memoria"""
+        with self._lock:
+            self.max_entradas = max(minimo, int(self.max_entradas * fraccion))
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    def restaurar(self, factor=2):
+        """Recupera capacidad tras una reducción, sin pasar de la configurada"""
+        with self._lock:
+            self.max_entradas = min(self.capacidad, self.max_entradas * factor)
+
+    def clear(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        return len(self._entradas)
+
+    @property
+    def nbytes(self):
+        """Tamaño aproximado de los cuerpos almacenados en bytes"""
+        with self._lock:
+            return sum(len(cuerpo) for cuerpo, _, _ in self._entradas.values())
+
+
+cache_respuestas = ResponseCache()
+
+
+def normalizar_valor(valor):
+    """Normaliza un parámetro: los números (o cadenas numéricas) pasan a float"""
+    if isinstance(valor, bool):
+        return valor
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    if isinstance(valor, str):
+        texto = valor.strip()
+        try:
+            return float(texto)
+        except ValueError:
+            return texto
+    return valor
+
+
+def parametros_canonicos(data):
+    """Serialización estable de los parámetros de una petición"""
+    if not isinstance(data, dict):
+        return ''
+    normalizados = {clave: normalizar_valor(valor) for clave, valor in data.items()}
+    return json.dumps(normalizados, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+
+def respuesta_fallida(respuesta):
+    """True si el cuerpo es un payload con `success: False` (los errores que las rutas devuelven con 200)"""
+    try:
+        if respuesta.mimetype == MIME_MSGPACK:
+            payload = decodificar(respuesta.get_data())
+        else:
+            payload = json.loads(respuesta.get_data())
+    except Exception:
+        return True
+    return isinstance(payload, dict) and payload.get('success') is False
+
+
+def cacheable(version_datos):
+    """Decorador para rutas deterministas; `version_datos` es un callable sin argumentos"""
+    def decorador(vista):
+        @wraps(vista)
+        def envoltorio(*args, **kwargs):
+            try:
+                parametros = parametros_canonicos(leer_payload())
+            except Exception:
+                # Cuerpo ilegible: la propia ruta genera el error, sin caché
+                return vista(*args, **kwargs)
+
+            formato = 'msgpack' if respuesta_binaria() else 'json'
+            version = version_datos()
+            clave = f'{request.path}|{version}|{formato}|{parametros}'
+            etag = hashlib.sha1(clave.encode('utf-8')).hexdigest()[:24]
+
+            if etag in request.if_none_match:
+                respuesta = Response(status=304)
+            else:
+                entrada = cache_respuestas.get(clave)
+                if entrada is not None:
+                    cuerpo, status, mimetype = entrada
+                    respuesta = Response(cuerpo, status=status, mimetype=mimetype)
+                else:
+                    respuesta = make_response(vista(*args, **kwargs))
+                    # Ni los errores con status distinto de 200 ni los `success: False` con 200
+                    if respuesta.status_code != 200 or respuesta_fallida(respuesta):
+                        return respuesta
+                    cache_respuestas.put(clave, (respuesta.get_data(), respuesta.status_code, respuesta.mimetype))
+
+            respuesta.set_etag(etag)
+            respuesta.headers['Cache-Control'] = f'public, max-age={MAX_AGE}'
+            respuesta.headers['X-Version-Datos'] = version
+            respuesta.vary.add('Accept')
+            return respuesta
+        # Marca para warmup.py: solo se repiten peticiones a rutas sin efectos
+        envoltorio.cacheable = True
+        return envoltorio
+    return decorador
@@ -137,6 +137,7 @@ if [ $(docker ps -q -f name=antropometria-rpi5) ]; then
     echo "   • POST /api/calcular_talla_diana"
     echo "   • POST /api/calcular_velocidad_crecimiento"
     echo "   • GET  /health (monitoreo)"
+    echo "   • GET  /ready, /live (sondas de disponibilidad y vida)"
     echo ""
     echo "🔧 Comandos útiles:"
     echo "   Ver logs:     docker logs -f antropometria-rpi5"
@@ -157,7 +158,7 @@ if [ $(docker ps -q -f name=antropometria-rpi5) ]; then
     echo "🧪 Realizando test rápido..."
     sleep 5
     
-    if curl -s -f "http://localhost:$PORT/health" > /dev/null; then
+    if curl -s -f "http://localhost:$PORT/ready" > /dev/null; then
         echo "✅ Test de conectividad: OK"
     else
         echo "⚠️  Test de conectividad: Falló (la app puede necesitar más tiempo para iniciar)"
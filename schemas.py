@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+"""
+Validación declarativa de los parámetros de las rutas de cálculo
+
+Cada ruta declara su esquema una sola vez; al crearlo se compilan los
+validadores de cada campo. Los lotes se validan por columnas con operaciones
+NumPy (conversión, NaN, rango y valores permitidos de golpe) y los errores se
+devuelven estructurados por campo, con las filas afectadas.
+"""
+
+import math
+import re
+
+import numpy as np
+
+from age_dates import fechas_iso, edades_meses
+
+# Máximo de filas erróneas que se listan por campo en la respuesta
+MAX_FILAS_ERROR = 20
+
+
+class ErrorValidacion(Exception):
+    """Parámetros inválidos; `errores` es una lista de dicts {campo, error[, filas]}"""
+
+    def __init__(self, errores):
+        super().__init__('; '.join(f"{e['campo']}: {e['error']}" for e in errores))
+        self.errores = errores
+
+    def payload(self):
+        return {'success': False, 'error': 'Datos inválidos', 'errores': self.errores}
+
+
+class Campo:
+    """Parámetro escalar: tipo (float, int o str), rango u opciones permitidas"""
+
+    def __init__(self, nombre, tipo=float, minimo=None, maximo=None, opciones=None,
+                 requerido=True, por_defecto=None, normalizar=None):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.minimo = minimo
+        self.maximo = maximo
+        self.opciones = tuple(opciones) if opciones else None
+        self.requerido = requerido
+        self.por_defecto = por_defecto
+        self.normalizar = normalizar
+
+    def compilar(self):
+        """Devuelve la función que convierte y valida un valor (o lanza ValueError)"""
+        pasos = []
+        if self.tipo is str:
+            pasos.append(lambda v: v.strip() if isinstance(v, str) else str(v))
+        elif self.tipo is int:
+            def a_entero(v):
+                numero = float(v)
+                if not numero.is_integer():
+                    raise ValueError('debe ser un número entero')
+                return int(numero)
+            pasos.append(a_entero)
+        else:
+            def a_real(v):
+                if isinstance(v, bool):
+                    raise ValueError('debe ser numérico')
+                numero = float(v)
+                if not math.isfinite(numero):
+                    raise ValueError('debe ser un número finito')
+                return numero
+            pasos.append(a_real)
+
+        if self.normalizar is not None:
+            pasos.append(self.normalizar)
+        if self.minimo is not None:
+            minimo = self.minimo
+            def comprobar_minimo(v):
+                if v < minimo:
+                    raise ValueError(f'debe ser >= {minimo}')
+                return v
+            pasos.append(comprobar_minimo)
+        if self.maximo is not None:
+            maximo = self.maximo
+            def comprobar_maximo(v):
+                if v > maximo:
+                    raise ValueError(f'debe ser <= {maximo}')
+                return v
+            pasos.append(comprobar_maximo)
+        if self.opciones is not None:
+            opciones = self.opciones
+            def comprobar_opciones(v):
+                if v not in opciones:
+                    raise ValueError(f"debe ser uno de: {', '.join(opciones)}")
+                return v
+            pasos.append(comprobar_opciones)
+
+        def validar(valor):
+            for paso in pasos:
+                valor = paso(valor)
+            return valor
+        return validar
+
+
+class Esquema:
+    """Conjunto de campos escalares de una ruta, compilado al crearse"""
+
+    def __init__(self, *campos, preprocesar=None):
+        self.campos = campos
+        self.preprocesar = preprocesar
+        self._validadores = [(campo, campo.compilar()) for campo in campos]
+
+    def validar(self, data):
+        """Devuelve el dict de valores convertidos o lanza ErrorValidacion"""
+        if not isinstance(data, dict):
+            raise ErrorValidacion([{'campo': '_', 'error': 'se esperaba un objeto con los parámetros'}])
+        if self.preprocesar is not None:
+            data = self.preprocesar(data)
+        valores, errores = {}, []
+        for campo, validador in self._validadores:
+            valor = data.get(campo.nombre)
+            if valor is None or valor == '':
+                if campo.requerido:
+                    errores.append({'campo': campo.nombre, 'error': 'requerido'})
+                else:
+                    valores[campo.nombre] = campo.por_defecto
+                continue
+            try:
+                valores[campo.nombre] = validador(valor)
+            except (TypeError, ValueError) as e:
+                mensaje = str(e) if isinstance(e, ValueError) and str(e).startswith('debe') else 'tipo inválido'
+                errores.append({'campo': campo.nombre, 'error': mensaje})
+        if errores:
+            raise ErrorValidacion(errores)
+        return valores
+
+
+class Columna:
+    """Columna de un lote; `escalar` es el nombre alternativo para un valor común a todas las filas"""
+
+    def __init__(self, nombre, tipo=float, minimo=None, maximo=None, opciones=None, escalar=None):
+        self.nombre = nombre
+        self.tipo = tipo
+        self.minimo = minimo
+        self.maximo = maximo
+        self.opciones = np.asarray(opciones) if opciones else None
+        self.escalar = escalar
+
+
+def _es_lista(valor):
+    return isinstance(valor, (list, tuple)) or (isinstance(valor, np.ndarray) and valor.ndim == 1)
+
+
+def _filas(mascara):
+    return np.flatnonzero(mascara)[:MAX_FILAS_ERROR].tolist()
+
+
+class EsquemaLote:
+    """Esquema de un lote: columnas validadas con operaciones vectorizadas y campos escalares"""
+
+    def __init__(self, columnas, escalares=(), preprocesar=None):
+        self.columnas = columnas
+        self.escalares = Esquema(*escalares)
+        self.preprocesar = preprocesar
+
+    def _columna(self, columna, valores, n_filas):
+        """Convierte y valida una columna; devuelve (array, error o None)"""
+        if columna.tipo is str:
+            array = np.asarray(valores).astype(str)
+            if columna.opciones is not None:
+                invalidas = ~np.isin(array, columna.opciones)
+                if invalidas.any():
+                    return None, {'campo': columna.nombre, 'filas': _filas(invalidas),
+                                  'error': f"debe ser uno de: {', '.join(columna.opciones.tolist())}"}
+            return np.broadcast_to(array, (n_filas,)), None
+
+        try:
+            array = np.asarray(valores, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None, {'campo': columna.nombre, 'error': 'contiene valores no numéricos'}
+        if array.ndim != 1:
+            return None, {'campo': columna.nombre, 'error': 'debe ser una lista de números'}
+
+        comprobaciones = [(~np.isfinite(array), 'valores vacíos o no finitos')]
+        if columna.tipo is int:
+            comprobaciones.append((np.isfinite(array) & (array != np.floor(array)), 'deben ser enteros'))
+        if columna.minimo is not None:
+            comprobaciones.append((array < columna.minimo, f'deben ser >= {columna.minimo}'))
+        if columna.maximo is not None:
+            comprobaciones.append((array > columna.maximo, f'deben ser <= {columna.maximo}'))
+        for mascara, mensaje in comprobaciones:
+            if mascara.any():
+                return None, {'campo': columna.nombre, 'error': mensaje, 'filas': _filas(mascara)}
+        return array, None
+
+    def validar(self, data):
+        """Devuelve el dict de arrays y escalares validados o lanza ErrorValidacion"""
+        if not isinstance(data, dict):
+            raise ErrorValidacion([{'campo': '_', 'error': 'se esperaba un objeto con los parámetros'}])
+        if self.preprocesar is not None:
+            data = self.preprocesar(data)
+        errores = []
+        try:
+            valores = self.escalares.validar(data)
+        except ErrorValidacion as e:
+            valores, errores = {}, list(e.errores)
+
+        # Las columnas presentes deben ser listas (o arrays de MessagePack)
+        no_listas = [columna.nombre for columna in self.columnas
+                     if data.get(columna.nombre) is not None and not _es_lista(data[columna.nombre])]
+        if no_listas:
+            raise ErrorValidacion(errores + [{'campo': nombre, 'error': 'debe ser una lista'} for nombre in no_listas])
+
+        # Longitud del lote: la de la primera columna presente como lista
+        n_filas = None
+        for columna in self.columnas:
+            if data.get(columna.nombre) is not None:
+                n_filas = len(data[columna.nombre])
+                break
+        if not n_filas:
+            errores.append({'campo': self.columnas[0].nombre, 'error': 'el lote está vacío'})
+            raise ErrorValidacion(errores)
+
+        for columna in self.columnas:
+            if data.get(columna.nombre) is not None:
+                crudos = data[columna.nombre]
+                if len(crudos) != n_filas:
+                    errores.append({'campo': columna.nombre, 'error': f'debe tener {n_filas} elementos'})
+                    continue
+            elif columna.escalar and data.get(columna.escalar) is not None:
+                crudos = data[columna.escalar]
+            else:
+                errores.append({'campo': columna.nombre, 'error': 'requerido'})
+                continue
+            array, error = self._columna(columna, crudos, n_filas)
+            if error:
+                errores.append(error)
+            else:
+                valores[columna.nombre] = array
+
+        if errores:
+            raise ErrorValidacion(errores)
+        return valores
+
+
+def validar_opciones_lista(nombre, valores, opciones):
+    """Valida una lista opcional (o cadena separada por comas) de valores permitidos.
+
+    Devuelve la lista sin duplicados, o None si no se indicó ninguno.
+    """
+    if valores is None or valores == '' or valores == []:
+        return None
+    if isinstance(valores, str):
+        valores = [valor.strip() for valor in valores.split(',') if valor.strip()]
+    if not isinstance(valores, (list, tuple)):
+        raise ErrorValidacion([{'campo': nombre, 'error': 'debe ser una lista'}])
+    desconocidos = [str(valor) for valor in valores if valor not in opciones]
+    if desconocidos:
+        raise ErrorValidacion([{'campo': nombre, 'error': f"valores no disponibles: {', '.join(desconocidos)}"}])
+    return list(dict.fromkeys(valores))
+
+
+def _vacio(valor):
+    """None, texto vacío o columna sin elementos (las de MessagePack llegan como arrays NumPy)"""
+    if valor is None:
+        return True
+    if isinstance(valor, np.ndarray):
+        return valor.size == 0
+    return isinstance(valor, (str, list, tuple)) and len(valor) == 0
+
+
+def _edades_desde_fechas(nacimiento, medicion, semanas, campos, lote):
+    """Edades en meses de fechas ISO (y semanas de gestación opcionales) o ErrorValidacion"""
+    campo_nacimiento, campo_medicion, campo_semanas = campos
+    errores = []
+    fechas = {}
+    for campo, valores in ((campo_nacimiento, nacimiento), (campo_medicion, medicion)):
+        fechas[campo] = fechas_iso(valores)
+        invalidas = np.isnat(fechas[campo])
+        if invalidas.any():
+            error = {'campo': campo, 'error': 'fecha no válida (AAAA-MM-DD)'}
+            if lote:
+                error['filas'] = _filas(invalidas)
+            errores.append(error)
+    if semanas is not None:
+        try:
+            semanas = np.atleast_1d(np.asarray(semanas, dtype=np.float64))
+            fuera = ~((semanas >= 22) & (semanas <= 44))
+        except (TypeError, ValueError):
+            semanas, fuera = None, None
+        if fuera is None or fuera.any():
+            error = {'campo': campo_semanas, 'error': 'deben ser semanas de gestación entre 22 y 44'}
+            if lote and fuera is not None:
+                error['filas'] = _filas(fuera)
+            errores.append(error)
+    if errores:
+        raise ErrorValidacion(errores)
+
+    # Las columnas de un solo valor se aplican a todas las filas; el resto deben
+    # tener las mismas que las fechas de nacimiento (o las de medición si es única)
+    longitudes = {campo_nacimiento: fechas[campo_nacimiento].size, campo_medicion: fechas[campo_medicion].size}
+    if semanas is not None:
+        longitudes[campo_semanas] = semanas.size
+    referencia = campo_nacimiento if longitudes[campo_nacimiento] != 1 else campo_medicion
+    for campo, longitud in longitudes.items():
+        if longitud not in (1, longitudes[referencia]):
+            errores.append({'campo': campo, 'error': f'tiene {longitud} elementos y {referencia} '
+                                                     f'{longitudes[referencia]}: deben coincidir'})
+    if errores:
+        raise ErrorValidacion(errores)
+
+    edades, _ = edades_meses(fechas[campo_nacimiento], fechas[campo_medicion], semanas)
+    anteriores = edades < 0
+    if anteriores.any():
+        error = {'campo': campo_medicion, 'error': 'anterior a la fecha de nacimiento'}
+        if lote:
+            error['filas'] = _filas(anteriores)
+        raise ErrorValidacion([error])
+    return edades
+
+
+def edad_desde_fechas(data):
+    """Completa `edad_meses` con `fecha_nacimiento`, `fecha_medicion` y `semanas_gestacion` (opcional)"""
+    if not _vacio(data.get('edad_meses')) or _vacio(data.get('fecha_nacimiento')):
+        return data
+    if _vacio(data.get('fecha_medicion')):
+        raise ErrorValidacion([{'campo': 'fecha_medicion', 'error': 'requerido con fecha_nacimiento'}])
+    semanas = data.get('semanas_gestacion')
+    edades = _edades_desde_fechas(
+        data['fecha_nacimiento'], data['fecha_medicion'], None if _vacio(semanas) else semanas,
+        ('fecha_nacimiento', 'fecha_medicion', 'semanas_gestacion'), lote=False)
+    return dict(data, edad_meses=int(edades[0]))
+
+
+def edades_desde_fechas(data):
+    """Completa `edades_meses` de un lote con `fechas_nacimiento` y `fechas_medicion`.
+
+    `fecha_medicion` y `semanas_gestacion` pueden ser un valor común a todo el lote.
+    """
+    if not _vacio(data.get('edades_meses')) or _vacio(data.get('fechas_nacimiento')):
+        return data
+    medicion = data.get('fechas_medicion')
+    if _vacio(medicion):
+        medicion = data.get('fecha_medicion')
+    if _vacio(medicion):
+        raise ErrorValidacion([{'campo': 'fechas_medicion', 'error': 'requerido con fechas_nacimiento'}])
+    semanas = data.get('semanas_gestacion')
+    edades = _edades_desde_fechas(
+        data['fechas_nacimiento'], medicion, None if _vacio(semanas) else semanas,
+        ('fechas_nacimiento', 'fechas_medicion', 'semanas_gestacion'), lote=True)
+    return dict(data, edades_meses=edades)
+
+
+# Identificadores de paciente del almacén de mediciones (seudónimos, no datos personales)
+PATRON_PACIENTE = re.compile(r'[A-Za-z0-9._-]{1,64}')
+
+
+def validar_paciente(paciente):
+    """Valida el identificador de paciente de una ruta o lanza ErrorValidacion"""
+    if not isinstance(paciente, str) or not PATRON_PACIENTE.fullmatch(paciente):
+        raise ErrorValidacion([{'campo': 'paciente', 'error': 'debe tener 1-64 letras, dígitos, ".", "_" o "-"'}])
+    return paciente
+
+
+def _fecha_valida(valor):
+    fecha = fechas_iso(valor)[0]
+    if np.isnat(fecha):
+        raise ValueError('debe ser una fecha AAAA-MM-DD')
+    return str(fecha)
+
+
+def visitas_desde_fechas(data):
+    """Lote de visitas: deriva las edades y valida pacientes y fechas de medición"""
+    data = edades_desde_fechas(data)
+    errores = []
+    pacientes = data.get('pacientes')
+    if not _vacio(pacientes):
+        pacientes = np.asarray(pacientes).astype(str)
+        unicos, inversa = np.unique(pacientes, return_inverse=True)
+        invalidos = np.array([not PATRON_PACIENTE.fullmatch(p) for p in unicos.tolist()], dtype=bool)[inversa]
+        if invalidos.any():
+            errores.append({'campo': 'pacientes', 'error': 'deben tener 1-64 letras, dígitos, ".", "_" o "-"',
+                            'filas': _filas(invalidos)})
+    campo = 'fechas_medicion' if not _vacio(data.get('fechas_medicion')) else 'fecha_medicion'
+    if not _vacio(data.get(campo)):
+        fechas = fechas_iso(data[campo])
+        invalidas = np.isnat(fechas)
+        if invalidas.any():
+            errores.append({'campo': campo, 'error': 'fecha no válida (AAAA-MM-DD)', 'filas': _filas(invalidas)})
+        else:
+            data = dict(data, **{campo: fechas.astype(str) if campo == 'fechas_medicion' else str(fechas[0])})
+    if errores:
+        raise ErrorValidacion(errores)
+    return data
+
+
+SEXOS = ('masculino', 'femenino')
+TIPOS_MEDIDA = ('peso', 'talla', 'imc', 'perimetro_cefalico')
+# Tipos que puntúan las referencias de la calculadora (las rutas de percentiles)
+TIPOS_CALCULO = ('peso', 'talla', 'imc')
+
+# Esquemas de las rutas de cálculo (rangos de plausibilidad clínica)
+ESQUEMA_IMC = Esquema(
+    Campo('peso', float, minimo=0.3, maximo=300),
+    Campo('talla', float, minimo=20, maximo=250),
+)
+ESQUEMA_TALLA_DIANA = Esquema(
+    Campo('talla_padre', float, minimo=100, maximo=250),
+    Campo('talla_madre', float, minimo=100, maximo=250),
+    Campo('sexo_hijo', str, opciones=SEXOS, normalizar=str.lower),
+)
+ESQUEMA_PERCENTIL = Esquema(
+    Campo('medida', float, minimo=0.1, maximo=300),
+    Campo('edad_meses', int, minimo=0, maximo=240),
+    Campo('sexo', str, opciones=SEXOS),
+    Campo('tipo_medida', str, opciones=TIPOS_CALCULO),
+    preprocesar=edad_desde_fechas,
+)
+ESQUEMA_VELOCIDAD = Esquema(
+    Campo('talla_inicial', float, minimo=20, maximo=250),
+    Campo('talla_actual', float, minimo=20, maximo=250),
+    Campo('tiempo_meses', int, minimo=1, maximo=240),
+)
+ESQUEMA_SERIES = Esquema(
+    Campo('tipo_medida', str, opciones=TIPOS_MEDIDA),
+    Campo('sexo', str, opciones=SEXOS),
+    Campo('puntos', int, minimo=2, maximo=500, requerido=False, por_defecto=60),
+)
+
+
+def puntos_desde_texto(data):
+    """Acepta `edades_meses` y `medidas` como listas separadas por comas (parámetros GET)"""
+    data = dict(data)
+    for campo in ('edades_meses', 'medidas'):
+        if isinstance(data.get(campo), str):
+            data[campo] = [valor.strip() for valor in data[campo].split(',') if valor.strip()]
+    return edades_desde_fechas(data)
+
+
+# Puntos del paciente superpuestos en las series: mismas columnas y reglas que el lote
+ESQUEMA_PUNTOS_SERIES = EsquemaLote(
+    columnas=[
+        Columna('medidas', float, minimo=0.1, maximo=300),
+        Columna('edades_meses', int, minimo=0, maximo=240),
+    ],
+    preprocesar=puntos_desde_texto,
+)
+
+
+def puntos_series(data):
+    """Edades y medidas validadas de los puntos del paciente, o None si la petición no trae puntos"""
+    if all(_vacio(data.get(campo)) for campo in ('edades_meses', 'medidas', 'fechas_nacimiento')):
+        return None
+    return ESQUEMA_PUNTOS_SERIES.validar(data)
+
+
+ESQUEMA_LOTE_PERCENTIL = EsquemaLote(
+    columnas=[
+        Columna('medidas', float, minimo=0.1, maximo=300),
+        Columna('edades_meses', int, minimo=0, maximo=240),
+        Columna('sexos', str, opciones=SEXOS, escalar='sexo'),
+    ],
+    escalares=[Campo('tipo_medida', str, opciones=TIPOS_CALCULO)],
+    preprocesar=edades_desde_fechas,
+)
+# Contra estándares compilados: admite también los tipos que solo tienen ellos
+ESQUEMA_LOTE_ESTANDARES = EsquemaLote(
+    columnas=ESQUEMA_LOTE_PERCENTIL.columnas,
+    escalares=[Campo('tipo_medida', str, opciones=TIPOS_MEDIDA)],
+    preprocesar=edades_desde_fechas,
+)
+ESQUEMA_EDAD_OSEA = Esquema(
+    Campo('edad_osea_meses', int, minimo=0, maximo=240),
+    Campo('edad_meses', int, minimo=0, maximo=240),
+    preprocesar=edad_desde_fechas,
+)
+ESQUEMA_PREDICCION_TALLA = Esquema(
+    Campo('talla', float, minimo=40, maximo=250),
+    Campo('edad_osea_meses', int, minimo=0, maximo=240),
+    Campo('edad_meses', int, minimo=0, maximo=240),
+    Campo('sexo', str, opciones=SEXOS),
+    Campo('talla_padre', float, minimo=100, maximo=250, requerido=False),
+    Campo('talla_madre', float, minimo=100, maximo=250, requerido=False),
+    preprocesar=edad_desde_fechas,
+)
+ESQUEMA_LOTE_PREDICCION_TALLA = EsquemaLote(
+    columnas=[
+        Columna('tallas', float, minimo=40, maximo=250),
+        Columna('edades_osea_meses', int, minimo=0, maximo=240),
+        Columna('edades_meses', int, minimo=0, maximo=240),
+        Columna('sexos', str, opciones=SEXOS, escalar='sexo'),
+    ],
+    preprocesar=edades_desde_fechas,
+)
+ESQUEMA_VISITA = Esquema(
+    Campo('fecha_medicion', str, normalizar=_fecha_valida),
+    Campo('edad_meses', int, minimo=0, maximo=240),
+    Campo('sexo', str, opciones=SEXOS),
+    preprocesar=edad_desde_fechas,
+)
+ESQUEMA_MEDIDAS_VISITA = Esquema(
+    *(Campo(tipo_medida, float, minimo=0.1, maximo=300, requerido=False) for tipo_medida in TIPOS_MEDIDA)
+)
+ESQUEMA_LOTE_VISITAS = EsquemaLote(
+    columnas=[
+        Columna('medidas', float, minimo=0.1, maximo=300),
+        Columna('pacientes', str),
+        Columna('fechas_medicion', str, escalar='fecha_medicion'),
+        Columna('edades_meses', int, minimo=0, maximo=240),
+        Columna('sexos', str, opciones=SEXOS, escalar='sexo'),
+    ],
+    escalares=[Campo('tipo_medida', str, opciones=TIPOS_MEDIDA)],
+    preprocesar=visitas_desde_fechas,
+)
@@ -10,14 +10,21 @@ import json
 import pandas as pd
 import re
 import time
+import argparse
+
+from http_archive import HttpArchive, MODOS
 
 class WebPediatricaScraper:
-    def __init__(self):
+    def __init__(self, archivo=None):
         self.base_url = "https://www.webpediatrica.com/endocrinoped/antropometria.php"
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         })
+        # Archivo HTTP opcional (http_archive.py): graba las respuestas o las sirve sin red
+        self.archivo = archivo
+        if archivo is not None:
+            archivo.montar(self.session)
         self.data = {}
 
     def get_main_page(self):
@@ -260,7 +267,14 @@ class WebPediatricaScraper:
             print(f"Error guardando datos: {e}")
 
 def main():
-    scraper = WebPediatricaScraper()
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--archivo', help='Directorio del archivo HTTP (http_archive.py)')
+    parser.add_argument('--modo', choices=MODOS, default='reproducir',
+                        help='grabar las respuestas de la red o reproducirlas sin red')
+    args = parser.parse_args()
+
+    archivo = HttpArchive(args.archivo, args.modo) if args.archivo else None
+    scraper = WebPediatricaScraper(archivo)
     data = scraper.scrape_all_data()
     scraper.save_data('webpediatrica_data.json')
     
@@ -269,6 +283,10 @@ def main():
     print(f"Cálculos disponibles: {len(data.get('calculos_disponibles', {}))}")
     for calculo, info in data.get('calculos_disponibles', {}).items():
         print(f"  - {calculo}: {info['descripcion']}")
+    if archivo is not None:
+        estadisticas = archivo.estadisticas()
+        print(f"Archivo HTTP ({estadisticas['modo']}): {estadisticas['grabadas']} grabadas, "
+              f"{estadisticas['aciertos']} servidas, {estadisticas['fallos']} sin archivar")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
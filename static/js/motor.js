@@ -0,0 +1,214 @@
+/*
+ * Motor de cálculo antropométrico en el navegador
+ *
+ * Replica los cálculos de AnthropometricCalculator (IMC, talla diana,
+ * percentil y velocidad de crecimiento) con el paquete binario que publica
+ * /api/paquete_cliente (ver client_bundle.py): referencias P3-P97 en float64 y
+ * rangos de validación de los esquemas del servidor. Cada función devuelve la
+ * misma respuesta que su ruta de la API, o null cuando no puede responder en
+ * local (paquete ausente u obsoleto, datos que no pasan la validación o tipo
+ * de medida sin referencias); entonces se recurre a la API.
+ */
+const MotorAntropometrico = (() => {
+    const MAGIA = 'ANTP';
+    const FORMATO_PAQUETE = 1;
+    // Cada cuánto se pregunta al servidor si el paquete sigue vigente
+    const VERIFICACION_MS = 5 * 60 * 1000;
+
+    let paquete = null;
+    let ultimaVerificacion = 0;
+    let verificando = null;
+
+    function leerPaquete(buffer) {
+        const vista = new DataView(buffer);
+        const magia = String.fromCharCode(...new Uint8Array(buffer, 0, 4));
+        const formato = vista.getUint16(4, true);
+        if (magia !== MAGIA || formato !== FORMATO_PAQUETE) {
+            throw new Error(`Paquete no reconocido (formato ${formato})`);
+        }
+        const longitud = vista.getUint32(8, true);
+        const cabecera = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 12, longitud)));
+        // Float64Array usa el orden de bytes de la plataforma: todas las habituales son little-endian
+        cabecera.referencias = new Float64Array(buffer, 12 + longitud);
+        return cabecera;
+    }
+
+    async function verificar() {
+        ultimaVerificacion = Date.now();
+        try {
+            const info = await (await fetch('/api/paquete_cliente/version', {cache: 'no-store'})).json();
+            if (!info.success) {
+                return;
+            }
+            if (paquete && paquete.version === info.version) {
+                return;
+            }
+            // Paquete obsoleto: no se usa mientras llega el nuevo
+            paquete = null;
+            const respuesta = await fetch(info.url);
+            if (respuesta.ok) {
+                const nuevo = leerPaquete(await respuesta.arrayBuffer());
+                if (nuevo.version === info.version) {
+                    paquete = nuevo;
+                }
+            }
+        } catch (error) {
+            // Sin conexión el service worker sirve la última versión conocida;
+            // si tampoco la hay, los cálculos siguen yendo a la API
+            console.warn('Paquete del cliente no disponible:', error);
+        } finally {
+            verificando = null;
+        }
+    }
+
+    function cargar() {
+        if (!verificando) {
+            verificando = verificar();
+        }
+        return verificando;
+    }
+
+    function disponible() {
+        if (Date.now() - ultimaVerificacion > VERIFICACION_MS) {
+            cargar();
+        }
+        return paquete !== null;
+    }
+
+    // round() de Python: toFixed() redondea el valor binario exacto igual que
+    // Python, salvo en los empates exactos (p. ej. 170.25), que Python lleva al par
+    function redondear(valor, decimales) {
+        const exacto = valor.toFixed(decimales + 31);
+        if (/50{30}$/.test(exacto)) {
+            const truncado = exacto.slice(0, exacto.length - 31);
+            if (Number(truncado.replace(/\D/g, '').slice(-1)) % 2 === 0) {
+                return Number(truncado);
+            }
+        }
+        return Number(valor.toFixed(decimales));
+    }
+
+    // Mismas reglas que Campo.compilar() en schemas.py; null si algún campo no las cumple
+    function validar(nombre, data) {
+        const reglas = paquete.validacion[nombre];
+        const valores = {};
+        for (const [campo, regla] of Object.entries(reglas)) {
+            let valor = data[campo];
+            if (regla.tipo === 'texto') {
+                if (typeof valor !== 'string' || !valor.trim()) {
+                    return null;
+                }
+                valor = valor.trim();
+                if (regla.minusculas) {
+                    valor = valor.toLowerCase();
+                }
+            } else if (typeof valor !== 'number' || !Number.isFinite(valor)
+                       || (regla.tipo === 'entero' && !Number.isInteger(valor))) {
+                return null;
+            }
+            if ((regla.minimo !== undefined && valor < regla.minimo)
+                || (regla.maximo !== undefined && valor > regla.maximo)
+                || (regla.opciones && !regla.opciones.includes(valor))) {
+                return null;
+            }
+            valores[campo] = valor;
+        }
+        return valores;
+    }
+
+    function clasificarIMC(imc) {
+        if (imc < 18.5) return {categoria: 'Bajo peso', color: 'blue'};
+        if (imc < 25) return {categoria: 'Peso normal', color: 'green'};
+        if (imc < 30) return {categoria: 'Sobrepeso', color: 'orange'};
+        return {categoria: 'Obesidad', color: 'red'};
+    }
+
+    function interpretarPercentil(percentil) {
+        if (percentil <= 3) return {interpretacion: 'Por debajo del rango normal', color: 'red'};
+        if (percentil <= 10) return {interpretacion: 'Límite inferior normal', color: 'orange'};
+        if (percentil <= 90) return {interpretacion: 'Rango normal', color: 'green'};
+        if (percentil <= 97) return {interpretacion: 'Límite superior normal', color: 'orange'};
+        return {interpretacion: 'Por encima del rango normal', color: 'red'};
+    }
+
+    function evaluarVelocidad(velocidad) {
+        if (velocidad < 4) return {evaluacion: 'Velocidad lenta', color: 'red'};
+        if (velocidad <= 7) return {evaluacion: 'Velocidad normal', color: 'green'};
+        return {evaluacion: 'Velocidad rápida', color: 'orange'};
+    }
+
+    function estimarPercentil(medida, edadMeses, sexo, tipoMedida) {
+        const tipo = paquete.tipos[tipoMedida];
+        if (edadMeses < tipo.edad_min || edadMeses > tipo.edad_max) {
+            return null;
+        }
+        const nPercentiles = paquete.percentiles.length;
+        const nEdades = tipo.edad_max - tipo.edad_min + 1;
+        const fila = tipo.offset
+            + (paquete.sexos.indexOf(sexo) * nEdades + edadMeses - tipo.edad_min) * nPercentiles;
+        // Primer percentil cuya referencia es >= medida, como el recorrido del servidor
+        for (let i = 0; i < nPercentiles; i++) {
+            if (medida <= paquete.referencias[fila + i]) {
+                return paquete.percentiles[i];
+            }
+        }
+        return paquete.percentiles[nPercentiles - 1];
+    }
+
+    function calcularIMC(data) {
+        const valores = disponible() && validar('imc', data);
+        if (!valores) return null;
+        const tallaM = valores.talla / 100;
+        const imc = redondear(valores.peso / (tallaM ** 2), 2);
+        return {success: true, imc: imc, clasificacion: imc ? clasificarIMC(imc) : null};
+    }
+
+    function calcularTallaDiana(data) {
+        const valores = disponible() && validar('talla_diana', data);
+        if (!valores) return null;
+        const suma = valores.talla_padre + valores.talla_madre;
+        const tallaDiana = (valores.sexo_hijo === 'masculino' ? suma + 13 : suma - 13) / 2;
+        return {
+            success: true,
+            resultado: {
+                talla_diana: redondear(tallaDiana, 1),
+                rango_inferior: redondear(tallaDiana - 8.5, 1),
+                rango_superior: redondear(tallaDiana + 8.5, 1)
+            }
+        };
+    }
+
+    function calcularPercentil(data) {
+        const valores = disponible() && validar('percentil', data);
+        if (!valores || !paquete.tipos[valores.tipo_medida]) return null;
+        const percentil = estimarPercentil(valores.medida, valores.edad_meses, valores.sexo, valores.tipo_medida);
+        return {
+            success: true,
+            percentil: percentil,
+            interpretacion: percentil ? interpretarPercentil(percentil) : null
+        };
+    }
+
+    function calcularVelocidad(data) {
+        const valores = disponible() && validar('velocidad', data);
+        if (!valores) return null;
+        const velocidad = redondear((valores.talla_actual - valores.talla_inicial) / valores.tiempo_meses * 12, 2);
+        return {
+            success: true,
+            'velocidad_cm_año': velocidad,
+            evaluacion: velocidad ? evaluarVelocidad(velocidad) : null
+        };
+    }
+
+    return {
+        cargar,
+        disponible,
+        calcularIMC,
+        calcularTallaDiana,
+        calcularPercentil,
+        calcularVelocidad,
+        get version() {
+            return paquete ? paquete.version : null;
+        }
+    };
+})();
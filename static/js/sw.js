@@ -0,0 +1,93 @@
+/*
+ * Service worker de la calculadora (servido en /sw.js para controlar toda la app)
+ *
+ * - Paquete del cliente con ?v=<versión>: inmutable, se sirve desde la caché y
+ *   al guardar uno nuevo se borran los anteriores.
+ * - Recursos de static/dist/ (nombre con hash del contenido): inmutables, se
+ *   sirven desde la caché.
+ * - Página principal, versión del paquete y recursos de static/ sin hash:
+ *   primero la red, y la caché sin conexión, de modo que la calculadora sigue
+ *   funcionando offline.
+ * - El resto (API de cálculo, CDN) pasa sin tocar.
+ */
+const CACHE = 'antropometria-v2';
+const RED_PRIMERO = ['/', '/api/paquete_cliente/version'];
+
+self.addEventListener('install', evento => {
+    evento.waitUntil(
+        caches.open(CACHE)
+            .then(cache => cache.addAll(RED_PRIMERO))
+            .then(() => self.skipWaiting())
+    );
+});
+
+self.addEventListener('activate', evento => {
+    evento.waitUntil(
+        caches.keys()
+            .then(nombres => Promise.all(nombres.filter(nombre => nombre !== CACHE).map(nombre => caches.delete(nombre))))
+            .then(() => self.clients.claim())
+    );
+});
+
+async function cachePrimero(peticion) {
+    const cache = await caches.open(CACHE);
+    const guardada = await cache.match(peticion);
+    if (guardada) {
+        return guardada;
+    }
+    const respuesta = await fetch(peticion);
+    if (respuesta.ok) {
+        await cache.put(peticion, respuesta.clone());
+    }
+    return respuesta;
+}
+
+async function paqueteVersionado(peticion) {
+    const cache = await caches.open(CACHE);
+    const guardada = await cache.match(peticion);
+    if (guardada) {
+        return guardada;
+    }
+    const respuesta = await fetch(peticion);
+    if (respuesta.ok) {
+        for (const clave of await cache.keys()) {
+            if (new URL(clave.url).pathname === '/api/paquete_cliente') {
+                await cache.delete(clave);
+            }
+        }
+        await cache.put(peticion, respuesta.clone());
+    }
+    return respuesta;
+}
+
+async function redPrimero(peticion) {
+    const cache = await caches.open(CACHE);
+    try {
+        const respuesta = await fetch(peticion);
+        if (respuesta.ok) {
+            await cache.put(peticion, respuesta.clone());
+        }
+        return respuesta;
+    } catch (error) {
+        const guardada = await cache.match(peticion, {ignoreSearch: true});
+        if (guardada) {
+            return guardada;
+        }
+        throw error;
+    }
+}
+
+self.addEventListener('fetch', evento => {
+    const peticion = evento.request;
+    const url = new URL(peticion.url);
+    if (peticion.method !== 'GET' || url.origin !== self.location.origin) {
+        return;
+    }
+    if (url.pathname === '/api/paquete_cliente' && url.searchParams.has('v')) {
+        evento.respondWith(paqueteVersionado(peticion));
+    } else if (url.pathname.startsWith('/static/dist/')) {
+        evento.respondWith(cachePrimero(peticion));
+    } else if (RED_PRIMERO.includes(url.pathname) || url.pathname.startsWith('/static/')) {
+        evento.respondWith(redPrimero(peticion));
+    }
+});
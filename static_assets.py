@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Recursos estáticos autoalojados, con hash en el nombre y precomprimidos
+
+Paso de build (`python static_assets.py`, también en los Dockerfile):
+
+1. Descarga a static/vendor/ las versiones fijadas de Bootstrap, Font Awesome
+   (con sus fuentes) y Chart.js que antes se pedían a los CDN, de modo que la
+   app funciona en redes sin salida a Internet. Cada descarga se comprueba con
+   el sha256 fijado en RECURSOS_EXTERNOS; con --estricto (los Dockerfile) un
+   recurso que no se descarga, no cuadra o no tiene hash fijado hace fallar el
+   build en lugar de quedarse en el CDN. `--fijar-hashes` imprime los sha256
+   de las versiones publicadas para copiarlos a la tabla.
+2. Copia cada fichero de static/ a static/dist/ con el hash de su contenido en
+   el nombre (`css/custom.css` -> `css/custom.<hash>.css`); las url() de las
+   hojas de estilo se reescriben a los nombres con hash.
+3. Junto a cada fichero comprimible deja sus variantes .gz y .br (si está
+   instalado Brotli) para que nginx las sirva tal cual.
+4. Escribe static/dist/manifest.json con la correspondencia.
+
+La app carga el manifiesto y `url_for('static', filename=...)` devuelve la ruta
+con hash, que se puede cachear un año como inmutable. Sin build, url_for
+devuelve la ruta original y los recursos de terceros que no se hayan
+descargado se siguen pidiendo al CDN.
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+import urllib.request
+
+from flask import url_for
+
+try:
+    import brotli
+except ImportError:  # Brotli es opcional: sin él solo se generan las variantes .gz
+    brotli = None
+
+DIRECTORIO_STATIC = 'static'
+DIRECTORIO_DIST = 'dist'
+MANIFIESTO_RECURSOS = 'manifest.json'
+FORMATO_MANIFIESTO = 'recursos-estaticos/1'
+LONGITUD_HASH = 10
+# Vigencia de los ficheros con hash cuando los sirve Flask (sin nginx delante)
+MAX_AGE_INMUTABLE = 365 * 24 * 3600
+
+# Ficheros de terceros que se vendorizan: ruta bajo static/ -> (URL de origen, sha256 esperado).
+# Un sha256 None está sin fijar: se rellena con la salida de `python static_assets.py --fijar-hashes`
+_FONT_AWESOME = 'https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0'
+RECURSOS_EXTERNOS = {
+    'vendor/bootstrap/bootstrap.min.css': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css', None),
+    'vendor/bootstrap/bootstrap.bundle.min.js': (
+        'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js', None),
+    'vendor/chartjs/chart.umd.js': (
+        'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.js', None),
+    'vendor/fontawesome/css/all.min.css': (f'{_FONT_AWESOME}/css/all.min.css', None),
+    'vendor/fontawesome/webfonts/fa-brands-400.woff2': (f'{_FONT_AWESOME}/webfonts/fa-brands-400.woff2', None),
+    'vendor/fontawesome/webfonts/fa-brands-400.ttf': (f'{_FONT_AWESOME}/webfonts/fa-brands-400.ttf', None),
+    'vendor/fontawesome/webfonts/fa-regular-400.woff2': (f'{_FONT_AWESOME}/webfonts/fa-regular-400.woff2', None),
+    'vendor/fontawesome/webfonts/fa-regular-400.ttf': (f'{_FONT_AWESOME}/webfonts/fa-regular-400.ttf', None),
+    'vendor/fontawesome/webfonts/fa-solid-900.woff2': (f'{_FONT_AWESOME}/webfonts/fa-solid-900.woff2', None),
+    'vendor/fontawesome/webfonts/fa-solid-900.ttf': (f'{_FONT_AWESOME}/webfonts/fa-solid-900.ttf', None),
+    'vendor/fontawesome/webfonts/fa-v4compatibility.woff2': (
+        f'{_FONT_AWESOME}/webfonts/fa-v4compatibility.woff2', None),
+    'vendor/fontawesome/webfonts/fa-v4compatibility.ttf': (
+        f'{_FONT_AWESOME}/webfonts/fa-v4compatibility.ttf', None),
+}
+
+# Extensiones que merece la pena precomprimir (woff2 y las imágenes ya lo están)
+EXTENSIONES_COMPRIMIBLES = {'.css', '.js', '.json', '.svg', '.ttf', '.txt', '.html'}
+MIN_BYTES_COMPRIMIR = 256
+
+_URL_CSS = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+_SOURCEMAP = re.compile(r'(/\*# sourceMappingURL=[^*]*\*/|//# sourceMappingURL=\S*)')
+
+
+def _sha256_fichero(ruta):
+    with open(ruta, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def descargar_externos(directorio=DIRECTORIO_STATIC, forzar=False):
+    """Descarga los recursos de terceros que falten; devuelve (descargados, fallidos).
+
+    Una descarga cuyo sha256 no es el fijado no se escribe y cuenta como
+    fallida; un fichero ya presente que no cuadra se vuelve a descargar.
+    """
+    descargados, fallidos = [], []
+    for ruta, (url, sha256) in RECURSOS_EXTERNOS.items():
+        destino = os.path.join(directorio, ruta)
+        if os.path.exists(destino) and not forzar and sha256 in (None, _sha256_fichero(destino)):
+            continue
+        try:
+            with urllib.request.urlopen(url, timeout=30) as respuesta:
+                contenido = respuesta.read()
+        except OSError as e:
+            print(f"No se pudo descargar {url}: {e}")
+            fallidos.append(ruta)
+            continue
+        obtenido = hashlib.sha256(contenido).hexdigest()
+        if sha256 is not None and obtenido != sha256:
+            print(f"sha256 de {url} no coincide: esperado {sha256}, obtenido {obtenido}")
+            fallidos.append(ruta)
+            continue
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporal = f'{destino}.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, destino)
+        descargados.append(ruta)
+    return descargados, fallidos
+
+
+def sin_hash_fijado():
+    """Recursos de terceros sin sha256 esperado en RECURSOS_EXTERNOS"""
+    return [ruta for ruta, (_, sha256) in RECURSOS_EXTERNOS.items() if sha256 is None]
+
+
+def fijar_hashes():
+    """Descarga las versiones publicadas e imprime sus sha256 para copiarlos a RECURSOS_EXTERNOS"""
+    for ruta, (url, _) in RECURSOS_EXTERNOS.items():
+        with urllib.request.urlopen(url, timeout=30) as respuesta:
+            print(f"{hashlib.sha256(respuesta.read()).hexdigest()}  {ruta}")
+
+
+def _con_hash(ruta, contenido):
+    base, extension = posixpath.splitext(ruta)
+    return f'{base}.{hashlib.sha256(contenido).hexdigest()[:LONGITUD_HASH]}{extension}'
+
+
+def _fuentes(directorio):
+    """Rutas relativas (con /) de los ficheros de static/, sin la salida del build"""
+    for raiz, subdirectorios, ficheros in os.walk(directorio):
+        if os.path.samefile(raiz, directorio):
+            subdirectorios[:] = [d for d in subdirectorios if d != DIRECTORIO_DIST]
+        subdirectorios.sort()
+        for fichero in sorted(ficheros):
+            if not fichero.startswith('.') and not fichero.endswith('.tmp'):
+                yield os.path.relpath(os.path.join(raiz, fichero), directorio).replace(os.sep, '/')
+
+
+def _reescribir_css(ruta, texto, recursos):
+    """Apunta las url() relativas de una hoja de estilo a los ficheros con hash"""
+    directorio = posixpath.dirname(ruta)
+
+    def sustituir(coincidencia):
+        comillas, url = coincidencia.groups()
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return coincidencia.group(0)
+        corte = min((i for i in (url.find('?'), url.find('#')) if i >= 0), default=len(url))
+        camino, resto = url[:corte], url[corte:]
+        objetivo = posixpath.normpath(posixpath.join(directorio, camino))
+        if objetivo not in recursos:
+            return coincidencia.group(0)
+        # El hash ya identifica la versión: sobra la query (?v=...), el fragmento se conserva
+        fragmento = resto[resto.find('#'):] if '#' in resto else ''
+        return f'url({comillas}{posixpath.relpath(recursos[objetivo], directorio)}{fragmento}{comillas})'
+
+    return _URL_CSS.sub(sustituir, texto)
+
+
+def _escribir(destino, contenido):
+    """Escribe un fichero del build y las variantes comprimidas que le falten"""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    variantes = {'': lambda: contenido}
+    if os.path.splitext(destino)[1] in EXTENSIONES_COMPRIMIBLES and len(contenido) >= MIN_BYTES_COMPRIMIR:
+        variantes['.gz'] = lambda: gzip.compress(contenido, compresslevel=9, mtime=0)
+        if brotli is not None:
+            variantes['.br'] = lambda: brotli.compress(contenido, quality=11)
+    for sufijo, comprimir in variantes.items():
+        # Los nombres llevan el hash del contenido: lo que ya existe no ha cambiado
+        if os.path.exists(destino + sufijo):
+            continue
+        datos = comprimir()
+        if sufijo and len(datos) >= len(contenido):
+            continue
+        temporal = f'{destino}{sufijo}.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, destino + sufijo)
+
+
+def construir(directorio=DIRECTORIO_STATIC):
+    """Genera static/dist/ y su manifiesto; devuelve {ruta original: ruta con hash}.
+
+    Los ficheros se nombran por contenido, así que los de builds anteriores se
+    pueden quedar (las páginas aún abiertas los siguen encontrando) y repetir
+    el build solo escribe lo que ha cambiado.
+    """
+    dist = os.path.join(directorio, DIRECTORIO_DIST)
+    recursos = {}
+    # Primero lo que no es CSS: las hojas de estilo necesitan el nombre final de sus fuentes
+    for ruta in sorted(_fuentes(directorio), key=lambda ruta: ruta.endswith('.css')):
+        with open(os.path.join(directorio, ruta), 'rb') as f:
+            contenido = f.read()
+        if ruta.endswith(('.css', '.js')):
+            texto = _SOURCEMAP.sub('', contenido.decode('utf-8'))
+            if ruta.endswith('.css'):
+                texto = _reescribir_css(ruta, texto, recursos)
+            contenido = texto.encode('utf-8')
+        recursos[ruta] = _con_hash(ruta, contenido)
+        _escribir(os.path.join(dist, recursos[ruta]), contenido)
+
+    manifiesto = {'formato': FORMATO_MANIFIESTO, 'recursos': recursos}
+    ruta_manifiesto = os.path.join(dist, MANIFIESTO_RECURSOS)
+    os.makedirs(dist, exist_ok=True)
+    with open(f'{ruta_manifiesto}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(f'{ruta_manifiesto}.tmp', ruta_manifiesto)
+    return recursos
+
+
+class StaticAssets:
+    """Manifiesto de recursos con hash aplicado a `url_for('static', ...)`"""
+
+    def __init__(self, directorio=DIRECTORIO_STATIC):
+        self.directorio = directorio
+        self.recursos = {}
+        ruta = os.path.join(directorio, DIRECTORIO_DIST, MANIFIESTO_RECURSOS)
+        if os.path.exists(ruta):
+            with open(ruta, 'r', encoding='utf-8') as f:
+                manifiesto = json.load(f)
+            if manifiesto.get('formato') == FORMATO_MANIFIESTO:
+                self.recursos = manifiesto['recursos']
+
+    def registrar(self, app):
+        """Engancha el manifiesto a url_for y la vigencia larga a los ficheros con hash"""
+        app.url_defaults(self._url_defaults)
+        app.jinja_env.globals['recurso'] = self.url
+
+        max_age_por_defecto = app.get_send_file_max_age
+
+        def max_age(filename):
+            if filename and filename.startswith(DIRECTORIO_DIST + '/'):
+                return MAX_AGE_INMUTABLE
+            return max_age_por_defecto(filename)
+        app.get_send_file_max_age = max_age
+
+    def _url_defaults(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.recursos:
+            values['filename'] = f"{DIRECTORIO_DIST}/{self.recursos[values['filename']]}"
+
+    def url(self, ruta):
+        """URL de un recurso de static/; los de terceros sin descargar siguen yendo al CDN"""
+        if (ruta not in self.recursos and ruta in RECURSOS_EXTERNOS
+                and not os.path.exists(os.path.join(self.directorio, ruta))):
+            return RECURSOS_EXTERNOS[ruta][0]
+        return url_for('static', filename=ruta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--static', default=DIRECTORIO_STATIC, help='Directorio de recursos estáticos')
+    parser.add_argument('--sin-descarga', action='store_true', help='No descarga los recursos de terceros')
+    parser.add_argument('--forzar-descarga', action='store_true', help='Vuelve a descargar aunque existan')
+    parser.add_argument('--estricto', action='store_true',
+                        help='Falla si un recurso de terceros no se descarga, no cuadra o no tiene sha256 fijado')
+    parser.add_argument('--fijar-hashes', action='store_true',
+                        help='Imprime el sha256 de cada recurso de terceros y termina')
+    args = parser.parse_args()
+
+    if args.fijar_hashes:
+        fijar_hashes()
+        return
+
+    if not args.sin_descarga:
+        if args.estricto and sin_hash_fijado():
+            sys.exit(f"Recursos de terceros sin sha256 fijado: {', '.join(sin_hash_fijado())}")
+        descargados, fallidos = descargar_externos(args.static, args.forzar_descarga)
+        print(f"Recursos de terceros descargados: {len(descargados)}")
+        if fallidos:
+            if args.estricto:
+                sys.exit(f"Recursos de terceros sin descargar o con sha256 distinto: {', '.join(fallidos)}")
+            print(f"Sin descargar (se seguirán pidiendo al CDN): {', '.join(fallidos)}")
+
+    recursos = construir(args.static)
+    print(f"Recursos con hash: {len(recursos)} (Brotli {'sí' if brotli is not None else 'no'}) "
+          f"en {os.path.join(args.static, DIRECTORIO_DIST)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Tablas de percentiles como artefactos direccionados por contenido
+
+DataFusion guarda cada tabla de `tablas_percentiles` en su propio fichero
+`artefactos/<hash>.json` (el nombre es el hash de su contenido) y un manifiesto
+pequeño las enlaza. Cambiar una tabla solo regenera y redistribuye su
+artefacto, y la app carga cada tabla la primera vez que se usa.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+MANIFIESTO = 'fused_manifest.json'
+FORMATO_MANIFIESTO = 'manifiesto-tablas/1'
+
+
+class ArtefactoCorrupto(Exception):
+    """El contenido de un artefacto no coincide con el hash del manifiesto"""
+
+
+def hash_contenido(contenido):
+    return hashlib.sha256(contenido).hexdigest()
+
+
+def version_datos(metadatos):
+    """Versión corta de unos datos de referencia a partir de sus metadatos.
+
+    La fecha de creación se deja fuera: repetir la fusión con las mismas
+    tablas (misma `huella_tablas`) no cambia la versión.
+    """
+    estables = {clave: valor for clave, valor in metadatos.items() if clave != 'fecha_creacion'}
+    return hashlib.sha1(json.dumps(estables, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+
+def serializar_tabla(tabla):
+    """Serialización compacta de una tabla (la que se hashea y se guarda).
+
+    Se conserva el orden de inserción: la generación es determinista y así la
+    tabla leída del artefacto se vuelve a serializar igual.
+    """
+    return json.dumps(tabla, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class TablasPerezosas(Mapping):
+    """`tablas_percentiles` que lee cada artefacto la primera vez que se pide.
+
+    Los metadatos de cada tabla viajan en el manifiesto, así que buscar una
+    tabla por tipo de medida no obliga a cargarlas todas.
+    """
+
+    def __init__(self, entradas, directorio_base):
+        self.entradas = entradas
+        self.directorio_base = directorio_base
+        self._cargadas = {}
+        self._lock = threading.Lock()
+
+    def metadatos(self, nombre):
+        return self.entradas[nombre].get('metadatos', {})
+
+    def cargadas(self):
+        """Nombres de las tablas ya leídas de disco"""
+        return list(self._cargadas)
+
+    def contenido(self, nombre):
+        """Bytes del artefacto de una tabla, verificados contra el manifiesto"""
+        entrada = self.entradas[nombre]
+        with open(os.path.join(self.directorio_base, entrada['artefacto']), 'rb') as f:
+            contenido = f.read()
+        if hash_contenido(contenido) != entrada['sha256']:
+            raise ArtefactoCorrupto(f"El artefacto de {nombre} no coincide con el manifiesto")
+        return contenido
+
+    def leer(self, nombre):
+        """Tabla leída de disco sin quedarse en memoria (para recorridos de una pasada)"""
+        tabla = self._cargadas.get(nombre)
+        return tabla if tabla is not None else json.loads(self.contenido(nombre))
+
+    def __getitem__(self, nombre):
+        tabla = self._cargadas.get(nombre)
+        if tabla is not None:
+            return tabla
+        tabla = json.loads(self.contenido(nombre))
+        with self._lock:
+            return self._cargadas.setdefault(nombre, tabla)
+
+    def __iter__(self):
+        return iter(self.entradas)
+
+    def __len__(self):
+        return len(self.entradas)
+
+
+def metadatos_tabla(tablas, nombre):
+    """Metadatos de una tabla sin cargarla si `tablas` es perezosa"""
+    if isinstance(tablas, TablasPerezosas):
+        return tablas.metadatos(nombre)
+    return tablas[nombre].get('metadatos', {})
+
+
+def cargar_manifiesto(ruta=MANIFIESTO):
+    """Datos fusionados a partir del manifiesto, con las tablas cargadas bajo demanda"""
+    with open(ruta, 'r', encoding='utf-8') as f:
+        manifiesto = json.load(f)
+    if manifiesto.get('formato') != FORMATO_MANIFIESTO:
+        raise ValueError(f"Formato de manifiesto no soportado: {manifiesto.get('formato')}")
+    data = {clave: valor for clave, valor in manifiesto.items() if clave != 'formato'}
+    data['tablas_percentiles'] = TablasPerezosas(
+        manifiesto.get('tablas_percentiles', {}), os.path.dirname(os.path.abspath(ruta)))
+    return data
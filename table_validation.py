@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Validación vectorizada de las tablas de percentiles y diferencias con el build anterior
+
+Cada tabla se convierte en un array (sexo, edad, percentil) y se comprueba en
+una pasada de NumPy:
+
+- Forma: una fila por mes del rango esperado y ningún valor vacío o no finito.
+- Monotonía: P3 < P10 < ... < P97 en cada sexo y edad.
+- Continuidad: un salto entre dos meses consecutivos que se aparta de la
+  pendiente de los meses vecinos (p. ej. el cambio de fórmula a los 24 meses).
+- Diferencias: variación relativa de cada celda frente a la misma tabla del
+  build anterior.
+
+Los arrays compilados de los estándares de referencia pasan las mismas
+comprobaciones de forma, valores y monotonía (`validar_estandar`).
+
+DataFusion usa el informe como puerta antes de publicar el manifiesto, los
+artefactos y los estándares.
+"""
+
+import time
+
+import numpy as np
+
+CLAVES_PERCENTIL = ('P3', 'P10', 'P25', 'P50', 'P75', 'P90', 'P97')
+SEXOS = ('masculino', 'femenino')
+
+# Salto relativo (frente a la pendiente de los meses vecinos) que se marca como discontinuidad
+UMBRAL_DISCONTINUIDAD = 0.02
+# Variación relativa máxima de una celda frente al build anterior
+TOLERANCIA_DELTA = 0.05
+# Celdas que se detallan por comprobación (el total se cuenta siempre)
+MAX_CELDAS = 20
+
+
+def _leer(tablas, nombre):
+    # Las TablasPerezosas se recorren sin quedarse en memoria
+    return tablas.leer(nombre) if hasattr(tablas, 'leer') else tablas[nombre]
+
+
+def tabla_a_array(tabla):
+    """(edades int64, valores float64 (2, n_edades, 7)) de una tabla de percentiles"""
+    datos = tabla['datos']
+    edades = np.array(sorted({int(edad) for sexo in SEXOS for edad in datos.get(sexo, {})}), dtype=np.int64)
+    valores = np.full((len(SEXOS), len(edades), len(CLAVES_PERCENTIL)), np.nan)
+    for s, sexo in enumerate(SEXOS):
+        filas = {int(edad): fila for edad, fila in datos.get(sexo, {}).items()}
+        for i, edad in enumerate(edades):
+            fila = filas.get(int(edad))
+            if fila is not None:
+                valores[s, i] = [fila.get(clave, np.nan) for clave in CLAVES_PERCENTIL]
+    return edades, valores
+
+
+def celdas_no_monotonas(edades, valores):
+    """Total y detalle de los pares de percentiles consecutivos que no crecen"""
+    mascara = ~(np.diff(valores, axis=2) > 0)
+    sexo, fila, p = np.nonzero(mascara)
+    detalle = [
+        {'sexo': SEXOS[s], 'edad_meses': int(edades[i]),
+         'percentiles': [CLAVES_PERCENTIL[j], CLAVES_PERCENTIL[j + 1]],
+         'valores': [float(valores[s, i, j]), float(valores[s, i, j + 1])]}
+        for s, i, j in zip(sexo[:MAX_CELDAS], fila[:MAX_CELDAS], p[:MAX_CELDAS])
+    ]
+    return int(mascara.sum()), detalle
+
+
+def forma_y_valores(edades, valores, rango=None):
+    """Edades que faltan o sobran respecto a `rango` (edad_min, edad_max) y total de valores no finitos"""
+    resultado = {'total_no_finitos': int((~np.isfinite(valores)).sum())}
+    if rango is not None:
+        esperadas = np.arange(rango[0], rango[1] + 1)
+        resultado['edades_faltantes'] = int(len(np.setdiff1d(esperadas, edades)))
+        resultado['edades_sobrantes'] = int(len(np.setdiff1d(edades, esperadas)))
+    return resultado
+
+
+def _forma_valida(forma):
+    return forma['total_no_finitos'] == 0 and not forma.get('edades_faltantes') and not forma.get('edades_sobrantes')
+
+
+def discontinuidades(edades, valores, umbral=UMBRAL_DISCONTINUIDAD):
+    """Saltos entre meses consecutivos: [{sexo, edad_desde, edad_hasta, salto_relativo}].
+
+    Cada paso se compara con la mediana de los dos pasos anteriores y los dos
+    siguientes, de modo que un salto aislado no contamina a sus vecinos.
+    """
+    if valores.shape[1] < 5:
+        return []
+    pasos = np.diff(valores, axis=1)
+    vecinos = np.median(np.stack([pasos[:, :-4], pasos[:, 1:-3], pasos[:, 3:-1], pasos[:, 4:]]), axis=0)
+    salto = np.abs(pasos[:, 2:-2] - vecinos) / np.abs(valores[:, 2:-3])
+    maximo = np.nanmax(salto, axis=2)
+    sexo, k = np.nonzero(maximo > umbral)
+    return [
+        {'sexo': SEXOS[s], 'edad_desde': int(edades[i + 2]), 'edad_hasta': int(edades[i + 3]),
+         'salto_relativo': round(float(maximo[s, i]), 4)}
+        for s, i in zip(sexo, k)
+    ]
+
+
+def diferencias(edades, valores, edades_prev, valores_prev, tolerancia=TOLERANCIA_DELTA):
+    """Variación relativa de cada celda frente al build anterior (en las edades comunes)"""
+    comunes, i_nuevo, i_prev = np.intersect1d(edades, edades_prev, return_indices=True)
+    nuevo, previo = valores[:, i_nuevo], valores_prev[:, i_prev]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        delta = np.abs(nuevo - previo) / np.abs(previo)
+    fuera = delta > tolerancia
+    sexo, fila, p = np.nonzero(fuera)
+    return {
+        'delta_max': round(float(np.nanmax(delta)), 4) if delta.size else 0.0,
+        'celdas_cambiadas': int((nuevo != previo).sum()),
+        'total_fuera_tolerancia': int(fuera.sum()),
+        'fuera_tolerancia': [
+            {'sexo': SEXOS[s], 'edad_meses': int(comunes[i]), 'percentil': CLAVES_PERCENTIL[j],
+             'anterior': float(previo[s, i, j]), 'nuevo': float(nuevo[s, i, j])}
+            for s, i, j in zip(sexo[:MAX_CELDAS], fila[:MAX_CELDAS], p[:MAX_CELDAS])
+        ],
+        'edades_nuevas': int(len(np.setdiff1d(edades, edades_prev))),
+        'edades_eliminadas': int(len(np.setdiff1d(edades_prev, edades)))
+    }
+
+
+def validar_tablas(tablas, anteriores=None, conocidas=None, rangos=None,
+                   umbral=UMBRAL_DISCONTINUIDAD, tolerancia=TOLERANCIA_DELTA):
+    """Valida `tablas` y las compara con `anteriores` (mismo formato, opcional).
+
+    `conocidas` asigna a cada tabla las `edad_desde` de discontinuidades
+    aceptadas (cambios de fórmula documentados); se informan pero no invalidan.
+    `rangos` asigna a cada tabla su (edad_min, edad_max) esperado. Una tabla es
+    válida con todas sus edades y valores finitos, sin celdas no monótonas, sin
+    discontinuidades nuevas y sin celdas que varíen más que `tolerancia`
+    respecto al build anterior.
+    """
+    inicio = time.perf_counter()
+    anteriores = anteriores or {}
+    conocidas = conocidas or {}
+    rangos = rangos or {}
+    informe = {'valida': True, 'tablas': {}}
+
+    for nombre in tablas:
+        edades, valores = tabla_a_array(_leer(tablas, nombre))
+        forma = forma_y_valores(edades, valores, rangos.get(nombre))
+        total_no_monotonas, no_monotonas = celdas_no_monotonas(edades, valores)
+        saltos = discontinuidades(edades, valores, umbral)
+        aceptadas = set(conocidas.get(nombre, ()))
+
+        cambios = None
+        if nombre in anteriores:
+            try:
+                cambios = diferencias(edades, valores, *tabla_a_array(_leer(anteriores, nombre)), tolerancia)
+            except Exception:
+                # Sin artefacto anterior legible no hay diferencias que calcular
+                cambios = None
+
+        resultado = {
+            **forma,
+            'total_no_monotonas': total_no_monotonas,
+            'no_monotonas': no_monotonas,
+            'discontinuidades': [salto for salto in saltos if salto['edad_desde'] not in aceptadas],
+            'discontinuidades_conocidas': [salto for salto in saltos if salto['edad_desde'] in aceptadas],
+            'cambios': cambios
+        }
+        resultado['valida'] = (
+            _forma_valida(forma) and total_no_monotonas == 0 and not resultado['discontinuidades']
+            and (cambios is None or cambios['total_fuera_tolerancia'] == 0)
+        )
+        informe['tablas'][nombre] = resultado
+        informe['valida'] = informe['valida'] and resultado['valida']
+
+    informe['milisegundos'] = round((time.perf_counter() - inicio) * 1000, 2)
+    return informe
+
+
+def validar_estandar(valores, edad_min, edad_max):
+    """Valida el array compilado (sexo, edad, percentil) de un estándar para una medida"""
+    esperada = (len(SEXOS), edad_max - edad_min + 1, len(CLAVES_PERCENTIL))
+    resultado = {'forma': list(valores.shape), 'forma_esperada': list(esperada)}
+    if valores.shape != esperada:
+        resultado['valida'] = False
+        return resultado
+    valores = np.asarray(valores, dtype=np.float64)
+    forma = forma_y_valores(None, valores)
+    total_no_monotonas, no_monotonas = celdas_no_monotonas(np.arange(edad_min, edad_max + 1), valores)
+    resultado.update(forma, total_no_monotonas=total_no_monotonas, no_monotonas=no_monotonas)
+    resultado['valida'] = _forma_valida(forma) and total_no_monotonas == 0
+    return resultado
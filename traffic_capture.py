@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Captura de las peticiones /api/* para reproducirlas en local
+
+Opcional (`ANTROPOMETRIA_CAPTURA` apunta al fichero JSON lines). Cada petición
+muestreada se guarda con su instante, método, ruta con query string, tipo de
+contenido, cuerpo, status y duración; benchmarks/replay_traffic.py la
+reproduce contra una instancia local. A diferencia del log de nginx, la
+captura incluye los cuerpos de los POST, así que contiene datos clínicos: solo
+se debe activar en entornos controlados y el fichero se trata como tal.
+
+Como en async_logging, los registros pasan por una cola acotada que vacía un
+hilo en segundo plano; si el disco se atasca se descartan y se cuentan en
+lugar de bloquear la petición.
+"""
+
+import base64
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from flask import g, request
+
+from warmup import es_peticion_calentamiento
+
+# Cuerpos mayores no se guardan (la petición se registra sin cuerpo)
+MAX_BYTES_CUERPO = int(os.environ.get('ANTROPOMETRIA_CAPTURA_MAX_BYTES', 1024 * 1024))
+CAPACIDAD_COLA = 10000
+
+
+class TrafficCapture:
+    """Registro muestreado de las peticiones a `prefijo` en un fichero JSON lines"""
+
+    def __init__(self, ruta, muestreo=1.0, prefijo='/api/'):
+        self.ruta = ruta
+        self.muestreo = muestreo
+        self.prefijo = prefijo
+        self.capturadas = 0
+        self.descartadas = 0
+        self._cola = queue.Queue(maxsize=CAPACIDAD_COLA)
+        self._pid_escritor = None
+        self._lock = threading.Lock()
+        directorio = os.path.dirname(os.path.abspath(ruta))
+        os.makedirs(directorio, exist_ok=True)
+
+    def registrar(self, app):
+        app.before_request(self._inicio)
+        app.after_request(self._fin)
+
+    def _inicio(self):
+        if (request.path.startswith(self.prefijo) and not es_peticion_calentamiento(request.environ)
+                and random.random() < self.muestreo):
+            g.captura_inicio = (time.time(), time.perf_counter())
+
+    def _fin(self, respuesta):
+        inicio = g.pop('captura_inicio', None)
+        if inicio is None:
+            return respuesta
+        registro = {
+            'ts': inicio[0],
+            'metodo': request.method,
+            'ruta': request.full_path.rstrip('?'),
+            'status': respuesta.status_code,
+            'ms': round((time.perf_counter() - inicio[1]) * 1000, 3),
+        }
+        if request.method != 'GET':
+            cuerpo = request.get_data(cache=True)
+            registro['tipo'] = request.content_type
+            registro['accept'] = request.headers.get('Accept')
+            if len(cuerpo) > MAX_BYTES_CUERPO:
+                registro['cuerpo_omitido'] = len(cuerpo)
+            elif request.mimetype == 'application/json':
+                registro['cuerpo'] = cuerpo.decode('utf-8', errors='replace')
+            else:
+                registro['cuerpo_b64'] = base64.b64encode(cuerpo).decode('ascii')
+        self._encolar(registro)
+        return respuesta
+
+    def _encolar(self, registro):
+        # El hilo escritor se arranca en cada proceso (no sobrevive al fork de gunicorn)
+        if self._pid_escritor != os.getpid():
+            with self._lock:
+                if self._pid_escritor != os.getpid():
+                    self._cola = queue.Queue(maxsize=CAPACIDAD_COLA)
+                    threading.Thread(target=self._escribir, args=(self._cola,), daemon=True,
+                                     name='captura-trafico').start()
+                    self._pid_escritor = os.getpid()
+        try:
+            self._cola.put_nowait(registro)
+            self.capturadas += 1
+        except queue.Full:
+            self.descartadas += 1
+
+    def _escribir(self, cola):
+        # O_APPEND: las líneas de varios workers no se pisan
+        descriptor = os.open(self.ruta, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        while True:
+            registros = [cola.get()]
+            while len(registros) < 256:
+                try:
+                    registros.append(cola.get_nowait())
+                except queue.Empty:
+                    break
+            os.write(descriptor, ''.join(
+                json.dumps(registro, ensure_ascii=False) + '\n' for registro in registros).encode('utf-8'))
+
+    def estadisticas(self):
+        return {'fichero': self.ruta, 'muestreo': self.muestreo,
+                'capturadas': self.capturadas, 'descartadas': self.descartadas}
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Calentamiento del proceso antes de aceptar tráfico y estado para /ready
+
+Un worker de gunicorn no acepta conexiones hasta que termina de importar la
+app, así que el calentamiento se ejecuta al final de la importación:
+
+- lee todas las tablas perezosas del manifiesto de artefactos;
+- compila las plantillas de Jinja y renderiza la página principal;
+- lanza dentro del proceso (test_client, sin red) un juego de peticiones
+  representativas que recorren las rutas de cálculo (también un lote en
+  MessagePack con columnas tipadas), construyen el paquete del cliente y
+  llenan la caché de respuestas. Todas deben responder con éxito: un error
+  en cualquiera de ellas deja el proceso sin pasar /ready;
+- si hay una captura de tráfico (traffic_capture.py), repite además las
+  peticiones más frecuentes a rutas `cacheable`, que son las entradas más
+  calientes de la caché.
+
+Con `gunicorn --preload` se calienta una sola vez en el proceso maestro y los
+workers que se reciclan con `--max-requests` nacen ya calientes por el fork.
+
+`/live` solo comprueba que el proceso responde; `/ready` informa de la
+versión de datos y del calentamiento, y responde 503 mientras no ha terminado
+o si alguno de sus pasos falló.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from codec import MIME_JSON, MIME_MSGPACK, codificar, msgpack
+from response_cache import respuesta_fallida
+
+# Marca en el entorno WSGI de las peticiones internas del calentamiento
+# (traffic_capture.py no las registra)
+CLAVE_ENTORNO = 'antropometria.calentamiento'
+MAX_PETICIONES_CAPTURA = int(os.environ.get('ANTROPOMETRIA_CALENTAMIENTO_PETICIONES', 200))
+# De una captura grande solo se leen los últimos bytes (el tráfico más reciente)
+MAX_BYTES_CAPTURA = 16 * 1024 * 1024
+
+PENDIENTE = 'pendiente'
+CALENTANDO = 'calentando'
+LISTO = 'listo'
+FALLIDO = 'fallido'
+DESACTIVADO = 'desactivado'
+
+
+def es_peticion_calentamiento(entorno):
+    return bool(entorno.get(CLAVE_ENTORNO))
+
+
+def peticiones_representativas(tipos_medida, sexos=('masculino', 'femenino')):
+    """Peticiones (metodo, ruta, json) que recorren la página, el paquete y las rutas de cálculo.
+
+    `tipos_medida` son los que tienen referencias a los 24 meses (los demás
+    responden con error y no calientan nada).
+    """
+    peticiones = [
+        ('GET', '/', None),
+        ('GET', '/api/paquete_cliente/version', None),
+        ('GET', '/api/paquete_cliente', None),
+        ('GET', '/api/estandares', None),
+        ('POST', '/api/calcular_imc', {'peso': 20, 'talla': 110}),
+        ('POST', '/api/calcular_talla_diana', {'talla_padre': 175, 'talla_madre': 162, 'sexo_hijo': sexos[0]}),
+        ('POST', '/api/calcular_velocidad_crecimiento',
+         {'talla_inicial': 100, 'talla_actual': 106, 'tiempo_meses': 12}),
+    ]
+    medidas = {'peso': 12.0, 'talla': 86.0, 'imc': 16.0, 'perimetro_cefalico': 48.0}
+    for tipo in tipos_medida:
+        for sexo in sexos:
+            peticiones.append(('POST', '/api/calcular_percentil',
+                               {'medida': medidas.get(tipo, 10.0), 'edad_meses': 24, 'sexo': sexo, 'tipo_medida': tipo}))
+            peticiones.append(('POST', '/api/series_crecimiento', {'tipo_medida': tipo, 'sexo': sexo}))
+        # Ruta vectorizada del lote (sin caché: solo calienta el código)
+        peticiones.append(('POST', '/api/calcular_percentil_lote',
+                           {'tipo_medida': tipo, 'medidas': [medidas.get(tipo, 10.0)] * 8,
+                            'edades_meses': list(range(12, 20)), 'sexos': list(sexos) * 4}))
+    if msgpack is not None and tipos_medida:
+        # Las columnas de MessagePack llegan como arrays NumPy, no como listas
+        cuerpo = codificar({'tipo_medida': tipos_medida[0], 'sexo': sexos[0],
+                            'medidas': np.full(8, medidas.get(tipos_medida[0], 10.0)),
+                            'edades_meses': np.arange(12, 20, dtype=np.int16)})
+        peticiones.append(('POST', '/api/calcular_percentil_lote', cuerpo, MIME_MSGPACK, MIME_MSGPACK))
+    return peticiones
+
+
+def peticiones_frecuentes(ruta_captura, es_cacheable, limite=MAX_PETICIONES_CAPTURA):
+    """Las `limite` peticiones más repetidas de una captura, solo de rutas cacheables.
+
+    Devuelve una lista de (metodo, ruta, cuerpo, tipo, accept). Las rutas se
+    filtran con `es_cacheable(metodo, ruta)` para no repetir nunca peticiones
+    con efectos (visitas, trabajos).
+    """
+    if not ruta_captura or not os.path.exists(ruta_captura):
+        return []
+    with open(ruta_captura, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        inicio = max(0, f.tell() - MAX_BYTES_CAPTURA)
+        f.seek(inicio)
+        if inicio:
+            f.readline()  # Primera línea probablemente cortada
+        lineas = f.read().decode('utf-8', errors='replace').splitlines()
+    contador = Counter()
+    for linea in lineas:
+        try:
+            registro = json.loads(linea)
+        except ValueError:
+            continue
+        if registro.get('status') != 200 or 'cuerpo_b64' in registro or 'cuerpo_omitido' in registro:
+            continue
+        clave = (registro['metodo'], registro['ruta'], registro.get('cuerpo', ''),
+                 registro.get('tipo'), registro.get('accept'))
+        if es_cacheable(clave[0], clave[1].split('?')[0]):
+            contador[clave] += 1
+    return [clave for clave, _ in contador.most_common(limite)]
+
+
+class WarmUp:
+    """Pasos de calentamiento de un proceso y su estado"""
+
+    def __init__(self, app, version_datos):
+        self.app = app
+        self.version_datos = version_datos
+        self.estado = PENDIENTE
+        self.pid = os.getpid()
+        self.duracion_s = None
+        self.pasos = []
+        self.resultados = {}
+        self._lock = threading.Lock()
+
+    def paso(self, nombre, funcion):
+        """Añade un paso; `funcion()` puede devolver un resumen (p. ej. un recuento)"""
+        self.pasos.append((nombre, funcion))
+
+    def peticiones(self, nombre, peticiones, exigir_exito=False):
+        """Añade un paso que lanza peticiones internas con test_client.
+
+        `peticiones` es una lista, o un callable que la devuelve al calentar,
+        de (metodo, ruta, json) o (metodo, ruta, cuerpo, tipo, accept) como
+        las de una captura. El paso falla si alguna responde 5xx y, con
+        `exigir_exito`, también si responde 4xx o `success: False`.
+        """
+        def lanzar():
+            cliente = self.app.test_client()
+            entorno = {CLAVE_ENTORNO: True}
+            errores = []
+            lista = peticiones() if callable(peticiones) else peticiones
+            for peticion in lista:
+                if len(peticion) == 3:
+                    metodo, ruta, datos = peticion
+                    respuesta = cliente.open(ruta, method=metodo, json=datos, environ_base=entorno)
+                else:
+                    metodo, ruta, cuerpo, tipo, accept = peticion
+                    cabeceras = {'Accept': accept} if accept else {}
+                    respuesta = cliente.open(ruta, method=metodo, data=cuerpo or None, content_type=tipo,
+                                             headers=cabeceras, environ_base=entorno)
+                if respuesta.status_code >= 500 or (exigir_exito and (
+                        respuesta.status_code >= 400 or (respuesta.mimetype in (MIME_JSON, MIME_MSGPACK)
+                                                         and respuesta_fallida(respuesta)))):
+                    errores.append(f'{metodo} {ruta}: {respuesta.status_code}')
+                respuesta.close()
+            if errores:
+                raise RuntimeError('; '.join(errores[:5]))
+            return {'peticiones': len(lista)}
+        self.paso(nombre, lanzar)
+
+    def calentar(self):
+        """Ejecuta todos los pasos; un paso que falla no impide los siguientes"""
+        with self._lock:
+            if os.environ.get('ANTROPOMETRIA_CALENTAMIENTO', '1') == '0':
+                self.estado = DESACTIVADO
+                return self.estado
+            self.estado = CALENTANDO
+            inicio = time.perf_counter()
+            fallido = False
+            for nombre, funcion in self.pasos:
+                t0 = time.perf_counter()
+                try:
+                    resumen = funcion()
+                    resultado = {'ok': True}
+                    if isinstance(resumen, dict):
+                        resultado.update(resumen)
+                except Exception as e:
+                    fallido = True
+                    resultado = {'ok': False, 'error': str(e)}
+                resultado['ms'] = round((time.perf_counter() - t0) * 1000, 1)
+                self.resultados[nombre] = resultado
+            self.duracion_s = round(time.perf_counter() - inicio, 3)
+            self.estado = FALLIDO if fallido else LISTO
+            return self.estado
+
+    def es_cacheable(self, metodo, ruta):
+        """True si la ruta la atiende una vista decorada con `cacheable` (sin efectos)"""
+        try:
+            endpoint, _ = self.app.url_map.bind('localhost').match(ruta, method=metodo)
+        except Exception:
+            return False
+        return getattr(self.app.view_functions.get(endpoint), 'cacheable', False)
+
+    @property
+    def listo(self):
+        return self.estado in (LISTO, DESACTIVADO)
+
+    def informe(self):
+        """Estado para /ready; `heredado` indica que el calentamiento se hizo antes del fork"""
+        return {
+            'listo': self.listo,
+            'estado': self.estado,
+            'version_datos': self.version_datos(),
+            'duracion_s': self.duracion_s,
+            'heredado': self.pid != os.getpid(),
+            'pasos': self.resultados,
+        }